@@ -1,12 +1,30 @@
 # -*- mode: python ; coding: utf-8 -*-
+import os
+import importlib.util
+
+# Статичний discovery-документ Drive v3 з googleapiclient: build() не ходить у мережу при старті.
+# Беремо лише drive.v3.json, а не всі сотні документів пакета.
+datas = []
+googleapiclient_spec = importlib.util.find_spec('googleapiclient')
+if googleapiclient_spec:
+    drive_document = os.path.join(os.path.dirname(googleapiclient_spec.origin),
+                                  'discovery_cache', 'documents', 'drive.v3.json')
+    if os.path.exists(drive_document):
+        datas.append((drive_document, 'googleapiclient/discovery_cache/documents'))
+
+# Важкі модулі імпортуються ліниво (lazy_imports.LazyModule) — PyInstaller їх не бачить
+hiddenimports = ['tkinter', 'cv2', 'mss', 'numpy', 'websocket', 'requests', 'certifi',
+                 'simplejpeg', 'turbojpeg', 'PIL.Image',
+                 'google.oauth2.credentials', 'google.auth.transport.requests',
+                 'googleapiclient.discovery', 'googleapiclient.errors', 'googleapiclient.http']
 
 
 a = Analysis(
     ['simple_recorder.py'],
     pathex=[],
     binaries=[],
-    datas=[],
-    hiddenimports=['tkinter', 'cv2', 'mss', 'numpy', 'websocket', 'requests', 'certifi'],
+    datas=datas,
+    hiddenimports=hiddenimports,
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
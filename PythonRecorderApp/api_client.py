@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Єдиний HTTP-клієнт для викликів API сервера з записувачів.
+
+Один requests.Session з пулом keep-alive з'єднань: дрібні часті запити (синхронізація
+логів, реєстрація стріму, шматки вивантаження) не платять за новий TCP/TLS handshake.
+Таймаути, перевірка TLS і політика повторів однакові для всіх викликів, а для кожного
+endpoint ведуться лічильники запитів, помилок і затримок (snapshot()).
+
+Повтори на рівні з'єднання: запит, який не зміг під'єднатися, безпечно повторити для
+будь-якого методу (тіло ще не надіслано). Відповіді 502/503/504 повторюються лише для
+ідемпотентних методів; повтори POST на рівні застосунку роблять самі виклики
+(ResumableUpload, LiveUploadSession), бо лише вони знають, чи це безпечно.
+
+requests (~70 мс імпорту) завантажується при першому запиті, а не при старті програми.
+"""
+
+import os
+import time
+import threading
+from urllib.parse import urlsplit
+
+from lazy_imports import optional_module
+
+requests = optional_module("requests")  # optional dependency
+
+# Сертифікат сервера перевіряється завжди. Для самопідписаного — його CA у
+# SIMPLE_RECORDER_CA_BUNDLE (шлях до PEM); SIMPLE_RECORDER_VERIFY_TLS=0 — явна відмова від перевірки
+API_CA_BUNDLE = os.getenv("SIMPLE_RECORDER_CA_BUNDLE", "")
+API_VERIFY_TLS = API_CA_BUNDLE or os.getenv("SIMPLE_RECORDER_VERIFY_TLS", "true").lower() in ("1", "true", "yes")
+API_CONNECT_TIMEOUT = float(os.getenv("SIMPLE_RECORDER_API_CONNECT_TIMEOUT", "5"))  # сек на з'єднання
+API_READ_TIMEOUT = 30.0  # сек на відповідь за замовчуванням; довгі виклики задають свій
+API_POOL_SIZE = 8        # з'єднань до сервера: воркери вивантаження + логи + реєстрація
+API_RETRIES = 2          # повтори з'єднання / 502-504 для ідемпотентних методів
+API_BACKOFF = 0.5        # сек, подвоюється з кожним повтором
+
+
+class EndpointStats:
+    __slots__ = ("count", "errors", "total_ms", "max_ms", "last_ms", "last_status")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = 0.0
+        self.last_status = None
+
+    def add(self, elapsed_ms, status):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.last_ms = elapsed_ms
+        self.last_status = status
+        if status is None or status >= 500:
+            self.errors += 1
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 2),
+            "last_ms": round(self.last_ms, 2),
+            "last_status": self.last_status,
+        }
+
+
+class ApiClient:
+    """requests.Session з пулом з'єднань, спільними таймаутами/TLS і лічильниками по endpoint.
+
+    verify — як у requests: True, False або шлях до CA-бандла.
+    """
+
+    def __init__(self, base_url, verify=API_VERIFY_TLS, pool_size=API_POOL_SIZE, retries=API_RETRIES):
+        self.base_url = base_url.rstrip("/")
+        self.verify = verify
+        self.pool_size = pool_size
+        self.retries = retries
+        self._session = None
+        self._adapter = None
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        """requests.Session створюється (і requests імпортується) при першому запиті"""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    def _create_session(self):
+        from urllib3.exceptions import InsecureRequestWarning
+        from urllib3.util.retry import Retry
+
+        if not self.verify:
+            requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+        session = requests.Session()
+        session.verify = self.verify
+        retry = Retry(
+            total=None, connect=self.retries, read=0, redirect=2, other=0,
+            status=self.retries, status_forcelist=(502, 503, 504),
+            backoff_factor=API_BACKOFF, raise_on_status=False, respect_retry_after_header=True,
+        )
+        adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=self.pool_size, max_retries=retry)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        self._adapter = adapter
+        return session
+
+    def url(self, endpoint):
+        return f"{self.base_url}{endpoint}"
+
+    def request(self, method, endpoint, timeout=API_READ_TIMEOUT, **kwargs):
+        """Виклик endpoint ("/api/...") відносно base_url; timeout — на відповідь (сек)"""
+        started = time.perf_counter()
+        status = None
+        try:
+            response = self.session.request(method, self.url(endpoint),
+                                            timeout=(API_CONNECT_TIMEOUT, timeout), **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                stats = self._stats.get((method, endpoint))
+                if stats is None:
+                    stats = self._stats[(method, endpoint)] = EndpointStats()
+                stats.add(elapsed_ms, status)
+
+    def get(self, endpoint, **kwargs):
+        return self.request("GET", endpoint, **kwargs)
+
+    def post(self, endpoint, **kwargs):
+        return self.request("POST", endpoint, **kwargs)
+
+    @property
+    def connections(self):
+        """Скільки TCP-з'єднань відкрито за весь час (з keep-alive — набагато менше за запити)"""
+        if self._adapter is None:
+            return 0
+        pools = self._adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in pools.keys())
+
+    def snapshot(self):
+        with self._lock:
+            endpoints = {f"{method} {endpoint}": stats.snapshot()
+                         for (method, endpoint), stats in sorted(self._stats.items())}
+        return {
+            "host": urlsplit(self.base_url).netloc,
+            "requests": sum(stats["count"] for stats in endpoints.values()),
+            "connections": self.connections,
+            "endpoints": endpoints,
+        }
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
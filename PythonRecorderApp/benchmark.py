@@ -0,0 +1,618 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарки гарячого шляху SimpleRecorder на синтетичних кадрах (дисплей не потрібен).
+
+    python benchmark.py transport --frames 300
+    python benchmark.py delta --resolutions 1080p 4k
+    python benchmark.py compose --monitors 1 2 3 4
+    python benchmark.py ingest --monitors 1 2
+    python benchmark.py jpeg --subsampling 420 444
+    python benchmark.py video --frames 240 --codecs mp4v libx264 libx265
+    python benchmark.py stages --monitors 1 2 --output bench.json --compare baseline.json
+    python benchmark.py startup --budget-ms 150
+"""
+
+import argparse
+import base64
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import resource  # CPU дочірнього ffmpeg; лише POSIX
+except ImportError:
+    resource = None
+
+import cv2
+import numpy as np
+
+import simple_recorder as sr
+import video_writer
+
+RESOLUTIONS = {
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+    "4k": (3840, 2160),
+}
+
+
+def synthetic_frame(width, height, t=0):
+    """Кадр, схожий на офісний екран: світлий фон, рядки «тексту», вікно що рухається"""
+    frame = np.full((height, width, 3), 245, dtype=np.uint8)
+    frame[:max(1, height // 24)] = (60, 60, 60)  # панель задач/заголовок
+    line_height = max(8, height // 54)
+    for row, y in enumerate(range(height // 12, height - line_height, line_height * 2)):
+        length = int(width * (0.3 + 0.5 * ((row * 37) % 11) / 11))
+        frame[y:y + line_height // 2, width // 20:width // 20 + length] = (90, 90, 90)
+    box = max(16, width // 12)
+    x = (t * 13) % max(1, width - box)
+    y = (t * 7) % max(1, height - box)
+    frame[y:y + box, x:x + box] = (40, 120, 220)
+    return frame
+
+
+def bench_transport(args):
+    """JSON+base64 проти бінарного заголовка: байти на дроті та CPU на кадр"""
+    results = []
+    for name in args.resolutions:
+        width, height = RESOLUTIONS[name]
+        success, jpeg = cv2.imencode(".jpg", synthetic_frame(width, height),
+                                     [cv2.IMWRITE_JPEG_QUALITY, sr.JPEG_QUALITY])
+        if not success:
+            raise RuntimeError("cv2.imencode не зміг закодувати кадр")
+
+        builders = {
+            "json": lambda seq: sr.build_json_frame(jpeg, "bench", "room"),
+            "binary": lambda seq: sr.build_binary_frame(jpeg, seq, time.time()),
+        }
+        parsers = {
+            "json": lambda msg: base64.b64decode(json.loads(msg)["data"]),
+            "binary": lambda msg: sr.parse_binary_frame(msg)[1],
+        }
+        for mode, build in builders.items():
+            build_cpu = time.process_time()
+            messages = [build(seq) for seq in range(args.frames)]
+            build_cpu = time.process_time() - build_cpu
+
+            parse_cpu = time.process_time()
+            for message in messages:
+                parsers[mode](message)
+            parse_cpu = time.process_time() - parse_cpu
+
+            wire = len(messages[0].encode("utf-8") if isinstance(messages[0], str) else messages[0])
+            results.append({
+                "resolution": name,
+                "mode": mode,
+                "jpeg_bytes": len(jpeg),
+                "wire_bytes": wire,
+                "overhead_pct": round((wire / len(jpeg) - 1) * 100, 2),
+                "build_us_per_frame": round(build_cpu / args.frames * 1e6, 1),
+                "parse_us_per_frame": round(parse_cpu / args.frames * 1e6, 1),
+            })
+
+    print(f"{'res':>6} {'mode':>7} {'jpeg B':>9} {'wire B':>9} {'+%':>7} {'build µs':>9} {'parse µs':>9}")
+    for row in results:
+        print(f"{row['resolution']:>6} {row['mode']:>7} {row['jpeg_bytes']:>9} {row['wire_bytes']:>9} "
+              f"{row['overhead_pct']:>7.2f} {row['build_us_per_frame']:>9.1f} {row['parse_us_per_frame']:>9.1f}")
+    return results
+
+
+def bench_delta(args):
+    """Повні JPEG-кадри (cv2.imencode) проти дельт з плиток на «офісному» навантаженні"""
+    results = []
+    for name in args.resolutions:
+        width, height = RESOLUTIONS[name]
+        encoder = sr.TileDeltaEncoder()
+        full_bytes = delta_bytes = 0
+        full_cpu = delta_cpu = 0.0
+        for t in range(args.frames):
+            # Кадри генеруються по одному: 4K-послідовність цілком у пам'ять не влазить
+            frame = sr.CapturedFrame(t, t / sr.FRAME_RATE, synthetic_frame(width, height, t))
+
+            started = time.process_time()
+            success, jpeg = cv2.imencode(".jpg", frame.image, [cv2.IMWRITE_JPEG_QUALITY, sr.JPEG_QUALITY])
+            full_bytes += len(sr.build_binary_frame(jpeg, frame.seq, frame.timestamp))
+            full_cpu += time.process_time() - started
+
+            started = time.process_time()
+            encoded = encoder.encode(frame)
+            if encoded is not None:
+                delta_bytes += len(encoded[0])
+            delta_cpu += time.process_time() - started
+
+        results.append({
+            "resolution": name,
+            "frames": args.frames,
+            "full_kb_per_frame": round(full_bytes / args.frames / 1024, 1),
+            "delta_kb_per_frame": round(delta_bytes / args.frames / 1024, 1),
+            "bytes_ratio": round(full_bytes / max(1, delta_bytes), 1),
+            "full_ms_per_frame": round(full_cpu / args.frames * 1000, 2),
+            "delta_ms_per_frame": round(delta_cpu / args.frames * 1000, 2),
+            "cpu_ratio": round(full_cpu / max(1e-9, delta_cpu), 1),
+            "keyframes": encoder.keyframes,
+            "tiles_per_delta": round(encoder.tiles_sent / max(1, encoder.deltas), 1),
+        })
+
+    print(f"{'res':>6} {'full KB':>8} {'delta KB':>9} {'×bytes':>7} {'full ms':>8} {'delta ms':>9} {'×cpu':>6} {'key':>4}")
+    for row in results:
+        print(f"{row['resolution']:>6} {row['full_kb_per_frame']:>8.1f} {row['delta_kb_per_frame']:>9.1f} "
+              f"{row['bytes_ratio']:>7.1f} {row['full_ms_per_frame']:>8.2f} {row['delta_ms_per_frame']:>9.2f} "
+              f"{row['cpu_ratio']:>6.1f} {row['keyframes']:>4}")
+    return results
+
+
+def bench_compose(args):
+    """compose_grid + зменшення INTER_AREA проти GridCompositor для 1–4 моніторів"""
+    results = []
+    for name in args.resolutions:
+        width, height = RESOLUTIONS[name]
+        for count in args.monitors:
+            frames = [synthetic_frame(width, height, index) for index in range(count)]
+
+            def legacy():
+                composite = sr.compose_grid(frames) if len(frames) > 1 else frames[0]
+                return sr.fit_within(composite, sr.MAX_WIDTH, sr.MAX_HEIGHT)
+
+            compositor = sr.GridCompositor()
+            timings = {}
+            for label, func in (("legacy", legacy), ("compositor", lambda: compositor.compose(frames))):
+                func()  # прогрів (і розрахунок розкладки для компоновщика)
+                started = time.perf_counter()
+                for _ in range(args.iterations):
+                    output = func()
+                timings[label] = (time.perf_counter() - started) / args.iterations * 1000
+            results.append({
+                "resolution": name,
+                "monitors": count,
+                "output": f"{output.shape[1]}x{output.shape[0]}",
+                "legacy_ms": round(timings["legacy"], 2),
+                "compositor_ms": round(timings["compositor"], 2),
+                "speedup": round(timings["legacy"] / max(1e-9, timings["compositor"]), 1),
+            })
+
+    print(f"{'res':>6} {'mon':>4} {'output':>10} {'legacy ms':>10} {'new ms':>8} {'×':>5}")
+    for row in results:
+        print(f"{row['resolution']:>6} {row['monitors']:>4} {row['output']:>10} {row['legacy_ms']:>10.2f} "
+              f"{row['compositor_ms']:>8.2f} {row['speedup']:>5.1f}")
+    return results
+
+
+class SyntheticShot:
+    """Аналог mss.ScreenShot: сирий BGRA bytearray, доступний і як масив"""
+
+    def __init__(self, frame):
+        self.height, self.width = frame.shape[:2]
+        self.raw = bytearray(cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA).tobytes())
+
+    @property
+    def __array_interface__(self):
+        return {"version": 3, "shape": (self.height, self.width, 4), "typestr": "|u1", "data": self.raw}
+
+
+def bench_ingest(args):
+    """np.array+cvtColor+compose_grid проти BGRA-перегляду з компонуванням у буфер пулу"""
+    results = []
+    for name in args.resolutions:
+        width, height = RESOLUTIONS[name]
+        for count in args.monitors:
+            shots = [SyntheticShot(synthetic_frame(width, height, index)) for index in range(count)]
+
+            def legacy():
+                frames = [cv2.cvtColor(np.array(shot), cv2.COLOR_BGRA2BGR) for shot in shots]
+                composite = sr.compose_grid(frames) if len(frames) > 1 else frames[0]
+                composite = sr.fit_within(composite, sr.MAX_WIDTH, sr.MAX_HEIGHT)
+                return sr.CapturedFrame(0, 0.0, composite)
+
+            compositor = sr.GridCompositor()
+            pool = sr.FramePool()
+
+            def pooled():
+                frames = [np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+                          for shot in shots]
+                compositor.layout([(frame.shape[1], frame.shape[0]) for frame in frames])
+                image = compositor.compose(frames, out=pool.acquire(compositor.canvas.shape))
+                return sr.CapturedFrame(0, 0.0, image, pool)
+
+            row = {"resolution": name, "monitors": count}
+            for label, func in (("legacy", legacy), ("pooled", pooled)):
+                func().release()  # прогрів: розкладка й перший буфер пулу
+                tracemalloc.start()
+                tracemalloc.reset_peak()
+                started = time.perf_counter()
+                for _ in range(args.iterations):
+                    frame = func()
+                    frame.release()
+                elapsed = time.perf_counter() - started
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                row[f"{label}_ms"] = round(elapsed / args.iterations * 1000, 2)
+                row[f"{label}_peak_mb"] = round(peak / 2 ** 20, 1)
+            row["pool_allocated"] = pool.allocated
+            row["pool_reused"] = pool.reused
+            results.append(row)
+
+    print(f"{'res':>6} {'mon':>4} {'legacy ms':>10} {'pooled ms':>10} {'legacy MB':>10} {'pooled MB':>10} {'alloc/reuse':>12}")
+    for row in results:
+        print(f"{row['resolution']:>6} {row['monitors']:>4} {row['legacy_ms']:>10.2f} {row['pooled_ms']:>10.2f} "
+              f"{row['legacy_peak_mb']:>10.1f} {row['pooled_peak_mb']:>10.1f} "
+              f"{row['pool_allocated']:>5}/{row['pool_reused']:<6}")
+    return results
+
+
+def bench_jpeg(args):
+    """Доступні JPEG-кодувальники: час, розмір і перевірка, що JPEG декодується в той самий розмір"""
+    results = []
+    for name in args.resolutions:
+        width, height = RESOLUTIONS[name]
+        for subsampling in args.subsampling:
+            for fast_dct in (False, True):
+                measured = sr.benchmark_jpeg_encoders(rounds=args.rounds, size=(width, height),
+                                                      subsampling=subsampling, fast_dct=fast_dct)
+                for encoder, result in measured.items():
+                    results.append({"resolution": name, "subsampling": subsampling, "fast_dct": fast_dct,
+                                    "encoder": encoder, **result})
+
+    print(f"{'res':>6} {'sub':>4} {'fdct':>5} {'encoder':>11} {'ms':>8} {'KB':>7} {'ok':>3}")
+    for row in results:
+        ms = f"{row['ms']:.2f}" if row["ms"] is not None else "-"
+        print(f"{row['resolution']:>6} {row['subsampling']:>4} {str(row['fast_dct']):>5} {row['encoder']:>11} "
+              f"{ms:>8} {row['bytes'] / 1024:>7.1f} {'✓' if row['ok'] else '✗':>3}")
+    failed = [row for row in results if not row["ok"]]
+    if failed:
+        raise SystemExit(f"Невдалі кодувальники: {sorted({row['encoder'] for row in failed})}")
+    return results
+
+
+def _children_cpu():
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _psnr(path, frames, width, height):
+    """Середній PSNR декодованого відео відносно вихідних кадрів"""
+    capture = cv2.VideoCapture(path)
+    values = []
+    for t in range(frames):
+        ok, decoded = capture.read()
+        if not ok:
+            break
+        values.append(cv2.PSNR(synthetic_frame(width, height, t), decoded[:height, :width]))
+    capture.release()
+    return round(sum(values) / len(values), 2) if values else None, len(values)
+
+
+def bench_video(args):
+    """Архівне відео: cv2 mp4v проти ffmpeg (x264/x265) — розмір, CPU, якість (PSNR)"""
+    if not video_writer.find_ffmpeg():
+        print("⚠️ ffmpeg не знайдено — порівнюється лише mp4v")
+    results = []
+    for name in args.resolutions:
+        width, height = RESOLUTIONS[name]
+        for codec in args.codecs:
+            if codec != "mp4v" and not video_writer.find_ffmpeg():
+                continue
+            path = os.path.join(tempfile.gettempdir(), f"bench_{name}_{codec}.mp4")
+            wall = time.perf_counter()
+            cpu = time.process_time()
+            children = _children_cpu()
+            if codec == "mp4v":
+                writer = video_writer.open_cv2_writer(path, sr.FRAME_RATE, (width, height))
+            else:
+                writer = video_writer.FfmpegVideoWriter(path, sr.FRAME_RATE, (width, height), codec=codec,
+                                                        preset=args.preset, crf=args.crf, log=lambda _: None)
+            for t in range(args.frames):
+                writer.write(synthetic_frame(width, height, t))
+            writer.release()
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu + _children_cpu() - children
+            psnr, decoded = _psnr(path, args.frames, width, height)
+            results.append({
+                "resolution": name,
+                "codec": codec,
+                "frames": args.frames,
+                "decoded": decoded,
+                "kb": round(os.path.getsize(path) / 1024, 1),
+                "wall_s": round(wall, 2),
+                "cpu_s": round(cpu, 2),
+                "psnr_db": psnr,
+            })
+            os.remove(path)
+
+    print(f"{'res':>6} {'codec':>8} {'KB':>9} {'×size':>6} {'wall s':>7} {'cpu s':>7} {'PSNR dB':>8} {'frames':>7}")
+    for row in results:
+        base = next(r for r in results if r["resolution"] == row["resolution"])
+        print(f"{row['resolution']:>6} {row['codec']:>8} {row['kb']:>9.1f} {base['kb'] / max(0.1, row['kb']):>6.1f} "
+              f"{row['wall_s']:>7.2f} {row['cpu_s']:>7.2f} {row['psnr_db'] or 0:>8.2f} "
+              f"{row['decoded']:>3}/{row['frames']:<3}")
+    return results
+
+
+STAGE_ORDER = ("compose", "overlay", "detect", "resize", "encode", "frame_json", "frame_binary", "delta", "write")
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux віддає КБ, macOS — байти
+    return round(peak / (2 ** 20 if platform.system() == "Darwin" else 2 ** 10), 1)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _replay_frames(directory, width, height):
+    """Кадри з теки (png/jpg), приведені до розміру монітора"""
+    paths = sorted(path for pattern in ("*.png", "*.jpg", "*.jpeg")
+                   for path in glob.glob(os.path.join(directory, pattern)))
+    if not paths:
+        raise SystemExit(f"У {directory} немає png/jpg кадрів")
+    return [cv2.resize(cv2.imread(path, cv2.IMREAD_COLOR), (width, height), interpolation=cv2.INTER_AREA)
+            for path in paths]
+
+
+def bench_stages(args):
+    """Стадії гарячого шляху на синтетичних або записаних кадрах: p50/p99, пропускна здатність, пік RSS"""
+    stream_width, stream_height = (int(value) for value in args.stream_size.split("x"))
+    jpeg_encoder = sr.select_jpeg_encoder(args.jpeg_encoder, log=lambda _: None)
+    scenarios = []
+    for name in args.resolutions:
+        width, height = RESOLUTIONS[name]
+        sources = _replay_frames(args.replay, width, height) if args.replay else None
+        for count in args.monitors:
+            # Невеликий цикл кадрів на монітор: різні кадри дають реалістичні зміни для детектора й дельт
+            shots = [[SyntheticShot(sources[(t + index) % len(sources)] if sources
+                                    else synthetic_frame(width, height, t * 5 + index))
+                      for t in range(args.cycle)] for index in range(count)]
+            compositor = sr.GridCompositor()
+            pool = sr.FramePool()
+            overlay = sr.OverlayRenderer([sr.LabelOverlay(lambda moment: f"bench | {moment:%H:%M:%S}")])
+            detector = sr.ChangeDetector()
+            delta_encoder = sr.TileDeltaEncoder(encoder=jpeg_encoder)
+            path = os.path.join(tempfile.gettempdir(), f"bench_stages_{name}_{count}.mp4")
+            writer = None
+            samples = {stage: [] for stage in STAGE_ORDER}
+
+            def timed(stage, func, *func_args):
+                started = time.perf_counter()
+                result = func(*func_args)
+                samples[stage].append(time.perf_counter() - started)
+                return result
+
+            started = time.perf_counter()
+            for t in range(args.warmup + args.frames):
+                if t == args.warmup:
+                    samples = {stage: [] for stage in STAGE_ORDER}
+                    started = time.perf_counter()
+                now = t / sr.FRAME_RATE
+                views = [np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+                         for shot in (monitor[t % args.cycle] for monitor in shots)]
+
+                def compose():
+                    compositor.layout([(view.shape[1], view.shape[0]) for view in views])
+                    return compositor.compose(views, out=pool.acquire(compositor.canvas.shape))
+
+                frame = sr.CapturedFrame(t, now, timed("compose", compose), pool)
+                timed("overlay", overlay.apply, frame.image, 1_700_000_000 + now)
+                timed("detect", detector.should_send, frame.image, now)
+                live = timed("resize", sr.fit_within, frame.image, stream_width, stream_height)
+                jpeg = timed("encode", jpeg_encoder.encode, live, sr.JPEG_QUALITY)
+                timed("frame_json", sr.build_json_frame, jpeg, "bench", "room")
+                timed("frame_binary", sr.build_binary_frame, jpeg, t, now)
+                timed("delta", delta_encoder.encode, sr.CapturedFrame(t, now, live))
+                if writer is None:
+                    writer = video_writer.open_video_writer(path, sr.FRAME_RATE, (frame.image.shape[1],
+                                                                                  frame.image.shape[0]),
+                                                            encoder=args.video_encoder, log=lambda _: None)
+                timed("write", writer.write, frame.image)
+                frame.release()
+            elapsed = time.perf_counter() - started
+            writer.release()
+            if os.path.exists(path):
+                os.remove(path)
+
+            stages = {}
+            for stage in STAGE_ORDER:
+                values = np.array(samples[stage]) * 1000
+                stages[stage] = {
+                    "p50_ms": round(float(np.percentile(values, 50)), 3),
+                    "p99_ms": round(float(np.percentile(values, 99)), 3),
+                    "mean_ms": round(float(values.mean()), 3),
+                    "max_fps": round(1000 / max(1e-6, float(values.mean())), 1),
+                }
+            scenarios.append({
+                "resolution": name,
+                "monitors": count,
+                "output": f"{compositor.output_size[0]}x{compositor.output_size[1]}",
+                "frames": args.frames,
+                "throughput_fps": round(args.frames / elapsed, 1),
+                "frame_p50_ms": round(sum(stage["p50_ms"] for stage in stages.values()), 2),
+                "peak_rss_mb": _peak_rss_mb(),
+                "stages": stages,
+            })
+            del shots
+
+    report = {
+        "commit": _git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                    "cpus": os.cpu_count(), "opencv": cv2.__version__, "numpy": np.__version__},
+        "config": {"jpeg_encoder": jpeg_encoder.name, "video_encoder": args.video_encoder,
+                   "stream_size": args.stream_size, "replay": args.replay, "warmup": args.warmup},
+        "scenarios": scenarios,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            baseline = {(row["resolution"], row["monitors"]): row for row in json.load(baseline_file)["scenarios"]}
+
+    for row in scenarios:
+        print(f"\n{row['resolution']} × {row['monitors']} → {row['output']}: {row['throughput_fps']} кадр/с, "
+              f"p50 кадру {row['frame_p50_ms']} мс, пік RSS {row['peak_rss_mb']} MB")
+        reference = baseline.get((row["resolution"], row["monitors"])) if baseline else None
+        print(f"  {'stage':>12} {'p50 ms':>8} {'p99 ms':>8} {'max fps':>8}" + (f" {'Δp50':>8}" if reference else ""))
+        for stage, values in row["stages"].items():
+            line = f"  {stage:>12} {values['p50_ms']:>8.3f} {values['p99_ms']:>8.3f} {values['max_fps']:>8.1f}"
+            if reference and stage in reference["stages"]:
+                old = reference["stages"][stage]["p50_ms"]
+                line += f" {(values['p50_ms'] / old - 1) * 100 if old else 0:>+7.1f}%"
+            print(line)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, ensure_ascii=False, indent=2)
+        print(f"\n💾 {args.output}")
+    return report
+
+
+STARTUP_BUDGET_MS = float(os.getenv("SIMPLE_RECORDER_STARTUP_BUDGET_MS", "150"))
+# Не мають імпортуватися разом із simple_recorder — лише при першому використанні
+STARTUP_DEFERRED_MODULES = ("cv2", "numpy", "websocket", "requests", "tkinter", "googleapiclient", "google.oauth2")
+
+
+def _import_times(module):
+    """Рядки -X importtime для `import module` у свіжому інтерпретаторі: [(ім'я, self мкс, cumulative мкс)]"""
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)  # як у збірці: .pyc вже є, компіляцію не міряємо
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                            capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(f"import {module} завершився з кодом {result.returncode}: {result.stderr[-500:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def bench_startup(args):
+    """Час імпорту simple_recorder (-X importtime), найважчі модулі й бюджет старту; код 1 — бюджет порушено"""
+    _import_times(args.module)  # прогрів: .pyc і дисковий кеш
+    runs = []
+    for _ in range(args.rounds):
+        rows = _import_times(args.module)
+        total_ms = next(cumulative for name, _, cumulative in rows if name == args.module) / 1000
+        runs.append((total_ms, rows))
+    runs.sort(key=lambda run: run[0])
+    median_ms, rows = runs[len(runs) // 2]
+
+    print(f"import {args.module}: медіана {median_ms:.1f} мс (мін {runs[0][0]:.1f}, макс {runs[-1][0]:.1f}), "
+          f"модулів: {len(rows)}, бюджет {args.budget_ms:.0f} мс")
+    print(f"  {'self ms':>8} {'cumul ms':>9}  module")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda row: row[1], reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:>8.1f} {cumulative_us / 1000:>9.1f}  {name}")
+
+    imported = {name for name, _, _ in rows}
+    eager = [name for name in STARTUP_DEFERRED_MODULES if name in imported]
+    report = {
+        "commit": _git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "module": args.module,
+        "import_ms": {"median": round(median_ms, 1), "min": round(runs[0][0], 1), "max": round(runs[-1][0], 1)},
+        "budget_ms": args.budget_ms,
+        "modules": len(rows),
+        "eager_heavy_modules": eager,
+        "top_self_ms": {name: round(self_us / 1000, 2)
+                        for name, self_us, _ in sorted(rows, key=lambda row: row[1], reverse=True)[:args.top]},
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, ensure_ascii=False, indent=2)
+        print(f"\n💾 {args.output}")
+
+    problems = []
+    if median_ms > args.budget_ms:
+        problems.append(f"імпорт {median_ms:.1f} мс > бюджету {args.budget_ms:.0f} мс")
+    if eager:
+        problems.append(f"при старті імпортуються важкі модулі: {', '.join(eager)}")
+    if problems:
+        raise SystemExit("❌ " + "; ".join(problems))
+    print("✅ Старт у межах бюджету, важкі модулі відкладено")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки SimpleRecorder")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    transport = sub.add_parser("transport", help="JSON+base64 проти бінарних кадрів")
+    transport.add_argument("--frames", type=int, default=300)
+    transport.add_argument("--resolutions", nargs="+", default=["720p", "1080p"], choices=sorted(RESOLUTIONS))
+    transport.set_defaults(func=bench_transport)
+
+    delta = sub.add_parser("delta", help="повні JPEG-кадри проти дельт з плиток")
+    delta.add_argument("--frames", type=int, default=240)
+    delta.add_argument("--resolutions", nargs="+", default=["1080p"], choices=sorted(RESOLUTIONS))
+    delta.set_defaults(func=bench_delta)
+
+    compose = sub.add_parser("compose", help="compose_grid проти GridCompositor")
+    compose.add_argument("--iterations", type=int, default=30)
+    compose.add_argument("--monitors", nargs="+", type=int, default=[1, 2, 3, 4])
+    compose.add_argument("--resolutions", nargs="+", default=["1080p", "4k"], choices=sorted(RESOLUTIONS))
+    compose.set_defaults(func=bench_compose)
+
+    ingest = sub.add_parser("ingest", help="копіювання кадрів проти BGRA-перегляду й пулу буферів")
+    ingest.add_argument("--iterations", type=int, default=30)
+    ingest.add_argument("--monitors", nargs="+", type=int, default=[1, 2])
+    ingest.add_argument("--resolutions", nargs="+", default=["1080p", "4k"], choices=sorted(RESOLUTIONS))
+    ingest.set_defaults(func=bench_ingest)
+
+    jpeg = sub.add_parser("jpeg", help="порівняння JPEG-кодувальників")
+    jpeg.add_argument("--rounds", type=int, default=20)
+    jpeg.add_argument("--subsampling", nargs="+", default=["420"], choices=["444", "422", "420"])
+    jpeg.add_argument("--resolutions", nargs="+", default=["1080p"], choices=sorted(RESOLUTIONS))
+    jpeg.set_defaults(func=bench_jpeg)
+
+    video = sub.add_parser("video", help="архівне відео: cv2 mp4v проти ffmpeg x264/x265")
+    video.add_argument("--frames", type=int, default=240)
+    video.add_argument("--codecs", nargs="+", default=["mp4v", "libx264"], choices=["mp4v", "libx264", "libx265"])
+    video.add_argument("--preset", default=video_writer.FFMPEG_PRESET)
+    video.add_argument("--crf", type=int, default=video_writer.FFMPEG_CRF)
+    video.add_argument("--resolutions", nargs="+", default=["1080p"], choices=sorted(RESOLUTIONS))
+    video.set_defaults(func=bench_video)
+
+    stages = sub.add_parser("stages", help="затримки стадій конвеєра (p50/p99), пропускна здатність, пік RSS")
+    stages.add_argument("--frames", type=int, default=120)
+    stages.add_argument("--warmup", type=int, default=10)
+    stages.add_argument("--cycle", type=int, default=3, help="скільки різних кадрів на монітор крутити по колу")
+    stages.add_argument("--monitors", nargs="+", type=int, default=[1, 2])
+    stages.add_argument("--resolutions", nargs="+", default=["720p", "1080p"], choices=sorted(RESOLUTIONS))
+    stages.add_argument("--replay", help="тека з png/jpg кадрами замість синтетичних")
+    stages.add_argument("--stream-size", default="1280x720", help="розмір живого стріму для стадії resize")
+    stages.add_argument("--jpeg-encoder", default="cv2", choices=["auto"] + sorted(sr.JPEG_ENCODERS))
+    stages.add_argument("--video-encoder", default="cv2", choices=["auto", "ffmpeg", "cv2"])
+    stages.add_argument("--output", help="зберегти результати в JSON")
+    stages.add_argument("--compare", help="JSON попереднього прогону для порівняння p50")
+    stages.set_defaults(func=bench_stages)
+
+    startup = sub.add_parser("startup", help="час імпорту (-X importtime) і перевірка бюджету старту")
+    startup.add_argument("--module", default="simple_recorder")
+    startup.add_argument("--rounds", type=int, default=5)
+    startup.add_argument("--top", type=int, default=15, help="скільки найважчих модулів показати")
+    startup.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    startup.add_argument("--output", help="зберегти результати в JSON")
+    startup.set_defaults(func=bench_startup)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
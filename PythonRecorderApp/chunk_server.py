@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Локальна заміна серверу записів для перевірки вивантаження без streamApp.
+
+Реалізує той самий протокол, що streamApp/server/api.js:
+  GET  /api/recordings/chunk?session=  → {received}
+  POST /api/recordings/chunk?session=&offset=&final=0|1&sha256=&username=&roomName=&filename=
+       (Content-Range, X-Chunk-SHA256)
+  POST /api/recordings/upload  (multipart, поле video)
+  POST /api/recorder/logs/sync  (JSON, можна з Content-Encoding: gzip)
+Файли складаються в <dir>/<room>/<user>/<YYYY-MM-DD>/<filename>.
+
+--fail-every N ламає кожен N-й шматок по черзі одним зі способів FAILURE_MODES:
+503 без запису, обрив з'єднання після запису (відповідь втрачена), пошкоджене тіло
+(не збігається X-Chunk-SHA256), пошкоджений байт у файлі (не збігається sha256 файлу).
+--fail-modes обмежує ротацію частиною способів (наприклад, лише drop).
+
+    python chunk_server.py --port 3001 --dir ./recordings --fail-every 3
+    SIMPLE_RECORDER_LIVE_UPLOAD=1 python simple_recorder.py   # API URL: http://127.0.0.1:3001
+"""
+
+import os
+import re
+import gzip
+import json
+import hashlib
+import time
+import argparse
+import threading
+from datetime import datetime
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+SESSION_PATTERN = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+RANGE_PATTERN = re.compile(r"^bytes (\d+)-(\d+)/(\d+|\*)$")
+FAILURE_MODES = ("error", "drop", "corrupt_chunk", "corrupt_file")
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for block in iter(lambda: source.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class RecordingStore:
+    """Сховище записів: незавершені сесії в <dir>/.chunks, готові файли — за кімнатою й користувачем"""
+
+    def __init__(self, root, fail_every=0, failure_modes=FAILURE_MODES):
+        unknown = set(failure_modes) - set(FAILURE_MODES)
+        if unknown or not failure_modes:
+            raise ValueError(f"Невідомі режими збою: {sorted(unknown)}; можливі: {', '.join(FAILURE_MODES)}")
+        self.root = os.path.abspath(root)
+        self.fail_every = fail_every
+        self.failure_modes = tuple(failure_modes)
+        self.requests = 0
+        self.injected = {mode: 0 for mode in FAILURE_MODES}
+        self._corrupted = set()
+        self.chunk_dir = os.path.join(self.root, ".chunks")
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        self.finished = {}
+        self.logs = []  # рядки з /api/recorder/logs/sync у порядку надходження
+        self.events = []  # (time.time(), шлях) — для вимірювання затримки після зупинки запису
+        self._lock = threading.Lock()
+
+    def final_path(self, room, user, filename):
+        date_dir = os.path.join(self.root, room or "unknown", user or "unknown", datetime.now().strftime("%Y-%m-%d"))
+        os.makedirs(date_dir, exist_ok=True)
+        return os.path.join(date_dir, os.path.basename(filename))
+
+    def next_failure(self, session):
+        """Режим збою для чергового шматка або None; файл сесії псується не більше одного разу"""
+        with self._lock:
+            self.requests += 1
+            if not self.fail_every or self.requests % self.fail_every:
+                return None
+            mode = self.failure_modes[(self.requests // self.fail_every - 1) % len(self.failure_modes)]
+            if mode == "corrupt_file":
+                if session in self._corrupted:
+                    return None
+                self._corrupted.add(session)
+            self.injected[mode] += 1
+            return mode
+
+    def _part_path(self, session):
+        return os.path.join(self.chunk_dir, f"{session}.part")
+
+    def status(self, session):
+        with self._lock:
+            if session in self.finished:
+                return self.finished[session]
+            path = self._part_path(session)
+            return {"received": os.path.getsize(path) if os.path.exists(path) else 0}
+
+    def append(self, session, offset, data, final, room, user, filename, chunk_hash=None, file_hash=None,
+               failure=None):
+        """Повертає (HTTP статус, відповідь) за тими самими правилами, що й api.js"""
+        with self._lock:
+            if session in self.finished:
+                return 200, self.finished[session]
+            part_path = self._part_path(session)
+            received = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            if failure == "corrupt_chunk" and data:
+                data = bytes([data[0] ^ 0xFF]) + data[1:]
+            if chunk_hash and hashlib.sha256(data).hexdigest() != chunk_hash.lower():
+                return 422, {"error": "Chunk hash mismatch", "received": received}
+            if offset > received or offset + len(data) < received:
+                return 409, {"error": "Offset mismatch", "received": received}
+            tail = data[received - offset:]
+            if failure == "corrupt_file" and tail:
+                tail = bytes([tail[0] ^ 0xFF]) + tail[1:]  # пошкодження «на диску» — ловить лише sha256 файлу
+            if tail or not received:
+                with open(part_path, "ab") as part:
+                    part.write(tail)
+                received += len(tail)
+            if not final:
+                return 200, {"success": True, "received": received}
+            if file_hash and file_sha256(part_path) != file_hash.lower():
+                os.remove(part_path)
+                return 422, {"error": "File hash mismatch", "received": 0}
+            path = self.final_path(room, user, filename)
+            os.replace(part_path, path)
+            result = {"success": True, "received": received, "filename": os.path.basename(path),
+                      "size": received, "storage": "local"}
+            self.finished[session] = result
+            self.events.append((time.time(), path))
+            return 200, result
+
+    def save(self, data, room, user, filename):
+        path = self.final_path(room, user, filename)
+        with open(path, "wb") as target:
+            target.write(data)
+        with self._lock:
+            self.events.append((time.time(), path))
+        return {"success": True, "filename": os.path.basename(path), "size": len(data), "storage": "local"}
+
+
+class RecordingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, як у nginx/express
+    disable_nagle_algorithm = True  # заголовки й тіло йдуть окремими write — без цього +40 мс на delayed ACK
+    store = None
+    quiet = False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        session = parse_qs(url.query).get("session", [""])[0]
+        if url.path != "/api/recordings/chunk":
+            self._reply(404, {"error": "Not found"})
+        elif not SESSION_PATTERN.match(session):
+            self._reply(400, {"error": "Invalid session"})
+        else:
+            self._reply(200, self.store.status(session))
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if url.path == "/api/recordings/chunk":
+            self._chunk(parse_qs(url.query), body)
+        elif url.path == "/api/recordings/upload":
+            self._upload(body)
+        elif url.path == "/api/recorder/logs/sync":
+            self._logs(body)
+        else:
+            self._reply(404, {"error": "Not found"})
+
+    def _chunk(self, query, body):
+        value = lambda key: query.get(key, [""])[0]
+        session, filename = value("session"), os.path.basename(value("filename"))
+        content_range = RANGE_PATTERN.match(self.headers.get("Content-Range", ""))
+        try:
+            offset = int(content_range.group(1) if content_range else value("offset"))
+        except ValueError:
+            offset = -1
+        if not SESSION_PATTERN.match(session) or offset < 0 or not filename:
+            self._reply(400, {"error": "Invalid chunk parameters"})
+            return
+        if content_range and int(content_range.group(2)) - offset + 1 != len(body):
+            self._reply(400, {"error": "Content-Range does not match body length"})
+            return
+        failure = self.store.next_failure(session)
+        if failure == "error":
+            self._reply(503, {"error": "Injected failure"})
+            return
+        status, result = self.store.append(
+            session, offset, body, value("final") == "1", value("roomName"), value("username"), filename,
+            chunk_hash=self.headers.get("X-Chunk-SHA256"), file_hash=value("sha256") or None, failure=failure,
+        )
+        if failure == "drop":
+            self.close_connection = True  # шматок записано, але відповідь клієнт не отримає
+            return
+        self._reply(status, result)
+
+    def _upload(self, body):
+        header = f"Content-Type: {self.headers.get('Content-Type', '')}\r\n\r\n".encode()
+        message = BytesParser(policy=HTTP).parsebytes(header + body)
+        fields, video = {}, None
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if name == "video":
+                video = (part.get_filename() or "recording.mp4", part.get_payload(decode=True))
+            elif name:
+                fields[name] = part.get_content().strip()
+        if video is None:
+            self._reply(400, {"error": "No file uploaded"})
+            return
+        filename, data = video
+        self._reply(200, self.store.save(data, fields.get("roomName"), fields.get("username"), filename))
+
+    def _logs(self, body):
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        payload = json.loads(body)
+        if not payload.get("username") or not payload.get("room") or not isinstance(payload.get("logs"), list):
+            self._reply(400, {"error": "username, room, logs required"})
+            return
+        self.store.logs.extend(payload["logs"])
+        self._reply(200, {"success": True})
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+def serve(root, host="127.0.0.1", port=0, quiet=False, fail_every=0, failure_modes=FAILURE_MODES):
+    """Запускає сервер у фоновому потоці; повертає (server, store), адреса — server.server_address"""
+    store = RecordingStore(root, fail_every, failure_modes)
+    handler = type("Handler", (RecordingHandler,), {"store": store, "quiet": quiet})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="chunk-server", daemon=True).start()
+    return server, store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальний сервер записів (chunk + upload)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3001)
+    parser.add_argument("--dir", default="recordings")
+    parser.add_argument("--fail-every", type=int, default=0, help="ламати кожен N-й шматок (0 — без збоїв)")
+    parser.add_argument("--fail-modes", default=",".join(FAILURE_MODES),
+                        help=f"способи збою через кому (з {', '.join(FAILURE_MODES)})")
+    args = parser.parse_args()
+    server, store = serve(args.dir, args.host, args.port, fail_every=args.fail_every,
+                          failure_modes=tuple(mode for mode in args.fail_modes.split(",") if mode))
+    print(f"📡 http://{args.host}:{server.server_address[1]} → {store.root}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Відкладений імпорт важких залежностей (cv2, numpy, websocket, requests, JPEG-кодувальники).
+
+LazyModule підставляється замість модуля: `cv2 = LazyModule("cv2")`, а справжній
+імпорт відбувається при першому зверненні до атрибута (`cv2.resize`). Так вікно
+програми (і headless-режим) стартує, не чекаючи ~0.2 с на OpenCV/numpy, а в
+PyInstaller-збірці — ще й на розпакування їхніх бібліотек.
+
+optional_module() — для необов'язкових залежностей: повертає LazyModule, якщо пакет
+встановлено (перевірка через importlib без імпорту), інакше None, як раніше
+`try: import x / except ImportError: x = None`. PyInstaller не бачить рядкові імена —
+їх перелічено в hiddenimports у SimpleRecorder.spec.
+"""
+
+import importlib
+import importlib.util
+
+
+class LazyModule:
+    """Модуль, що імпортується при першому зверненні до атрибута"""
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = importlib.import_module(self._name)  # власні замки importlib — потокобезпечно
+            self.__dict__["_module"] = module
+        return module
+
+    @property
+    def loaded(self):
+        return self.__dict__["_module"] is not None
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __repr__(self):
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def module_exists(name):
+    """Чи встановлено модуль (без його імпорту; для a.b імпортується лише пакет a)"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def optional_module(name):
+    return LazyModule(name) if module_exists(name) else None
+
+
+def module_available(module):
+    """Чи імпортується optional_module насправді (пакет може бути, а його бібліотеки — ні)"""
+    if module is None:
+        return False
+    try:
+        module._load()
+        return True
+    except Exception:
+        return False
+
+
+def preload(*modules):
+    """Імпортує модулі заздалегідь (наприклад, у фоні, поки користувач входить); помилки ігноруються"""
+    for module in modules:
+        module_available(module)
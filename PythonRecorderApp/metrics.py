@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Метрики записувача у форматі Prometheus.
+
+Реєстр лічильників, шкал (gauge) і гістограм з мітками. Гарячий шлях лише додає
+числа під коротким замком; значення, що вже є в об'єктах (глибина черг, байти
+відправки, RSS), читаються функціями-колбеками в момент запиту.
+
+MetricsServer — крихітний HTTP-слухач (лише stdlib):
+  GET /metrics       → text/plain; version=0.0.4 (Prometheus exposition format)
+  GET /metrics.json  → той самий знімок у JSON
+Додаткові шляхи (наприклад, керування профілюванням) реєструються через add_route().
+
+    SIMPLE_RECORDER_METRICS_PORT=9464 python simple_recorder.py
+    curl http://127.0.0.1:9464/metrics
+"""
+
+import os
+import sys
+import json
+import math
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# 0 — слухач вимкнено; для збору з інших машин задайте ще SIMPLE_RECORDER_METRICS_HOST=0.0.0.0
+METRICS_PORT = int(os.getenv("SIMPLE_RECORDER_METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("SIMPLE_RECORDER_METRICS_HOST", "127.0.0.1")
+METRICS_LOG_INTERVAL = float(os.getenv("SIMPLE_RECORDER_METRICS_LOG_INTERVAL", "0"))  # сек, 0 — не писати в лог
+
+# Від 1 мс до 1 с — стадії кадру при 12-30 FPS укладаються в перші кошики
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+# Вивантаження сегмента: від секунди до пів години
+UPLOAD_BUCKETS = (1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labels):
+            raise ValueError(f"{self.name}: очікуються мітки {self.labels}, отримано {labels}")
+        return tuple(str(value) for value in labels)
+
+    def samples(self):
+        """[(суфікс, значення міток, додаткові мітки, значення)]"""
+        with self._lock:
+            return [("", key, (), value) for key, value in sorted(self._values.items())]
+
+    def snapshot(self):
+        with self._lock:
+            if not self.labels:
+                return self._values.get((), 0)
+            return {",".join(key): value for key, value in sorted(self._values.items())}
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, *labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class CallbackMetric(Metric):
+    """Значення читається функцією під час запиту: число або {мітки (кортеж): число}; None — пропуск"""
+
+    def __init__(self, name, help_text, kind, function, labels=()):
+        super().__init__(name, help_text, labels)
+        self.kind = kind
+        self.function = function
+
+    def _read(self):
+        try:
+            value = self.function()
+        except Exception:
+            return {}
+        if value is None:
+            return {}
+        if isinstance(value, dict):
+            return {self._key(key if isinstance(key, tuple) else (key,)): number
+                    for key, number in value.items() if number is not None}
+        return {(): value}
+
+    def samples(self):
+        return [("", key, (), value) for key, value in sorted(self._read().items())]
+
+    def snapshot(self):
+        values = self._read()
+        if not self.labels:
+            return values.get((), None)
+        return {",".join(key): value for key, value in sorted(values.items())}
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=STAGE_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # [лічильники кошиків (не накопичені)..., +Inf, сума]
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            items = [(key, list(series)) for key, series in sorted(self._values.items())]
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series[:-1]):
+                cumulative += count
+                samples.append(("_bucket", key, (("le", _format_value(bound)),), cumulative))
+            samples.append(("_sum", key, (), series[-1]))
+            samples.append(("_count", key, (), cumulative))
+        return samples
+
+    def snapshot(self):
+        result = {}
+        with self._lock:
+            items = [(key, list(series)) for key, series in sorted(self._values.items())]
+        for key, series in items:
+            count = sum(series[:-1])
+            result[",".join(key) or "all"] = {
+                "count": count,
+                "avg_ms": round(series[-1] / count * 1000, 2) if count else 0.0,
+            }
+        return result
+
+
+class MetricsRegistry:
+    """Іменовані метрики; повторна реєстрація з тим самим ім'ям повертає наявну"""
+
+    def __init__(self, prefix="recorder_"):
+        self.prefix = prefix
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, name, factory):
+        name = self.prefix + name
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = factory(name)
+            return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(name, lambda full: Counter(full, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self._register(name, lambda full: Gauge(full, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=STAGE_BUCKETS):
+        return self._register(name, lambda full: Histogram(full, help_text, labels, buckets))
+
+    def callback(self, name, help_text, function, kind="gauge", labels=()):
+        """Метрика з колбеком; повторний виклик замінює функцію (новий запис — новий конвеєр)"""
+        metric = self._register(name, lambda full: CallbackMetric(full, help_text, kind, function, labels))
+        metric.function = function
+        return metric
+
+    def render(self):
+        """Текст у форматі Prometheus exposition 0.0.4"""
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        for name, metric in metrics:
+            samples = metric.samples()
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for suffix, key, extra, value in samples:
+                lines.append(f"{name}{suffix}{_format_labels(metric.labels, key, extra)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        return {name[len(self.prefix):]: metric.snapshot() for name, metric in metrics}
+
+
+def process_rss_bytes():
+    """Резидентна пам'ять процесу (байти) або None, якщо платформа не дає її дешево"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    if sys.platform == "win32":
+        try:
+            import ctypes
+            from ctypes import wintypes
+
+            class ProcessMemoryCounters(ctypes.Structure):
+                _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                            ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                            ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+            counters = ProcessMemoryCounters()
+            counters.cb = ctypes.sizeof(counters)
+            process = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+                return counters.WorkingSetSize
+        except (OSError, AttributeError):
+            return None
+        return None
+    try:
+        import resource
+        # На macOS ru_maxrss у байтах, на інших Unix — у КБ; це пік, а не поточне значення
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return None
+
+
+METRICS = MetricsRegistry()
+METRICS.callback("process_resident_memory_bytes", "Resident set size of the recorder process", process_rss_bytes)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    registry = None
+    routes = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/metrics":
+            self._reply(200, self.registry.render(), "text/plain; version=0.0.4; charset=utf-8")
+        elif url.path == "/metrics.json":
+            self._reply(200, json.dumps(self.registry.snapshot(), ensure_ascii=False), "application/json")
+        elif url.path in self.routes:
+            try:
+                status, body, content_type = self.routes[url.path](parse_qs(url.query))
+            except Exception as route_error:
+                status, body, content_type = 500, json.dumps({"error": str(route_error)}), "application/json"
+            self._reply(status, body, content_type)
+        else:
+            self._reply(404, json.dumps({"error": "Not found"}), "application/json")
+
+    def _reply(self, status, body, content_type):
+        data = body if isinstance(body, bytes) else body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # кожен scrape у консолі — зайвий шум
+
+
+class MetricsServer:
+    """HTTP-слухач метрик у фоновому потоці; port=0 у конструкторі — вільний порт від ОС"""
+
+    def __init__(self, registry=METRICS, host=METRICS_HOST, port=METRICS_PORT):
+        self.registry = registry
+        self.routes = {}
+        handler = type("Handler", (MetricsHandler,), {"registry": registry, "routes": self.routes})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+
+    @property
+    def address(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def add_route(self, path, function):
+        """function(query) → (статус, тіло, Content-Type) для GET path"""
+        self.routes[path] = function
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Профілювання записувача на льоту, без перезапуску.
+
+Семплюючий профайлер: окремий потік кожні PROFILE_INTERVAL сек знімає стеки всіх
+потоків через sys._current_frames() (захоплення, кодувальники, запис, відправка,
+вивантаження) і рахує однакові стеки. Потоки запису ніяк не інструментуються, тож
+коли профайлер не запущено, накладних витрат немає зовсім, а під час роботи вони
+обмежені одним потоком, що прокидається ~200 разів на секунду.
+
+Результат — файл *.folded у форматі «згорнутих стеків» (рядок = стек через «;» і
+кількість семплів), який напряму відкривають flamegraph.pl, speedscope.app та inferno:
+
+    flamegraph.pl profile-20240101-120000.folded > profile.svg
+
+Запуск: SIMPLE_RECORDER_PROFILE=<сек> (вікно з початку запису), сигнал SIGUSR1
+(вмикає/вимикає, не на Windows) або GET /debug/profile?seconds=N на порту метрик.
+"""
+
+import os
+import sys
+import time
+import tempfile
+import threading
+from collections import Counter
+from datetime import datetime
+
+PROFILE_SECONDS = float(os.getenv("SIMPLE_RECORDER_PROFILE", "0"))  # вікно при старті запису, 0 — вимкнено
+PROFILE_INTERVAL = float(os.getenv("SIMPLE_RECORDER_PROFILE_INTERVAL", "0.005"))  # сек між семплами
+PROFILE_MAX_SECONDS = 300.0  # довше вікно — забута вимкнути сесія
+PROFILE_DIR = os.getenv("SIMPLE_RECORDER_PROFILE_DIR") or os.path.join(
+    os.path.expanduser("~"), ".livekit_recorder_logs", "profiles")
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"
+
+
+class SamplingProfiler:
+    """Знімає стеки потоків у фоні; один запуск за раз, потокобезпечний"""
+
+    def __init__(self, directory=PROFILE_DIR, interval=PROFILE_INTERVAL, log=print):
+        self.directory = directory
+        self.interval = interval
+        self.log = log
+        self.last_path = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds=PROFILE_MAX_SECONDS):
+        """Починає вікно профілювання; False — вже запущено"""
+        seconds = min(max(0.1, float(seconds)), PROFILE_MAX_SECONDS)
+        with self._lock:
+            if self.running:
+                return False
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(seconds,), name="profiler", daemon=True)
+            self._thread.start()
+        self.log(f"🔬 Профілювання {seconds:.0f} сек (семпл кожні {self.interval * 1000:.0f} мс)")
+        return True
+
+    def stop(self, timeout=10):
+        """Зупиняє вікно достроково і чекає запису файлу; повертає шлях до нього"""
+        thread = self._thread
+        self._stop.set()
+        if thread is not None:
+            thread.join(timeout)
+        return self.last_path
+
+    def toggle(self, seconds=PROFILE_MAX_SECONDS):
+        """Для обробника сигналу: не чекає на запис файлу, щоб не блокувати головний потік"""
+        if self.running:
+            self._stop.set()
+        else:
+            self.start(seconds)
+
+    def _run(self, seconds):
+        stacks = Counter()
+        own = threading.get_ident()
+        samples = 0
+        started = time.perf_counter()
+        deadline = started + seconds
+        while not self._stop.is_set() and time.perf_counter() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                stacks[";".join(reversed(stack))] += 1
+            samples += 1
+            self._stop.wait(self.interval)
+        elapsed = time.perf_counter() - started
+        self.last_path = self._save(stacks)
+        if self.last_path:
+            self.log(f"🔬 Профіль: {samples} семплів за {elapsed:.1f} сек → {self.last_path}")
+
+    def _save(self, stacks):
+        name = f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.folded"
+        for directory in (self.directory, os.path.join(tempfile.gettempdir(), "simple_recorder_profiles")):
+            try:
+                os.makedirs(directory, exist_ok=True)
+                path = os.path.join(directory, name)
+                with open(path, "w", encoding="utf-8") as target:
+                    for stack, count in stacks.most_common():
+                        target.write(f"{stack} {count}\n")
+                return path
+            except OSError as save_error:
+                self.log(f"⚠️ Не вдалося зберегти профіль у {directory}: {save_error}")
+        return None
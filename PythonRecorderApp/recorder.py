@@ -10,8 +10,8 @@ from tkinter import ttk, messagebox
 import mss
 import cv2
 import numpy as np
-import requests
 import threading
+import queue
 import time
 import os
 import tempfile
@@ -19,12 +19,15 @@ from datetime import datetime
 import io
 import sys
 from PIL import Image
-import pystray
-from pystray import MenuItem as item
+from api_client import ApiClient
+from video_writer import FrameClock, FrameTimeline, open_video_writer
+
+UPLOAD_EXIT_TIMEOUT = 120  # сек ожидания загрузки частей при выходе; остальное остаётся во временной папке
 
 class LiveKitRecorder:
     def __init__(self):
         self.api_url = "https://kibitkostreamappv.pp.ua"
+        self.api = ApiClient(self.api_url, verify=True)  # один пул keep-alive соединений на все запросы
         self.username = None
         self.room = None
         self.is_recording = False
@@ -35,6 +38,19 @@ class LiveKitRecorder:
         self.current_video_file = None
         self.tray_icon = None
         
+        # Ротация частей: новый файл открывается до закрытия старого,
+        # а закрытие и загрузка старого идут в отдельном потоке
+        self.frame_size = None
+        self.frames_written = 0
+        self.segment_frames = 0
+        self.saved_parts = 0
+        self.writer_lock = threading.Lock()
+        self.timeline = None
+        self.timeline_writer = None
+        self.upload_queue = queue.Queue()
+        self.upload_thread = None
+        self.stop_event = threading.Event()  # свой на каждую запись: будит auto_save_loop при остановке
+        
         # Создаём главное окно
         self.root = tk.Tk()
         self.root.title("🎬 LiveKit Desktop Recorder")
@@ -174,7 +190,7 @@ class LiveKitRecorder:
     
     def load_rooms(self):
         try:
-            response = requests.get(f"{self.api_url}/api/room-list", timeout=10)
+            response = self.api.get("/api/room-list", timeout=10)
             if response.ok:
                 rooms = response.json()
                 room_names = [r['name'] for r in rooms]
@@ -196,8 +212,8 @@ class LiveKitRecorder:
         self.login_btn.config(state='disabled', text='Вход...')
         
         try:
-            response = requests.post(
-                f"{self.api_url}/api/auth/login",
+            response = self.api.post(
+                "/api/auth/login",
                 json={"username": username, "password": password, "room": room},
                 timeout=10
             )
@@ -223,13 +239,19 @@ class LiveKitRecorder:
         self.selected_screens = selected_screens
         self.show_panel('recording')
         
+        # Загрузчик частей живёт дольше записи: дозагружает последнюю часть после остановки
+        if not self.upload_thread or not self.upload_thread.is_alive():
+            self.upload_thread = threading.Thread(target=self.upload_loop, daemon=True)
+            self.upload_thread.start()
+        
         # Запускаем запись в отдельном потоке
+        self.stop_event = threading.Event()
         self.is_recording = True
         self.recording_thread = threading.Thread(target=self.recording_loop, daemon=True)
         self.recording_thread.start()
         
         # Запускаем автосохранение
-        self.save_thread = threading.Thread(target=self.auto_save_loop, daemon=True)
+        self.save_thread = threading.Thread(target=self.auto_save_loop, args=(self.stop_event,), daemon=True)
         self.save_thread.start()
         
         # Обновление времени
@@ -238,11 +260,15 @@ class LiveKitRecorder:
         
         print("🎬 Запись началась")
     
+    def open_video_writer(self):
+        """Создаёт VideoWriter в новом временном файле, возвращает (writer, путь)"""
+        path = tempfile.mktemp(suffix='.mp4')
+        # ffmpeg (H.264) если доступен, иначе cv2 (mp4v)
+        writer = open_video_writer(path, 30.0, self.frame_size)
+        return writer, path
+    
     def recording_loop(self):
         """Захват кадров и запись в видео"""
-        # Создаём временный файл
-        self.current_video_file = tempfile.mktemp(suffix='.mp4')
-        
         with mss.mss() as sct:
             # Определяем размер захвата
             monitors = [sct.monitors[i] for i in self.selected_screens]
@@ -256,17 +282,24 @@ class LiveKitRecorder:
                 height = max(m['height'] for m in monitors)
             
             # Создаём VideoWriter
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            self.video_writer = cv2.VideoWriter(
-                self.current_video_file, fourcc, 30.0, (width, height)
-            )
+            self.frame_size = (width, height)
+            writer, path = self.open_video_writer()
+            with self.writer_lock:
+                self.video_writer, self.current_video_file = writer, path
+                self.frames_written = 0
+                self.segment_frames = 0
             
             print(f"📹 Запись: {width}×{height} @ 30 FPS")
             
-            frame_time = 1.0 / 30.0  # 30 FPS
+            # Темп по монотонным дедлайнам, а кадры раскладываются по слотам 30 FPS файла:
+            # при медленном захвате пропуски заполняются дублями, и длительность видео равна реальной
+            clock = FrameClock(30.0)
+            self.timeline = FrameTimeline(30.0)
+            self.timeline_writer = None
+            clock.start()
             
             while self.is_recording:
-                start = time.time()
+                captured_at = time.monotonic()
                 
                 try:
                     # Захватываем кадры
@@ -287,113 +320,152 @@ class LiveKitRecorder:
                         # Объединяем горизонтально
                         frame = np.hstack(frames)
                     
-                    # Записываем кадр
-                    self.video_writer.write(frame)
+                    # Записываем кадр (под замком: ротация подменяет writer между кадрами)
+                    with self.writer_lock:
+                        if self.video_writer:
+                            if self.video_writer is not self.timeline_writer:
+                                # Новая часть начинает свою шкалу времени
+                                self.timeline_writer = self.video_writer
+                                self.timeline.restart(captured_at)
+                            for _ in range(self.timeline.repeats(captured_at)):
+                                self.video_writer.write(frame)
+                                self.frames_written += 1
+                                self.segment_frames += 1
                     
                 except Exception as e:
                     print(f"❌ Ошибка захвата: {e}")
                 
                 # Поддерживаем 30 FPS
-                elapsed = time.time() - start
-                sleep_time = max(0, frame_time - elapsed)
-                time.sleep(sleep_time)
-        
-        # Закрываем видео
-        if self.video_writer:
-            self.video_writer.release()
-            print("📹 VideoWriter закрыт")
+                clock.wait()
+        
+        print(f"⏱️ Тайминг: {clock.snapshot()} | {self.timeline.snapshot()}")
+        
+        # Последняя часть уходит загрузчику вместе с закрытием VideoWriter
+        self.finish_segment()
     
-    def auto_save_loop(self):
-        """Автоматическое сохранение каждые 5 минут"""
-        while self.is_recording:
-            time.sleep(5 * 60)  # 5 минут
-            if self.is_recording:
-                print("⏰ 5 минут прошло, сохраняем...")
-                self.save_current_video()
+    def auto_save_loop(self, stop_event):
+        """Автоматическое сохранение каждые 5 минут; остановка записи будит поток сразу"""
+        # Событие этой записи, а не self.stop_event: старый поток не переживёт stop/start
+        while not stop_event.wait(5 * 60):  # 5 минут
+            print("⏰ 5 минут прошло, сохраняем...")
+            self.rotate_segment()
     
-    def save_current_video(self):
-        """Сохранение текущего видео на сервер"""
+    def rotate_segment(self):
+        """Бесшовная ротация: новый файл открывается заранее, подмена — атомарно между кадрами"""
+        if not self.is_recording or not self.frame_size:
+            return
         try:
-            # Закрываем текущий VideoWriter
-            if self.video_writer:
-                self.video_writer.release()
-                self.video_writer = None
-            
-            time.sleep(0.5)  # Даём время на завершение
-            
-            # Читаем файл
-            if self.current_video_file and os.path.exists(self.current_video_file):
-                with open(self.current_video_file, 'rb') as f:
-                    video_data = f.read()
-                
-                file_size_mb = len(video_data) / 1024 / 1024
-                print(f"📤 Загружаем {file_size_mb:.2f} MB на сервер...")
-                
-                # Отправляем на сервер
-                timestamp = int(time.time() * 1000)
-                filename = f"{self.username}_{timestamp}_part{self.part_number}.mp4"
-                
-                files = {'video': (filename, video_data, 'video/mp4')}
-                data = {
-                    'username': self.username,
-                    'roomName': self.room,
-                    'timestamp': str(timestamp)
-                }
-                
-                response = requests.post(
-                    f"{self.api_url}/api/recordings/upload",
-                    files=files,
-                    data=data,
-                    timeout=300  # 5 минут на загрузку
-                )
-                
-                if response.ok:
-                    print(f"✅ Часть {self.part_number} сохранена ({file_size_mb:.2f} MB)")
-                    self.root.after(0, lambda: self.saved_label.config(
-                        text=f"Сохранено: {self.part_number} частей"
-                    ))
-                    self.part_number += 1
-                    
-                    # Удаляем временный файл
-                    os.remove(self.current_video_file)
-                else:
-                    print(f"❌ Ошибка загрузки: {response.status_code}")
-            
-            # Пересоздаём VideoWriter для продолжения записи
-            if self.is_recording:
-                with mss.mss() as sct:
-                    monitors = [sct.monitors[i] for i in self.selected_screens]
-                    
-                    if len(monitors) == 1:
-                        mon = monitors[0]
-                        width, height = mon['width'], mon['height']
-                    else:
-                        width = sum(m['width'] for m in monitors)
-                        height = max(m['height'] for m in monitors)
-                    
-                    # Новый временный файл
-                    self.current_video_file = tempfile.mktemp(suffix='.mp4')
-                    
-                    # Создаём новый VideoWriter
-                    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-                    self.video_writer = cv2.VideoWriter(
-                        self.current_video_file, fourcc, 30.0, (width, height)
-                    )
-                    print(f"🔄 Продолжаем запись в новый файл")
-                
+            writer, path = self.open_video_writer()
         except Exception as e:
-            print(f"❌ Ошибка сохранения: {e}")
+            print(f"❌ Не удалось открыть новый файл, продолжаем в текущий: {e}")
+            return
+        if not writer.isOpened():
+            print("❌ Не удалось открыть новый файл, продолжаем в текущий")
+            return
+        
+        with self.writer_lock:
+            # Пока открывался файл, запись могла остановиться (finish_segment уже забрал writer)
+            stopped = not self.is_recording or self.video_writer is None
+            if not stopped:
+                old_writer, old_path = self.video_writer, self.current_video_file
+                frames = self.segment_frames
+                self.video_writer, self.current_video_file = writer, path
+                self.segment_frames = 0
+                part = self.part_number
+                self.part_number += 1
+        if stopped:
+            writer.release()
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        
+        # Закрытие (дописывание индекса MP4) и загрузка — в потоке загрузчика
+        self.upload_queue.put((old_writer, old_path, part, frames))
+        print(f"🔄 Часть {part} закрыта ({frames} кадров), продолжаем запись в новый файл")
+    
+    def finish_segment(self):
+        """Отдаёт текущую (последнюю) часть загрузчику"""
+        with self.writer_lock:
+            writer, path = self.video_writer, self.current_video_file
+            frames = self.segment_frames
+            self.video_writer, self.current_video_file = None, None
+            self.segment_frames = 0
+            part = self.part_number
+            self.part_number += 1
+        if writer:
+            self.upload_queue.put((writer, path, part, frames))
+            print("📹 VideoWriter передан загрузчику")
+    
+    def upload_loop(self):
+        """Поток загрузчика: закрывает готовые части и загружает их по очереди"""
+        while True:
+            writer, path, part, frames = self.upload_queue.get()
+            try:
+                if writer:
+                    writer.release()
+                self.upload_segment(path, part)
+                # После падения ffmpeg остаток части записан через cv2 в соседний файл
+                continuation = getattr(writer, "continuation", None)
+                if continuation:
+                    self.upload_segment(continuation, part)
+            except Exception as e:
+                print(f"❌ Ошибка сохранения части {part}: {e}")
+            finally:
+                self.upload_queue.task_done()
+    
+    def upload_segment(self, path, part):
+        """Загрузка закрытой части на сервер"""
+        if not path or not os.path.exists(path):
+            return
+        
+        # Читаем файл
+        with open(path, 'rb') as f:
+            video_data = f.read()
+        
+        file_size_mb = len(video_data) / 1024 / 1024
+        print(f"📤 Загружаем часть {part}: {file_size_mb:.2f} MB на сервер...")
+        
+        # Отправляем на сервер
+        timestamp = int(time.time() * 1000)
+        filename = f"{self.username}_{timestamp}_part{part}.mp4"
+        
+        files = {'video': (filename, video_data, 'video/mp4')}
+        data = {
+            'username': self.username,
+            'roomName': self.room,
+            'timestamp': str(timestamp)
+        }
+        
+        response = self.api.post(
+            "/api/recordings/upload",
+            files=files,
+            data=data,
+            timeout=300  # 5 минут на загрузку
+        )
+        
+        if response.ok:
+            print(f"✅ Часть {part} сохранена ({file_size_mb:.2f} MB)")
+            self.saved_parts += 1
+            saved = self.saved_parts
+            self.root.after(0, lambda: self.saved_label.config(
+                text=f"Сохранено: {saved} частей"
+            ))
+            
+            # Удаляем временный файл
+            os.remove(path)
+        else:
+            print(f"❌ Ошибка загрузки части {part}: {response.status_code} (файл оставлен: {path})")
     
     def stop_recording(self):
         """Остановка записи"""
         print("🛑 Останавливаем запись...")
         self.is_recording = False
+        self.stop_event.set()
         
-        # Ждём завершения потоков
-        time.sleep(1)
-        
-        # Сохраняем последнюю часть
-        self.save_current_video()
+        # Ждём завершения захвата: он сам отдаёт последнюю часть загрузчику,
+        # загрузка идёт в фоне и окно не блокирует
+        if self.recording_thread:
+            self.recording_thread.join(timeout=5)
         
         self.show_panel('screen')
         print("✅ Запись остановлена")
@@ -413,8 +485,10 @@ class LiveKitRecorder:
         """Сворачивание в системный трей"""
         self.root.withdraw()
         
-        # Создаём иконку трея
+        # Создаём иконку трея (pystray нужен только здесь)
         if not self.tray_icon:
+            import pystray
+            from pystray import MenuItem as item
             image = Image.new('RGB', (64, 64), color='red')
             menu = pystray.Menu(
                 item('🔴 Идёт запись', lambda: None, enabled=False),
@@ -429,13 +503,29 @@ class LiveKitRecorder:
         self.root.deiconify()
     
     def quit_app(self, icon=None, item=None):
-        """Выход из приложения"""
+        """Выход из приложения; незагруженные части дожидаются в фоне, окно не блокируется"""
         if self.is_recording:
             self.stop_recording()
         if self.tray_icon:
             self.tray_icon.stop()
+            self.tray_icon = None
+        if self.upload_queue.unfinished_tasks:
+            print(f"⏳ Дожидаемся загрузки частей ({self.upload_queue.unfinished_tasks}), "
+                  f"не дольше {UPLOAD_EXIT_TIMEOUT} сек...")
+            threading.Thread(target=self.quit_after_uploads, daemon=True).start()
+            return
         self.root.quit()
     
+    def quit_after_uploads(self, timeout=None):
+        """Ждёт загрузчик не дольше timeout и закрывает окно из потока Tk"""
+        deadline = time.monotonic() + (UPLOAD_EXIT_TIMEOUT if timeout is None else timeout)
+        while self.upload_queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.2)
+        if self.upload_queue.unfinished_tasks:
+            print(f"⚠️ Не дождались загрузки {self.upload_queue.unfinished_tasks} частей, "
+                  f"файлы остаются в {tempfile.gettempdir()}")
+        self.root.after(0, self.root.quit)
+    
     def on_closing(self):
         """Обработка закрытия окна"""
         if self.is_recording:
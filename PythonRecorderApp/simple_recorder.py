@@ -3,45 +3,71 @@ import sys
 import math
 import json
 import time
+import atexit
 import base64
+import gzip
+import hashlib
+import random
+import io
+import struct
 import shutil
+import signal
+import sqlite3
+import collections
 import threading
 import tempfile
-import tkinter as tk
+import argparse
 from datetime import datetime
-from tkinter import ttk, messagebox
 from urllib.parse import quote_plus
 
-import cv2
 import mss
-import numpy as np
-import websocket
-
-requests = None
-InsecureRequestWarning = None
-try:  # optional dependency
-    requests = __import__("requests")
-    exceptions_mod = __import__("requests.packages.urllib3.exceptions", fromlist=[""])
-    InsecureRequestWarning = getattr(exceptions_mod, "InsecureRequestWarning", None)
-    if InsecureRequestWarning:
-        requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
-except Exception:
-    requests = None
-    InsecureRequestWarning = None
-
-# Google Drive API (optional dependency)
-google_drive_available = False
-try:
-    from google.oauth2.credentials import Credentials
-    from google_auth_oauthlib.flow import InstalledAppFlow
-    from google.auth.transport.requests import Request
+
+from api_client import ApiClient
+from lazy_imports import LazyModule, module_available, module_exists, optional_module, preload
+from metrics import METRICS, METRICS_LOG_INTERVAL, METRICS_PORT, UPLOAD_BUCKETS, MetricsServer
+from profiler import PROFILE_SECONDS, SamplingProfiler
+from upload_spool import UploadSpool
+from video_writer import FrameClock, FrameTimeline, open_fragmented_writer, open_video_writer
+
+# Важкі модулі імпортуються при першому використанні (див. lazy_imports.py)
+cv2 = LazyModule("cv2")
+np = LazyModule("numpy")
+websocket = LazyModule("websocket")
+requests = optional_module("requests")  # optional dependency; попередження TLS вимикає ApiClient
+
+# Швидші JPEG-кодувальники (optional dependency; без них — cv2.imencode)
+simplejpeg = optional_module("simplejpeg")
+PILImage = optional_module("PIL.Image")
+turbojpeg = optional_module("turbojpeg")
+
+# tkinter потрібен лише вікну; headless-режим (--headless) його не імпортує
+tk = ttk = messagebox = None
+
+
+def load_tkinter():
+    global tk, ttk, messagebox
+    import tkinter as tk
+    from tkinter import ttk, messagebox
+
+
+# Google Drive API (optional dependency): лише перевірка наявності, імпорт — в _init_google_drive
+google_drive_available = all(module_exists(name) for name in ("googleapiclient", "google.oauth2", "google.auth"))
+
+
+def build_drive_service(credentials):
+    """Drive v3 зі статичного discovery-документа з googleapiclient (≥2.0), без запиту до googleapis.com"""
     from googleapiclient.discovery import build
-    from googleapiclient.http import MediaFileUpload
-    google_drive_available = True
-except ImportError as e:
-    google_drive_available = False
-    print(f"⚠️ Google Drive API не встановлено: {e}")
-    print("   📦 Встановіть: pip install google-api-python-client google-auth-httplib2 google-auth-oauthlib")
+    from googleapiclient.errors import UnknownApiNameOrVersion
+    try:
+        return build("drive", "v3", credentials=credentials, static_discovery=True, cache_discovery=False)
+    except (TypeError, UnknownApiNameOrVersion):
+        # Старий googleapiclient або документ не потрапив у збірку — завантажуємо з мережі, як раніше
+        return build("drive", "v3", credentials=credentials, cache_discovery=False)
+
+ROOMS = (
+    "Azov_1", "Azov_2", "Berd_1", "Berd_2", "Borci",
+    "vinissa", "vinissa_2", "Gazon", "ZP", "Kiev", "Tokyo", "admin"
+)
 
 # Google Drive налаштування (читаємо з оточення; секрети не зберігаємо в коді)
 GOOGLE_DRIVE_CLIENT_ID = os.getenv("GOOGLE_DRIVE_CLIENT_ID", "")
@@ -58,6 +84,137 @@ JPEG_QUALITY = 80
 MAX_WIDTH = 1920
 MAX_HEIGHT = 1080
 
+# Окремі профілі виходів з одного захоплення: файл і живий стрім (0 — без обмеження розміру).
+# Захоплення й компонування йдуть один раз — з більшою частотою і в більшому з двох розмірів
+OutputProfile = collections.namedtuple("OutputProfile", "fps max_width max_height")
+RECORD_PROFILE = OutputProfile(
+    int(os.getenv("SIMPLE_RECORDER_RECORD_FPS", str(FRAME_RATE))),
+    int(os.getenv("SIMPLE_RECORDER_RECORD_MAX_WIDTH", str(MAX_WIDTH))),
+    int(os.getenv("SIMPLE_RECORDER_RECORD_MAX_HEIGHT", str(MAX_HEIGHT))),
+)
+STREAM_PROFILE = OutputProfile(
+    int(os.getenv("SIMPLE_RECORDER_STREAM_FPS", str(FRAME_RATE))),
+    int(os.getenv("SIMPLE_RECORDER_STREAM_MAX_WIDTH", str(MAX_WIDTH))),
+    int(os.getenv("SIMPLE_RECORDER_STREAM_MAX_HEIGHT", str(MAX_HEIGHT))),
+)
+
+# Запис сегментами: файл ротується за часом або розміром, закриті сегменти
+# вивантажуються у фоні, тож при зупинці лишається дозавантажити лише останній
+SEGMENT_SECONDS = float(os.getenv("SIMPLE_RECORDER_SEGMENT_SECONDS", "600"))  # 0 = без ротації за часом
+SEGMENT_MAX_MB = float(os.getenv("SIMPLE_RECORDER_SEGMENT_MAX_MB", "500"))   # 0 = без ротації за розміром
+# Відправка логів на сервер: окремий потік, пакети за розміром/часом, gzip, повтори
+# з затримкою; поки сервер недоступний, рядки складаються у файл поруч із логом
+LOG_BATCH_LINES = 50            # відправляємо, щойно набралось стільки рядків...
+LOG_BATCH_INTERVAL = 5.0        # ...або минуло стільки секунд
+LOG_BATCH_MAX_BYTES = 64 * 1024  # до стиснення; express.json за замовчуванням приймає до 100 KB
+LOG_QUEUE_LINES = 10000         # більше в пам'яті не тримаємо — найстаріші рядки йдуть у файл
+LOG_OVERFLOW_MAX_BYTES = 50 * 1024 * 1024
+LOG_SYNC_TIMEOUT = 10
+
+# Локальний файл логу: буфер у пам'яті скидається раз на LOG_FLUSH_INTERVAL сек або при
+# LOG_FLUSH_LINES рядках (одним write), файл ротується за розміром, старі частини стискаються
+LOG_FLUSH_INTERVAL = 1.0
+LOG_FLUSH_LINES = 200
+LOG_FILE_MAX_MB = float(os.getenv("SIMPLE_RECORDER_LOG_MAX_MB", "10"))  # 0 = без ротації
+LOG_FILE_BACKUPS = int(os.getenv("SIMPLE_RECORDER_LOG_BACKUPS", "5"))
+LOG_COMPRESS_ROTATED = os.getenv("SIMPLE_RECORDER_LOG_COMPRESS", "true").lower() in ("1", "true", "yes")
+LOG_CONSOLE = os.getenv("SIMPLE_RECORDER_LOG_CONSOLE", "true").lower() in ("1", "true", "yes")
+
+UPLOAD_WORKERS = max(1, int(os.getenv("SIMPLE_RECORDER_UPLOAD_WORKERS", "2")))  # паралельні вивантаження
+
+# Живе вивантаження: сегмент пишеться як фрагментований MP4 і дописується на сервер
+# (/api/recordings/chunk) під час запису, тож після зупинки лишається лише хвіст
+LIVE_UPLOAD_ENABLED = os.getenv("SIMPLE_RECORDER_LIVE_UPLOAD", "false").lower() in ("1", "true", "yes")
+LIVE_UPLOAD_INTERVAL = float(os.getenv("SIMPLE_RECORDER_LIVE_UPLOAD_INTERVAL", "5"))  # сек між шматками
+LIVE_UPLOAD_MAX_BUFFER = 64 * 1024 * 1024  # більше невідправлених байтів — сервер недоступний, здаємося
+LIVE_UPLOAD_MAX_FAILURES = 5  # поспіль; далі сегмент вивантажується цілим після закриття
+LIVE_UPLOAD_TIMEOUT = 60
+CHUNK_ENDPOINT = "/api/recordings/chunk"
+
+# Відновлюване вивантаження файлу шматками: після обриву продовжуємо з позиції,
+# яку повідомляє сервер, з експоненційною затримкою та jitter між спробами
+UPLOAD_CHUNK_SIZE = int(float(os.getenv("SIMPLE_RECORDER_UPLOAD_CHUNK_MB", "8")) * 1024 * 1024)
+UPLOAD_MAX_RETRIES = int(os.getenv("SIMPLE_RECORDER_UPLOAD_RETRIES", "8"))  # поспіль без прогресу
+UPLOAD_BACKOFF_BASE = 1.0   # сек
+UPLOAD_BACKOFF_MAX = 60.0   # сек
+UPLOAD_CHUNK_TIMEOUT = 120  # сек на один шматок
+UPLOAD_MAX_RESTARTS = 2     # скільки разів починати файл заново, якщо не збігся його SHA-256
+
+# Метрики (див. metrics.py): час стадій, втрати кадрів, байти, вивантаження
+STAGE_SECONDS = METRICS.histogram("stage_seconds", "Time spent in a frame pipeline stage", ("stage",))
+FRAMES_TOTAL = METRICS.counter("frames_total", "Frames by outcome (captured, sent, keepalive)", ("outcome",))
+FRAMES_DROPPED = METRICS.counter("frames_dropped_total", "Live frames dropped, by reason", ("reason",))
+BYTES_SENT = METRICS.counter("ws_sent_bytes_total", "Bytes sent over the live WebSocket")
+UPLOAD_SECONDS = METRICS.histogram("upload_seconds", "Segment upload duration", ("result",), UPLOAD_BUCKETS)
+UPLOAD_BYTES = METRICS.counter("upload_bytes_total", "Recording bytes delivered to the server", ("mode",))
+
+# Конвеєр запису: захоплення → кодування (пул) → відправка, та окремо → файл
+ENCODE_WORKERS = max(1, min(4, (os.cpu_count() or 2) // 2))
+LIVE_QUEUE_SIZE = 2    # живий стрім: старі кадри викидаються
+FILE_QUEUE_SIZE = 24   # файл: без втрат, захоплення чекає на запис
+
+# Бінарний транспорт кадрів (опціонально, узгоджується в "join"; інакше JSON+base64)
+BINARY_FRAMES_ENABLED = os.getenv("SIMPLE_RECORDER_BINARY_FRAMES", "false").lower() in ("1", "true", "yes")
+FRAME_PROTOCOL_VERSION = 1
+# magic, версія, тип, кодек, прапорці, номер кадру, час захоплення (мс від epoch)
+FRAME_HEADER = struct.Struct("!2sBBBBIQ")
+FRAME_MAGIC = b"KB"
+FRAME_TYPE_FRAME = 1
+FRAME_TYPE_KEEPALIVE = 2  # без payload: «кадр seq досі актуальний»
+FRAME_TYPE_DELTA = 3      # змінені плитки поверх кадру base_seq (див. DELTA_HEADER)
+CODEC_JPEG = 1
+CODEC_NONE = 0
+
+# Дельта-стрім (лише з бінарним транспортом): ширина, висота, base_seq, к-сть плиток;
+# далі для кожної плитки TILE_HEADER (x, y, w, h, довжина JPEG) + JPEG
+DELTA_STREAMING_ENABLED = os.getenv("SIMPLE_RECORDER_DELTA_STREAMING", "false").lower() in ("1", "true", "yes")
+DELTA_TILE_SIZE = 64
+DELTA_KEYFRAME_INTERVAL = 10.0  # сек між повними ключовими кадрами
+DELTA_MAX_DIRTY_RATIO = 0.5     # більше змінених плиток — дешевше відправити ключовий кадр
+DELTA_HEADER = struct.Struct("!HHIH")
+TILE_HEADER = struct.Struct("!HHHHI")
+
+# Пропуск незмінних кадрів для живого стріму (файл отримує всі кадри)
+CHANGE_THRESHOLD = float(os.getenv("SIMPLE_RECORDER_CHANGE_THRESHOLD", "2.0"))  # 0 = вимкнено
+FORCE_FRAME_INTERVAL = float(os.getenv("SIMPLE_RECORDER_FORCE_FRAME_INTERVAL", "2.0"))  # сек
+KEEPALIVE_INTERVAL = 1.0  # сек без кадрів до відправки keepalive
+FINGERPRINT_SIZE = (160, 90)
+
+# Адаптивна якість живого стріму (файл не зачіпає): драбина рівнів від найкращого
+# до найлегшого; контролер ходить нею в межах [ADAPTIVE_BEST_LEVEL, ADAPTIVE_WORST_LEVEL]
+QualityLevel = collections.namedtuple("QualityLevel", "fps quality max_width max_height")
+QUALITY_LADDER = (
+    QualityLevel(FRAME_RATE, JPEG_QUALITY, MAX_WIDTH, MAX_HEIGHT),
+    QualityLevel(FRAME_RATE, 70, 1600, 900),
+    QualityLevel(10, 60, 1280, 720),
+    QualityLevel(8, 55, 1280, 720),
+    QualityLevel(6, 50, 960, 540),
+    QualityLevel(4, 45, 854, 480),
+)
+ADAPTIVE_QUALITY_ENABLED = os.getenv("SIMPLE_RECORDER_ADAPTIVE", "true").lower() in ("1", "true", "yes")
+ADAPTIVE_BEST_LEVEL = int(os.getenv("SIMPLE_RECORDER_ADAPTIVE_BEST_LEVEL", "0"))
+ADAPTIVE_WORST_LEVEL = int(os.getenv("SIMPLE_RECORDER_ADAPTIVE_WORST_LEVEL", str(len(QUALITY_LADDER) - 1)))
+ADAPTIVE_WINDOW = 2.0          # сек одного вікна вимірювань
+ADAPTIVE_CONGESTED_BUSY = 0.7  # частка часу в ws.send, вище якої канал перевантажений
+ADAPTIVE_HEALTHY_BUSY = 0.3    # ...і нижче якої є запас для підвищення якості
+ADAPTIVE_CONGESTED_DROPS = 2   # скинутих живих кадрів за вікно, що теж означає перевантаження
+ADAPTIVE_UP_WINDOWS = 3        # стільки здорових вікон поспіль перед кроком вгору
+ADAPTIVE_COOLDOWN_WINDOWS = 2  # вікна після зміни, коли рішення не приймаються
+
+# JPEG-кодувальник: auto — найшвидший доступний за мікробенчмарком при першому запуску
+JPEG_ENCODER = os.getenv("SIMPLE_RECORDER_JPEG_ENCODER", "auto").lower()  # auto|cv2|turbojpeg|simplejpeg|pillow
+JPEG_SUBSAMPLING = os.getenv("SIMPLE_RECORDER_JPEG_SUBSAMPLING", "420")  # 444|422|420
+JPEG_FAST_DCT = os.getenv("SIMPLE_RECORDER_JPEG_FAST_DCT", "true").lower() in ("1", "true", "yes")
+JPEG_PROBE_SIZE = (1280, 720)
+JPEG_PROBE_ROUNDS = 5
+JPEG_SWITCH_GAIN = 0.9  # інший кодувальник обирається, лише якщо він швидший за cv2 хоча б на 10%
+
+# Оверлеї поверх кадру (плашка з ім'ям і годинником є завжди)
+OVERLAY_SHOW_ROOM = os.getenv("SIMPLE_RECORDER_OVERLAY_ROOM", "false").lower() in ("1", "true", "yes")
+OVERLAY_REC_INDICATOR = os.getenv("SIMPLE_RECORDER_OVERLAY_REC", "false").lower() in ("1", "true", "yes")
+OVERLAY_MARGIN = 12
+OVERLAY_SPACING = 8
+
 
 def compose_grid(frames, columns=None):
     if not frames:
@@ -91,16 +248,776 @@ def compose_grid(frames, columns=None):
     return cv2.vconcat(row_frames)
 
 
+class GridCompositor:
+    """Компонує монітори в сітку одразу у вихідній роздільності.
+
+    Розкладка рахується один раз на конфігурацію моніторів (набір розмірів кадрів);
+    кожен монітор масштабується прямо у свою клітинку попередньо виділеного полотна,
+    тож повнорозмірна склейка (hconcat/vconcat) не будується. Розкладка та ж, що в
+    compose_grid, але рядки різної ширини вирівнюються по лівому краю.
+    """
+    def __init__(self, max_width=MAX_WIDTH, max_height=MAX_HEIGHT, columns=None):
+        self.max_width = max_width
+        self.max_height = max_height
+        self.columns = columns
+        self.canvas = None
+        self.slots = []
+        self.source_size = None
+        self.passthrough = False
+        self.layouts_computed = 0
+        self._layout_key = None
+        self._scratch_buffers = {}
+
+    @property
+    def output_size(self):
+        if self.canvas is None:
+            return None
+        return self.canvas.shape[1], self.canvas.shape[0]
+
+    def layout(self, sizes):
+        """Рахує клітинки (x, y, w, h) у вихідних координатах для кадрів розмірів (w, h)"""
+        if not sizes:
+            raise ValueError("Немає кадрів")
+        key = tuple(sizes)
+        if key == self._layout_key:
+            return self.slots
+
+        columns = self.columns or math.ceil(math.sqrt(len(sizes)))
+        rows = math.ceil(len(sizes) / columns)
+        target_height = min(height for _, height in sizes)
+        widths = [width if height == target_height else int(width * target_height / height)
+                  for width, height in sizes]
+
+        grid_rects = []
+        row_widths = []
+        for row in range(rows):
+            cells = widths[row * columns:(row + 1) * columns]
+            x = 0
+            for width in cells:
+                grid_rects.append((x, row * target_height, width, target_height))
+                x += width
+            # Порожні клітинки останнього рядка — чорні, шириною першого кадру (як у compose_grid)
+            row_widths.append(x + (columns - len(cells)) * widths[0])
+        grid_width = max(row_widths)
+        grid_height = rows * target_height
+
+        scale = 1.0
+        if self.max_width and self.max_height:
+            scale = min(1.0, self.max_width / grid_width, self.max_height / grid_height)
+        out_width = int(grid_width * scale)
+        out_height = int(grid_height * scale)
+
+        slots = []
+        for x, y, width, height in grid_rects:
+            x0, y0 = int(x * scale), int(y * scale)
+            x1 = min(out_width, int((x + width) * scale))
+            y1 = min(out_height, int((y + height) * scale))
+            slots.append((x0, y0, x1 - x0, y1 - y0))
+
+        self.canvas = np.zeros((out_height, out_width, 3), dtype=np.uint8)
+        self.slots = slots
+        # Один монітор, що вже влазить у вихідний розмір: компонувати нічого
+        self.passthrough = len(sizes) == 1 and slots[0][2:] == sizes[0]
+        self.source_size = (grid_width, grid_height)
+        self._scratch_buffers = {}
+        self.layouts_computed += 1
+        self._layout_key = key
+        return slots
+
+    def compose(self, frames, out=None):
+        """Рендерить кадри (BGR або BGRA) у out або власне полотно й повертає його.
+
+        BGRA спершу масштабується в невеликий робочий буфер клітинки, а колір
+        конвертується вже прямо у вихідний буфер — без проміжних повнорозмірних копій.
+        out має бути розміру полотна й з чорними порожніми клітинками (див. FramePool).
+        """
+        slots = self.layout([(frame.shape[1], frame.shape[0]) for frame in frames])
+        canvas = self.canvas if out is None else out
+        for index, (frame, (x, y, width, height)) in enumerate(zip(frames, slots)):
+            target = canvas[y:y + height, x:x + width]
+            same_size = frame.shape[1] == width and frame.shape[0] == height
+            if frame.shape[2] == 4:
+                if not same_size:
+                    frame = cv2.resize(frame, (width, height), dst=self._scratch(index, width, height),
+                                       interpolation=cv2.INTER_AREA)
+                cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR, dst=target)
+            elif same_size:
+                np.copyto(target, frame)
+            else:
+                cv2.resize(frame, (width, height), dst=target, interpolation=cv2.INTER_AREA)
+        return canvas
+
+    def _scratch(self, index, width, height):
+        buffer = self._scratch_buffers.get(index)
+        if buffer is None or buffer.shape[:2] != (height, width):
+            buffer = np.empty((height, width, 4), dtype=np.uint8)
+            self._scratch_buffers[index] = buffer
+        return buffer
+
+
+class LabelOverlay:
+    """Плашка з текстом, попередньо відрендерена в BGR-патч і маску.
+
+    text — рядок або функція від datetime; патч перемальовується лише коли текст змінився.
+    dot_color додає кружечок перед текстом (індикатор запису).
+    """
+    FONT = 0  # cv2.FONT_HERSHEY_SIMPLEX — числом, щоб не імпортувати cv2 при завантаженні модуля
+
+    def __init__(self, text, corner="top-left", scale=0.75, thickness=2, text_color=(255, 255, 255),
+                 border_color=(96, 165, 250), background=(0, 0, 0), dot_color=None,
+                 padding_x=18, padding_y=12):
+        self.text = text
+        self.corner = corner
+        self.scale = scale
+        self.thickness = thickness
+        self.text_color = text_color
+        self.border_color = border_color
+        self.background = background
+        self.dot_color = dot_color
+        self.padding_x = padding_x
+        self.padding_y = padding_y
+        self.renders = 0
+        self._label = None
+        self._patch = None
+        self._mask = None
+        self._holes = None
+
+    def render(self, moment):
+        """Оновлює патч, якщо текст для моменту змінився, і повертає його"""
+        label = self.text(moment) if callable(self.text) else self.text
+        if label != self._label:
+            self._patch, self._mask, self._holes = self._draw(label)
+            self._label = label
+            self.renders += 1
+        return self._patch
+
+    @property
+    def patch_size(self):
+        return self._patch.shape[:2]
+
+    def blit(self, region):
+        """Копіює патч у region того ж розміру, не чіпаючи прозорих пікселів"""
+        if self._holes is not None:
+            # Прозорих пікселів кілька (кути рамки): зберегти, скопіювати все зрізом, повернути
+            saved = region[self._holes]
+            region[...] = self._patch
+            region[self._holes] = saved
+        elif self._mask is None:
+            region[...] = self._patch
+        else:
+            np.copyto(region, self._patch, where=self._mask)
+
+    def _draw(self, label):
+        (text_w, text_h), baseline = cv2.getTextSize(label, self.FONT, self.scale, self.thickness)
+        dot = text_h if self.dot_color else 0
+        gap = dot // 2 if dot else 0
+        rect_width = text_w + dot + gap + self.padding_x * 2
+        rect_height = text_h + self.padding_y * 2
+        # Рамка товщиною 2 виходить на піксель за прямокутник — патч має запас у 1 піксель
+        size = (rect_height + 3, rect_width + 3)
+        patch = np.zeros(size + (3,), dtype=np.uint8)
+        mask = np.zeros(size, dtype=np.uint8)
+        for canvas, fill, border, ink, dot_ink in ((patch, self.background, self.border_color, self.text_color,
+                                                    self.dot_color), (mask, 255, 255, 255, 255)):
+            cv2.rectangle(canvas, (1, 1), (1 + rect_width, 1 + rect_height), fill, -1)
+            cv2.rectangle(canvas, (1, 1), (1 + rect_width, 1 + rect_height), border, 2)
+            if dot:
+                cv2.circle(canvas, (1 + self.padding_x + dot // 2, 1 + rect_height // 2), dot // 2, dot_ink, -1)
+            cv2.putText(canvas, label, (1 + self.padding_x + dot + gap, 1 + self.padding_y + text_h - baseline),
+                        self.FONT, self.scale, ink, self.thickness)
+        transparent = mask == 0
+        count = int(np.count_nonzero(transparent))
+        if count == 0:
+            return patch, None, None
+        if count <= 64:
+            return patch, None, np.nonzero(transparent)
+        return patch, ~transparent[..., None], None
+
+
+class OverlayRenderer:
+    """Накладає оверлеї на кадр: текст рендериться раз на секунду, на кадр — лише копія патча"""
+    def __init__(self, overlays=(), margin=OVERLAY_MARGIN, spacing=OVERLAY_SPACING):
+        self.overlays = list(overlays)
+        self.margin = margin
+        self.spacing = spacing
+        self._second = None
+
+    def add(self, overlay):
+        self.overlays.append(overlay)
+        self._second = None
+        return overlay
+
+    def apply(self, image, now=None):
+        """Малює всі оверлеї на image на місці (в кутах, стовпчиком згори вниз)"""
+        now = time.time() if now is None else now
+        second = int(now)
+        if second != self._second:
+            # Текст оверлеїв залежить щонайбільше від секунди — між ними лише копіювання
+            self._second = second
+            moment = datetime.fromtimestamp(second)
+            for overlay in self.overlays:
+                overlay.render(moment)
+        height, width = image.shape[:2]
+        offsets = {}
+        for overlay in self.overlays:
+            patch_height, patch_width = overlay.patch_size
+            y = offsets.get(overlay.corner, self.margin - 1)
+            x = self.margin - 1 if overlay.corner == "top-left" else width - self.margin + 1 - patch_width
+            offsets[overlay.corner] = y + patch_height + self.spacing
+            if x < 0 or y + patch_height > height:
+                continue  # кадр замалий для оверлея
+            overlay.blit(image[y:y + patch_height, x:x + patch_width])
+
+
+def build_json_frame(jpeg, username, room):
+    """Кадр у старому форматі: JSON з base64 JPEG"""
+    return json.dumps({
+        "type": "frame",
+        "user": username,
+        "room": room,
+        "data": base64.b64encode(jpeg).decode("utf-8")
+    })
+
+
+def build_binary_frame(jpeg, seq, timestamp, frame_type=FRAME_TYPE_FRAME, codec=CODEC_JPEG, flags=0):
+    """Бінарний кадр: фіксований заголовок FRAME_HEADER + сирі байти JPEG"""
+    header = FRAME_HEADER.pack(
+        FRAME_MAGIC, FRAME_PROTOCOL_VERSION, frame_type, codec, flags,
+        seq & 0xFFFFFFFF, int(timestamp * 1000)
+    )
+    return header + memoryview(jpeg).cast("B")
+
+
+def build_json_keepalive(seq, timestamp, username, room):
+    """Keepalive у JSON: посилання на останній відправлений кадр"""
+    return json.dumps({
+        "type": "keepalive",
+        "user": username,
+        "room": room,
+        "seq": seq,
+        "timestamp": int(timestamp * 1000)
+    })
+
+
+def parse_binary_frame(data):
+    """Розбирає бінарний кадр; повертає (заголовок як dict, payload)"""
+    if len(data) < FRAME_HEADER.size:
+        raise ValueError("Кадр коротший за заголовок")
+    magic, version, frame_type, codec, flags, seq, timestamp_ms = FRAME_HEADER.unpack_from(data)
+    if magic != FRAME_MAGIC:
+        raise ValueError("Невідомий формат кадру")
+    header = {
+        "version": version,
+        "type": frame_type,
+        "codec": codec,
+        "flags": flags,
+        "seq": seq,
+        "timestamp": timestamp_ms / 1000.0,
+    }
+    return header, memoryview(data)[FRAME_HEADER.size:]
+
+
+class JpegEncoder:
+    """Кодувальник BGR-кадру в JPEG; encode повертає bytes-подібний буфер.
+
+    Підкласи мають бути потокобезпечними: один екземпляр ділять усі воркери кодування.
+    """
+    name = "base"
+
+    def __init__(self, subsampling=JPEG_SUBSAMPLING, fast_dct=JPEG_FAST_DCT):
+        if subsampling not in ("444", "422", "420"):
+            raise ValueError(f"Невідома субдискретизація JPEG: {subsampling}")
+        self.subsampling = subsampling
+        self.fast_dct = fast_dct
+
+    @classmethod
+    def available(cls):
+        return True
+
+    def encode(self, image, quality=JPEG_QUALITY):
+        raise NotImplementedError
+
+
+class Cv2JpegEncoder(JpegEncoder):
+    """cv2.imencode — є завжди; fast DCT не підтримує"""
+    name = "cv2"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._params = []
+        sampling = getattr(cv2, f"IMWRITE_JPEG_SAMPLING_FACTOR_{self.subsampling}", None)
+        if sampling is not None:  # старі збірки OpenCV кодують лише 4:2:0
+            self._params = [cv2.IMWRITE_JPEG_SAMPLING_FACTOR, sampling]
+
+    def encode(self, image, quality=JPEG_QUALITY):
+        success, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality] + self._params)
+        if not success:
+            raise RuntimeError("cv2.imencode не зміг закодувати кадр")
+        return buffer
+
+
+class TurboJpegEncoder(JpegEncoder):
+    """PyTurboJPEG поверх системної libturbojpeg"""
+    name = "turbojpeg"
+    _library = None
+
+    @classmethod
+    def available(cls):
+        if not module_available(turbojpeg):
+            return False
+        if cls._library is None:
+            try:
+                cls._library = turbojpeg.TurboJPEG()
+            except Exception:  # модуль є, а libturbojpeg не знайдено
+                return False
+        return True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.available():
+            raise RuntimeError("libturbojpeg недоступна")
+        self._subsample = {"444": turbojpeg.TJSAMP_444, "422": turbojpeg.TJSAMP_422,
+                           "420": turbojpeg.TJSAMP_420}[self.subsampling]
+        self._flags = turbojpeg.TJFLAG_FASTDCT if self.fast_dct else 0
+
+    def encode(self, image, quality=JPEG_QUALITY):
+        return self._library.encode(np.ascontiguousarray(image), quality=quality,
+                                    pixel_format=turbojpeg.TJPF_BGR,
+                                    jpeg_subsample=self._subsample, flags=self._flags)
+
+
+class SimpleJpegEncoder(JpegEncoder):
+    """simplejpeg (libjpeg-turbo у колесі, без системних залежностей)"""
+    name = "simplejpeg"
+
+    @classmethod
+    def available(cls):
+        return module_available(simplejpeg)
+
+    def encode(self, image, quality=JPEG_QUALITY):
+        return simplejpeg.encode_jpeg(np.ascontiguousarray(image), quality=quality, colorspace="BGR",
+                                      colorsubsampling=self.subsampling, fastdct=self.fast_dct)
+
+
+class PillowJpegEncoder(JpegEncoder):
+    """Pillow / Pillow-SIMD; fast DCT не підтримує"""
+    name = "pillow"
+    SUBSAMPLING = {"444": 0, "422": 1, "420": 2}
+
+    @classmethod
+    def available(cls):
+        return module_available(PILImage)
+
+    def encode(self, image, quality=JPEG_QUALITY):
+        image = np.ascontiguousarray(image)
+        height, width = image.shape[:2]
+        # BGR читається напряму сирим декодером — без cvtColor у RGB
+        picture = PILImage.frombuffer("RGB", (width, height), image, "raw", "BGR", 0, 1)
+        # Свіжий BytesIO: getvalue() віддає його внутрішній буфер без копії. Спільний буфер
+        # копіювався б при кожному наступному записі, а memoryview на нього не пережив би
+        # кодування наступної плитки дельти (BufferError при truncate)
+        output = io.BytesIO()
+        picture.save(output, "JPEG", quality=quality, subsampling=self.SUBSAMPLING[self.subsampling])
+        return output.getvalue()
+
+
+JPEG_ENCODERS = {encoder.name: encoder for encoder in
+                 (Cv2JpegEncoder, TurboJpegEncoder, SimpleJpegEncoder, PillowJpegEncoder)}
+
+
+def jpeg_probe_frame(width, height):
+    """Синтетичний «екран» для мікробенчмарку: фон, панель, рядки тексту"""
+    frame = np.full((height, width, 3), 240, dtype=np.uint8)
+    frame[:height // 20] = (70, 60, 50)
+    for row, y in enumerate(range(height // 10, height - 20, 24)):
+        cv2.putText(frame, f"{row:03d} lorem ipsum dolor sit amet " * 3, (20, y),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (40, 40, 40), 1)
+    frame[height // 3:height // 2, width // 2:] = (200, 140, 60)
+    return frame
+
+
+def benchmark_jpeg_encoders(names=None, rounds=JPEG_PROBE_ROUNDS, size=JPEG_PROBE_SIZE, quality=JPEG_QUALITY,
+                            **options):
+    """Міряє доступні кодувальники: {назва: {"ms", "bytes", "ok"}}; ok — JPEG декодується в той самий розмір"""
+    frame = jpeg_probe_frame(*size)
+    results = {}
+    for name in names or JPEG_ENCODERS:
+        encoder_cls = JPEG_ENCODERS[name]
+        if not encoder_cls.available():
+            continue
+        try:
+            encoder = encoder_cls(**options)
+            jpeg = encoder.encode(frame, quality)  # прогрів
+            started = time.perf_counter()
+            for _ in range(rounds):
+                jpeg = encoder.encode(frame, quality)
+            elapsed = (time.perf_counter() - started) / rounds
+            decoded = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+        except Exception as error:
+            results[name] = {"ms": None, "bytes": 0, "ok": False, "error": str(error)}
+            continue
+        results[name] = {
+            "ms": round(elapsed * 1000, 3),
+            "bytes": len(jpeg),
+            "ok": decoded is not None and decoded.shape == frame.shape,
+        }
+    return results
+
+
+_jpeg_encoder_cache = {}
+
+
+def select_jpeg_encoder(name=JPEG_ENCODER, log=print, **options):
+    """Повертає кодувальник: заданий name або (auto) найшвидший робочий за мікробенчмарком.
+
+    Вибір кешується на процес, тож бенчмарк проганяється лише при першому запуску запису.
+    """
+    key = (name, tuple(sorted(options.items())))
+    if key in _jpeg_encoder_cache:
+        return _jpeg_encoder_cache[key]
+    encoder = None
+    if name != "auto":
+        encoder_cls = JPEG_ENCODERS.get(name)
+        if encoder_cls and encoder_cls.available():
+            encoder = encoder_cls(**options)
+        else:
+            log(f"⚠️ JPEG-кодувальник '{name}' недоступний, використовується cv2")
+            encoder = Cv2JpegEncoder(**options)
+    else:
+        results = benchmark_jpeg_encoders(**options)
+        working = {encoder_name: result for encoder_name, result in results.items() if result["ok"]}
+        best = "cv2"
+        if working:
+            fastest = min(working, key=lambda encoder_name: working[encoder_name]["ms"])
+            if "cv2" not in working or working[fastest]["ms"] < working["cv2"]["ms"] * JPEG_SWITCH_GAIN:
+                best = fastest
+        encoder = JPEG_ENCODERS[best](**options)
+        summary = ", ".join(f"{encoder_name} {result['ms']} мс" for encoder_name, result in working.items())
+        log(f"🗜️ JPEG-кодувальник: {best} ({summary})")
+    _jpeg_encoder_cache[key] = encoder
+    return encoder
+
+
+class LogShipper:
+    """Фоновий потік, що відправляє рядки логу на /api/recorder/logs/sync.
+
+    submit() лише кладе рядок в обмежену чергу в пам'яті й ніколи не чекає на мережу.
+    Потік збирає пакети (LOG_BATCH_LINES рядків або LOG_BATCH_INTERVAL сек), стискає
+    gzip і відправляє через ApiClient. Якщо сервер недоступний, пакети дописуються у
+    файл переповнення (JSON-рядки), наступна спроба — з експоненційною затримкою; коли
+    сервер повертається, спершу дочищується файл, тож порядок рядків зберігається.
+    """
+    def __init__(self, api, username, room, overflow_path=None):
+        self.api = api
+        self.username = username
+        self.room = room
+        self.overflow_path = overflow_path
+        self.sent = 0
+        self.batches = 0
+        self.failures = 0
+        self.spilled = 0
+        self.dropped = 0
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._next_attempt = 0.0
+        self._overflow_lock = threading.Lock()  # у файл пише й close(), якщо потік не встиг
+        self._thread = threading.Thread(target=self._run, name="log-shipper", daemon=True)
+        self._thread.start()
+
+    def submit(self, line):
+        with self._cond:
+            if len(self._queue) >= LOG_QUEUE_LINES:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(line)
+            if len(self._queue) >= LOG_BATCH_LINES:
+                self._cond.notify()
+
+    def close(self, timeout=LOG_SYNC_TIMEOUT + 5):
+        """Остання спроба відправити чергу (якщо сервер не в паузі після збою); решта — у файл.
+
+        timeout покриває щонайменше одну відправку; якщо потік і далі чекає на мережу,
+        решту черги у файл переповнення скидає вже потік, що закриває.
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            self._spill(self._take_all())
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._stopped or len(self._queue) >= LOG_BATCH_LINES,
+                                    LOG_BATCH_INTERVAL)
+                stopping = self._stopped
+            if time.time() >= self._next_attempt:
+                if self._ship_overflow():
+                    while self._ship_batch():
+                        pass
+            self._spill_if_backing_off()
+            if stopping:
+                self._spill(self._take_all())
+                return
+
+    def _take(self, max_bytes=LOG_BATCH_MAX_BYTES):
+        with self._cond:
+            batch, size = [], 0
+            while self._queue and size < max_bytes:
+                line = self._queue.popleft()
+                batch.append(line)
+                size += len(line) + 1
+            return batch
+
+    def _take_all(self):
+        with self._cond:
+            batch = list(self._queue)
+            self._queue.clear()
+            return batch
+
+    def _ship_batch(self):
+        """Відправляє один пакет з черги; False — черга порожня або сервер недоступний"""
+        batch = self._take()
+        if not batch:
+            return False
+        if self._send(batch):
+            return True
+        self._spill(batch)
+        return False
+
+    def _send(self, lines):
+        body = gzip.compress(json.dumps(
+            {"username": self.username, "room": self.room, "logs": lines}, ensure_ascii=False
+        ).encode("utf-8"), compresslevel=6)
+        try:
+            response = self.api.post(
+                "/api/recorder/logs/sync",
+                data=body,
+                headers={"Content-Type": "application/json", "Content-Encoding": "gzip"},
+                timeout=LOG_SYNC_TIMEOUT,
+            )
+            ok = response.status_code == 200
+            error = None if ok else f"HTTP {response.status_code}"
+        except Exception as send_error:
+            ok, error = False, f"{type(send_error).__name__}: {send_error}"
+        if ok:
+            self.sent += len(lines)
+            self.batches += 1
+            self.failures = 0
+            self._next_attempt = 0.0
+            return True
+        self.failures += 1
+        delay = backoff_delay(self.failures, cap=UPLOAD_BACKOFF_MAX)
+        self._next_attempt = time.time() + delay
+        print(f"⚠️ Синхронізація логів не вдалася ({error}), повтор через {delay:.0f} сек")
+        return False
+
+    def _spill_if_backing_off(self):
+        """Поки сервер недоступний, пам'ять не росте: накопичене переїжджає у файл"""
+        if self._next_attempt and time.time() < self._next_attempt:
+            with self._cond:
+                backlog = len(self._queue)
+            if backlog >= LOG_BATCH_LINES:
+                self._spill(self._take_all())
+
+    def _spill(self, lines):
+        if not lines:
+            return
+        if not self.overflow_path:
+            self.dropped += len(lines)
+            return
+        try:
+            if os.path.exists(self.overflow_path) and os.path.getsize(self.overflow_path) >= LOG_OVERFLOW_MAX_BYTES:
+                self.dropped += len(lines)
+                return
+            with self._overflow_lock, open(self.overflow_path, "a", encoding="utf-8") as overflow:
+                overflow.writelines(json.dumps(line, ensure_ascii=False) + "\n" for line in lines)
+            self.spilled += len(lines)
+        except OSError as spill_error:
+            self.dropped += len(lines)
+            print(f"⚠️ Не вдалося зберегти логи у файл переповнення: {spill_error}")
+
+    def _ship_overflow(self):
+        """Дочищує файл переповнення; True — файлу немає або він повністю відправлений"""
+        if not self.overflow_path or not os.path.exists(self.overflow_path):
+            return True
+        try:
+            with self._overflow_lock, open(self.overflow_path, "rb") as overflow:
+                lines = self._read_overflow(overflow)
+                offset = overflow.tell()
+        except (OSError, ValueError) as read_error:
+            print(f"⚠️ Файл переповнення логів пошкоджено, пропускаємо: {read_error}")
+            os.remove(self.overflow_path)
+            return True
+        done = 0
+        while done < len(lines):
+            batch, size = [], 0
+            while done + len(batch) < len(lines) and size < LOG_BATCH_MAX_BYTES:
+                batch.append(lines[done + len(batch)])
+                size += len(batch[-1]) + 1
+            if not self._send(batch):
+                break
+            done += len(batch)
+        with self._overflow_lock:
+            # Поки йшла відправка, close() міг дописати у файл — ці рядки теж лишаються
+            with open(self.overflow_path, "rb") as overflow:
+                overflow.seek(offset)
+                remaining = lines[done:] + self._read_overflow(overflow)
+            if remaining:
+                temp_path = self.overflow_path + ".tmp"
+                with open(temp_path, "w", encoding="utf-8") as overflow:
+                    overflow.writelines(json.dumps(line, ensure_ascii=False) + "\n" for line in remaining)
+                os.replace(temp_path, self.overflow_path)
+                return False
+            os.remove(self.overflow_path)
+        return True
+
+    @staticmethod
+    def _read_overflow(overflow):
+        return [json.loads(raw) for raw in overflow.read().decode("utf-8").splitlines() if raw.strip()]
+
+    def snapshot(self):
+        with self._cond:
+            queued = len(self._queue)
+        return {
+            "sent": self.sent,
+            "batches": self.batches,
+            "queued": queued,
+            "spilled": self.spilled,
+            "dropped": self.dropped,
+            "failures": self.failures,
+        }
+
+
+class LogFileWriter:
+    """Буферизований файл логу з ротацією за розміром.
+
+    write() лише додає рядок у буфер; фоновий потік скидає буфер одним write+flush
+    раз на LOG_FLUSH_INTERVAL сек (або раніше, коли набралось LOG_FLUSH_LINES рядків).
+    Коли файл перевищує max_bytes, він стає <file>.1(.gz), старші частини зсуваються,
+    а понад backups — видаляються. close() реєструється в atexit, тож хвіст буфера
+    потрапляє на диск і при аварійному завершенні інтерпретатора.
+    """
+    def __init__(self, path, max_bytes=LOG_FILE_MAX_MB * 1024 * 1024, backups=LOG_FILE_BACKUPS,
+                 compress=LOG_COMPRESS_ROTATED):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = max(1, backups)
+        self.compress = compress
+        self.flushes = 0
+        self.rotations = 0
+        self._buffer = []
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._closed = False
+        self._file = open(path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, line):
+        with self._cond:
+            if self._closed:
+                return
+            self._buffer.append(line)
+            if len(self._buffer) >= LOG_FLUSH_LINES:
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or len(self._buffer) >= LOG_FLUSH_LINES,
+                                    LOG_FLUSH_INTERVAL)
+                if self._closed:
+                    return
+            self.flush()
+
+    def flush(self):
+        rotated = None
+        # Один замок на підміну буфера і запис: інакше два флашери (фоновий потік і close())
+        # можуть записати свої пачки не в тому порядку. write() бере лише _cond і на диск не чекає
+        with self._io_lock:
+            with self._cond:
+                lines, self._buffer = self._buffer, []
+            if not lines or self._file is None:
+                return
+            data = "\n".join(lines) + "\n"
+            try:
+                self._file.write(data)
+                self._file.flush()
+                self._size += len(data.encode("utf-8"))
+                self.flushes += 1
+            except (OSError, ValueError) as write_error:
+                print(f"⚠️ Помилка запису в файл логу: {write_error}")
+                return
+            if self.max_bytes and self._size >= self.max_bytes:
+                rotated = self._rotate()
+        if rotated and self.compress:
+            self._compress(rotated)
+
+    def _rotate(self):
+        """Під self._io_lock: поточний файл стає .1, старші зсуваються; повертає шлях .1"""
+        rotated = None
+        try:
+            self._file.close()
+            for index in range(self.backups, 0, -1):
+                for extension in ("", ".gz"):
+                    candidate = f"{self.path}.{index}{extension}"
+                    if not os.path.exists(candidate):
+                        continue
+                    if index == self.backups:
+                        os.remove(candidate)
+                    else:
+                        os.replace(candidate, f"{self.path}.{index + 1}{extension}")
+            rotated = f"{self.path}.1"
+            os.replace(self.path, rotated)
+            self.rotations += 1
+        except OSError as rotate_error:
+            print(f"⚠️ Не вдалося ротувати файл логу: {rotate_error}")
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+        return rotated
+
+    def _compress(self, path):
+        try:
+            with open(path, "rb") as source, gzip.open(path + ".gz", "wb", compresslevel=6) as target:
+                shutil.copyfileobj(source, target, 1024 * 1024)
+            os.remove(path)
+        except OSError as compress_error:
+            print(f"⚠️ Не вдалося стиснути {path}: {compress_error}")
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=5)
+        self.flush()
+        with self._io_lock:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+        atexit.unregister(self.close)
+
+
 class Logger:
     """Клас для логування в файл, консоль та на сервер"""
-    def __init__(self, log_file_path, api_url=None, username=None, room=None):
+    def __init__(self, log_file_path, api=None, username=None, room=None):
         self.log_file_path = log_file_path
         self.log_file = None
-        self.api_url = api_url
         self.username = username
         self.room = room
-        self.last_sync = 0
-        self.log_buffer = []
+        # Відправка на сервер — у фоновому потоці; log() ніколи не чекає на мережу
+        self.shipper = None
+        if api and username and room:
+            overflow_path = f"{log_file_path}.pending" if log_file_path else None
+            self.shipper = LogShipper(api, username, room, overflow_path)
         
         if log_file_path:
             try:
@@ -108,84 +1025,32 @@ class Logger:
                 log_dir = os.path.dirname(log_file_path)
                 if log_dir and not os.path.exists(log_dir):
                     os.makedirs(log_dir, exist_ok=True)
-                # Відкриваємо файл для додавання
-                self.log_file = open(log_file_path, 'a', encoding='utf-8')
+                # Буферизований запис з ротацією: на гарячому шляху жодного syscall
+                self.log_file = LogFileWriter(log_file_path)
             except Exception as e:
                 print(f"⚠️ Не вдалося відкрити файл логу: {e}")
                 self.log_file = None
     
     def log(self, message):
-        """Записує повідомлення в консоль, файл та на сервер"""
+        """Записує повідомлення в консоль, файл та в чергу відправки на сервер"""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         log_message = f"[{timestamp}] {message}"
         
-        # Виводимо в консоль
-        print(log_message)
+        # Виводимо в консоль (SIMPLE_RECORDER_LOG_CONSOLE=0 — лише файл і сервер)
+        if LOG_CONSOLE:
+            print(log_message)
         
-        # Записуємо в файл
+        # Записуємо в файл (у буфер; на диск — фоновим потоком)
         if self.log_file:
-            try:
-                self.log_file.write(log_message + "\n")
-                self.log_file.flush()  # Примусово записуємо в файл
-            except Exception as e:
-                print(f"⚠️ Помилка запису в файл логу: {e}")
-        
-        # Відправляємо на сервер (якщо налаштовано)
-        if self.api_url and self.username and self.room and requests:
-            try:
-                self.log_buffer.append(log_message)
-                # Відправляємо на сервер кожні 5 секунд або якщо буфер переповнений
-                current_time = time.time()
-                if len(self.log_buffer) >= 10 or (current_time - self.last_sync) >= 5:
-                    self._sync_to_server()
-            except Exception as e:
-                # Логуємо помилку (але не блокуючи виконання)
-                print(f"⚠️ Помилка додавання до буферу логів: {e}")
-    
-    def _sync_to_server(self):
-        """Відправляє буфер логів на сервер"""
-        if not self.log_buffer or not requests:
-            return
+            self.log_file.write(log_message)
         
-        try:
-            # Відправляємо логи на сервер
-            log_data = {
-                "username": self.username,
-                "room": self.room,
-                "logs": self.log_buffer.copy()  # Копіюємо щоб не втратити дані
-            }
-            
-            # Використовуємо verify=False для самопідписаних сертифікатів (як і в інших місцях)
-            response = requests.post(
-                f"{self.api_url}/api/recorder/logs/sync",
-                json=log_data,
-                verify=False,  # Вимикаємо перевірку SSL (як в upload_video)
-                timeout=10  # Збільшуємо таймаут
-            )
-            
-            if response.status_code == 200:
-                synced_count = len(self.log_buffer)
-                self.log_buffer.clear()
-                self.last_sync = time.time()
-                print(f"✅ Синхронізовано {synced_count} записів логів на сервер")
-            else:
-                print(f"⚠️ Помилка синхронізації логів: HTTP {response.status_code}")
-                print(f"   Відповідь: {response.text[:200]}")
-        except requests.exceptions.Timeout:
-            print(f"⚠️ Таймаут синхронізації логів (сервер не відповів за 10 сек)")
-        except requests.exceptions.ConnectionError as e:
-            print(f"⚠️ Помилка з'єднання при синхронізації логів: {e}")
-        except Exception as e:
-            # Показуємо помилку для дебагу
-            print(f"⚠️ Помилка синхронізації логів: {type(e).__name__}: {e}")
-            import traceback
-            traceback.print_exc()
+        if self.shipper:
+            self.shipper.submit(log_message)
     
     def close(self):
         """Закриває файл логу та відправляє останні логи на сервер"""
-        # Відправляємо останні логи перед закриттям
-        if self.log_buffer:
-            self._sync_to_server()
+        if self.shipper:
+            self.shipper.close()
         
         if self.log_file:
             try:
@@ -194,29 +1059,1336 @@ class Logger:
                 pass
 
 
+class StageQueue:
+    """Обмежена черга між стадіями конвеєра з політикою переповнення"""
+    DROP_OLDEST = "drop_oldest"  # живий шлях: новий кадр витісняє найстаріший
+    LOSSLESS = "lossless"        # файл: виробник чекає, кадри не губляться
+
+    def __init__(self, name, maxsize, policy, on_drop=None):
+        self.name = name
+        self.maxsize = max(1, maxsize)
+        self.policy = policy
+        self.on_drop = on_drop
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.put_count = 0
+        self.dropped = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.get_count = 0
+
+    def put(self, item):
+        """Додає елемент; False якщо черга вже закрита"""
+        with self._cond:
+            if self.policy == self.DROP_OLDEST:
+                while len(self._items) >= self.maxsize:
+                    _, dropped = self._items.popleft()
+                    self.dropped += 1
+                    FRAMES_DROPPED.inc(1, self.name)
+                    if self.on_drop:
+                        self.on_drop(dropped)
+            else:
+                while len(self._items) >= self.maxsize and not self._closed:
+                    self._cond.wait()
+            if self._closed:
+                return False
+            self._items.append((time.perf_counter(), item))
+            self.put_count += 1
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """Повертає наступний елемент або None, якщо черга закрита і порожня"""
+        with self._cond:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self._items:
+                if self._closed:
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            queued_at, item = self._items.popleft()
+            waited = time.perf_counter() - queued_at
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            self.get_count += 1
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    @property
+    def depth(self):
+        return len(self._items)
+
+    def snapshot(self):
+        with self._cond:
+            avg_wait = self.wait_total / self.get_count if self.get_count else 0.0
+            return {
+                "depth": len(self._items),
+                "maxsize": self.maxsize,
+                "policy": self.policy,
+                "put": self.put_count,
+                "dropped": self.dropped,
+                "wait_avg_ms": round(avg_wait * 1000, 2),
+                "wait_max_ms": round(self.wait_max * 1000, 2),
+            }
+
+
+class StageStats:
+    """Накопичує час виконання однієї стадії конвеєра"""
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        STAGE_SECONDS.observe(seconds, self.name)
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.last = seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def snapshot(self):
+        with self._lock:
+            avg = self.total / self.count if self.count else 0.0
+            return {
+                "count": self.count,
+                "avg_ms": round(avg * 1000, 2),
+                "max_ms": round(self.max * 1000, 2),
+                "last_ms": round(self.last * 1000, 2),
+            }
+
+
+class ChangeDetector:
+    """Дешевий детектор змін: порівнює зменшений сірий відбиток кадру з останнім відправленим"""
+    def __init__(self, threshold=CHANGE_THRESHOLD, max_interval=FORCE_FRAME_INTERVAL, size=FINGERPRINT_SIZE):
+        self.threshold = threshold
+        self.max_interval = max_interval
+        self.size = size
+        self.checked = 0
+        self.skipped = 0
+        self._reference = None
+        self._reference_at = 0.0
+
+    def fingerprint(self, image):
+        small = cv2.resize(image, self.size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def should_send(self, image, now):
+        """True якщо кадр змінився або настав час примусового повного кадру"""
+        self.checked += 1
+        if self.threshold <= 0:
+            return True
+        fingerprint = self.fingerprint(image)
+        changed = (
+            self._reference is None
+            or now - self._reference_at >= self.max_interval
+            or float(cv2.absdiff(fingerprint, self._reference).max()) >= self.threshold
+        )
+        if changed:
+            # Порівнюємо з останнім відправленим, тож повільний дрейф теж накопичиться
+            self._reference = fingerprint
+            self._reference_at = now
+        else:
+            self.skipped += 1
+        return changed
+
+    @property
+    def skip_ratio(self):
+        return self.skipped / self.checked if self.checked else 0.0
+
+
+class AdaptiveQualityController:
+    """Підлаштовує живий стрім під канал: крок по QUALITY_LADDER (JPEG, роздільність, FPS).
+
+    Кожні ADAPTIVE_WINDOW сек дивиться на зайнятість ws.send, досягнутий FPS, байти/с
+    і скинуті кадри живих черг. Вниз — одразу після перевантаженого вікна, вгору — лише
+    після ADAPTIVE_UP_WINDOWS здорових вікон поспіль; після зміни — пауза (гістерезис).
+    """
+    def __init__(self, log, ladder=QUALITY_LADDER, best_level=ADAPTIVE_BEST_LEVEL,
+                 worst_level=ADAPTIVE_WORST_LEVEL, enabled=ADAPTIVE_QUALITY_ENABLED, window=ADAPTIVE_WINDOW):
+        self._log = log
+        self.ladder = ladder
+        self.best_level = max(0, min(best_level, len(ladder) - 1))
+        self.worst_level = max(self.best_level, min(worst_level, len(ladder) - 1))
+        self.enabled = enabled
+        self.window = window
+        self.level = self.best_level
+        self.changes = 0
+        self.last_window = {}
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._send_time = 0.0
+        self._bytes = 0
+        self._frames = 0
+        self._drops_at_start = 0
+        self._good_windows = 0
+        self._cooldown = 0
+
+    @property
+    def current(self):
+        return self.ladder[self.level]
+
+    def record_send(self, seconds, nbytes, frame=True):
+        with self._lock:
+            self._send_time += seconds
+            self._bytes += nbytes
+            if frame:
+                self._frames += 1
+
+    def evaluate(self, drops_total, now=None):
+        """Закриває вікно вимірювань, якщо воно минуло; повертає новий рівень або None"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            duration = now - self._window_start
+            if duration < self.window:
+                return None
+            busy = self._send_time / duration
+            drops = drops_total - self._drops_at_start
+            self.last_window = {
+                "busy": round(busy, 3),
+                "fps": round(self._frames / duration, 2),
+                "bytes_per_sec": int(self._bytes / duration),
+                "drops": drops,
+            }
+            self._window_start = now
+            self._send_time = 0.0
+            self._bytes = 0
+            self._frames = 0
+            self._drops_at_start = drops_total
+
+            if not self.enabled:
+                return None
+            if self._cooldown:
+                self._cooldown -= 1
+                return None
+
+            congested = busy > ADAPTIVE_CONGESTED_BUSY or drops >= ADAPTIVE_CONGESTED_DROPS
+            healthy = busy < ADAPTIVE_HEALTHY_BUSY and drops == 0
+            if congested:
+                self._good_windows = 0
+                if self.level < self.worst_level:
+                    return self._change(self.level + 1, "↓")
+            elif healthy:
+                self._good_windows += 1
+                if self._good_windows >= ADAPTIVE_UP_WINDOWS and self.level > self.best_level:
+                    return self._change(self.level - 1, "↑")
+            else:
+                self._good_windows = 0
+            return None
+
+    def _change(self, level, arrow):
+        previous = self.level
+        self.level = level
+        self.changes += 1
+        self._good_windows = 0
+        self._cooldown = ADAPTIVE_COOLDOWN_WINDOWS
+        target = self.current
+        window = self.last_window
+        self._log(
+            f"🎚️ Якість {arrow} рівень {previous}→{level}: {target.fps} FPS, JPEG {target.quality}, "
+            f"≤{target.max_width}x{target.max_height} | send {window['busy']:.0%} часу, "
+            f"{window['fps']:.1f} FPS, {window['bytes_per_sec'] / 1024:.0f} KB/s, скинуто {window['drops']}"
+        )
+        return level
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "level": self.level,
+                "settings": self.current._asdict(),
+                "changes": self.changes,
+                "last_window": dict(self.last_window),
+            }
+
+
+def tighter_limit(first, second):
+    """Менше з двох обмежень розміру, де 0 означає «без обмеження»"""
+    if not first or not second:
+        return first or second
+    return min(first, second)
+
+
+def looser_limit(first, second):
+    """Більше з двох обмежень розміру, де 0 означає «без обмеження»"""
+    if not first or not second:
+        return 0
+    return max(first, second)
+
+
+def fit_within(image, max_width, max_height, interpolation=None):
+    """Зменшує кадр, щоб він вліз у max_width × max_height (без збільшення); за замовчуванням INTER_AREA"""
+    height, width = image.shape[:2]
+    if not (max_width and max_height) or (width <= max_width and height <= max_height):
+        return image
+    scale = min(max_width / width, max_height / height)
+    return cv2.resize(image, (int(width * scale), int(height * scale)),
+                      interpolation=cv2.INTER_AREA if interpolation is None else interpolation)
+
+
+class TileDeltaEncoder:
+    """Дельта-кодування живого стріму: JPEG лише для змінених плиток сітки.
+
+    Еталон — останній закодований кадр; ланцюжок дельт переривається лише
+    ключовим кадром (за інтервалом, зміною розміру або request_keyframe()).
+    """
+    def __init__(self, tile_size=DELTA_TILE_SIZE, keyframe_interval=DELTA_KEYFRAME_INTERVAL,
+                 max_dirty_ratio=DELTA_MAX_DIRTY_RATIO, quality=JPEG_QUALITY, encoder=None):
+        self.tile_size = tile_size
+        self.keyframe_interval = keyframe_interval
+        self.max_dirty_ratio = max_dirty_ratio
+        self.quality = quality
+        self.encoder = encoder or Cv2JpegEncoder()
+        self.keyframes = 0
+        self.deltas = 0
+        self.tiles_sent = 0
+        self._lock = threading.Lock()
+        self._reference = None
+        self._reference_frame = None
+        self._reference_seq = -1
+        self._keyframe_at = 0.0
+        self._force_keyframe = True
+
+    def request_keyframe(self):
+        """Ланцюжок у переглядача розірвано (кадр загублено) — наступним буде ключовий"""
+        self._force_keyframe = True
+
+    def dirty_tiles(self, current, reference):
+        """Булева матриця (рядки × стовпці) плиток, де змінився хоч один піксель"""
+        height = current.shape[0]
+        tile = self.tile_size
+        channels = current.shape[2] if current.ndim == 3 else 1
+        # Максимум різниці по блоках через reshape-перегляди, без копій і паддингу
+        diff = cv2.absdiff(current, reference).reshape(height, -1)
+        by_rows = self._reduce_blocks(diff, tile)
+        by_tiles = self._reduce_blocks(np.ascontiguousarray(by_rows.T), tile * channels)
+        return by_tiles.T > 0
+
+    @staticmethod
+    def _reduce_blocks(array, block):
+        """max по блоках з block рядків; неповний останній блок — окремо"""
+        full = array.shape[0] // block
+        parts = []
+        if full:
+            parts.append(array[:full * block].reshape(full, block, -1).max(axis=1))
+        if array.shape[0] % block:
+            parts.append(array[full * block:].max(axis=0, keepdims=True))
+        return parts[0] if len(parts) == 1 else np.vstack(parts)
+
+    def dirty_rects(self, dirty, width, height):
+        """Зливає сусідні змінені плитки рядка в прямокутники (менше JPEG-заголовків)"""
+        tile = self.tile_size
+        rects = []
+        for row in np.flatnonzero(dirty.any(axis=1)):
+            edges = np.flatnonzero(np.diff(np.concatenate(([0], dirty[row].view(np.int8), [0]))))
+            y = int(row) * tile
+            h = min(tile, height - y)
+            for start, end in zip(edges[::2], edges[1::2]):
+                x = int(start) * tile
+                rects.append((x, y, min(int(end) * tile, width) - x, h))
+        return rects
+
+    def _encode_jpeg(self, image):
+        return self.encoder.encode(image, self.quality)
+
+    def encode(self, frame):
+        """Повертає (повідомлення, base_seq) або None, якщо кадр застарів чи нічого не змінилось.
+
+        base_seq — кадр, поверх якого застосовується дельта (None для ключового кадру).
+        """
+        with self._lock:
+            if frame.seq <= self._reference_seq:
+                return None
+            image = frame.image
+            height, width = image.shape[:2]
+            keyframe = (
+                self._force_keyframe
+                or self._reference is None
+                or self._reference.shape != image.shape
+                or frame.timestamp - self._keyframe_at >= self.keyframe_interval
+            )
+            if not keyframe:
+                dirty = self.dirty_tiles(image, self._reference)
+                dirty_count = int(dirty.sum())
+                if dirty_count == 0:
+                    return None
+                keyframe = dirty_count > self.max_dirty_ratio * dirty.size
+
+            if keyframe:
+                message = build_binary_frame(self._encode_jpeg(image), frame.seq, frame.timestamp)
+                base_seq = None
+                self._keyframe_at = frame.timestamp
+                self._force_keyframe = False
+                self.keyframes += 1
+            else:
+                base_seq = self._reference_seq
+                rects = self.dirty_rects(dirty, width, height)
+                parts = [DELTA_HEADER.pack(width, height, base_seq & 0xFFFFFFFF, len(rects))]
+                for x, y, w, h in rects:
+                    jpeg = self._encode_jpeg(image[y:y + h, x:x + w])
+                    parts.append(TILE_HEADER.pack(x, y, w, h, len(jpeg)))
+                    parts.append(jpeg)
+                message = build_binary_frame(b"".join(parts), frame.seq, frame.timestamp,
+                                             frame_type=FRAME_TYPE_DELTA)
+                self.deltas += 1
+                self.tiles_sent += len(rects)
+
+            # Кадри в конвеєрі не змінюються після захоплення — копія не потрібна,
+            # достатньо притримати буфер у пулі, поки він є еталоном
+            if self._reference_frame is not None:
+                self._reference_frame.release()
+            self._reference_frame = frame.retain()
+            self._reference = image
+            self._reference_seq = frame.seq
+            return message, base_seq
+
+
+class FramePool:
+    """Пул перевикористовуваних буферів кадрів: у сталому режимі великі масиви не виділяються.
+
+    Буфери виділяються нулями, тож порожні клітинки сітки лишаються чорними;
+    при зміні розкладки пул очищується (clear).
+    """
+    def __init__(self, max_free=FILE_QUEUE_SIZE + LIVE_QUEUE_SIZE * 2 + ENCODE_WORKERS + 4):
+        self.max_free = max_free
+        self.shape = None
+        self.allocated = 0
+        self.reused = 0
+        self._free = []
+        self._lock = threading.Lock()
+
+    def acquire(self, shape):
+        with self._lock:
+            if shape != self.shape:
+                self._free.clear()
+                self.shape = shape
+            if self._free:
+                self.reused += 1
+                return self._free.pop()
+            self.allocated += 1
+        return np.zeros(shape, dtype=np.uint8)
+
+    def clear(self):
+        with self._lock:
+            self._free.clear()
+            self.shape = None
+
+    def retain(self, frame):
+        with self._lock:
+            frame._refs += 1
+
+    def release(self, frame):
+        with self._lock:
+            frame._refs -= 1
+            if frame._refs > 0:
+                return
+            image = frame.image
+            frame.image = None
+            if image is not None and image.shape == self.shape and len(self._free) < self.max_free:
+                self._free.append(image)
+
+    def snapshot(self):
+        with self._lock:
+            return {"allocated": self.allocated, "reused": self.reused, "free": len(self._free)}
+
+
+class CapturedFrame:
+    """Кадр, що рухається конвеєром.
+
+    Кадр із пулу має лічильник посилань: кожна стадія, що тримає кадр, робить
+    retain(), а після обробки — release(); останній release повертає буфер у пул.
+    """
+    __slots__ = ("seq", "timestamp", "captured_at", "image", "_pool", "_refs")
+
+    def __init__(self, seq, timestamp, image, pool=None, captured_at=None):
+        self.seq = seq
+        self.timestamp = timestamp  # час за годинником (для переглядача)
+        self.captured_at = timestamp if captured_at is None else captured_at  # time.monotonic() (для таймінгу)
+        self.image = image
+        self._pool = pool
+        self._refs = 1
+
+    def retain(self):
+        if self._pool is not None:
+            self._pool.retain(self)
+        return self
+
+    def release(self):
+        if self._pool is not None:
+            self._pool.release(self)
+
+
+class FramePipeline:
+    """Конвеєр запису: потік захоплення, пул кодувальників, запис у файл і відправка.
+
+    Стадії з'єднані обмеженими чергами: живий шлях (кодування → відправка)
+    викидає найстаріші кадри, файловий шлях працює без втрат.
+    """
+    STAGES = ("capture", "compose", "detect", "encode", "write", "send")
+
+    def __init__(self, recorder, monitor_indices, encode_workers=ENCODE_WORKERS,
+                 record_profile=RECORD_PROFILE, stream_profile=STREAM_PROFILE):
+        self.recorder = recorder
+        self.monitor_indices = monitor_indices
+        self.encode_workers = max(1, encode_workers)
+        self.record_profile = record_profile
+        self.stream_profile = stream_profile
+        self.capture_fps = max(record_profile.fps, stream_profile.fps)
+        self.encode_queue = StageQueue("encode", LIVE_QUEUE_SIZE, StageQueue.DROP_OLDEST,
+                                       on_drop=CapturedFrame.release)
+        self.send_queue = StageQueue("send", LIVE_QUEUE_SIZE, StageQueue.DROP_OLDEST)
+        self.write_queue = StageQueue("write", FILE_QUEUE_SIZE, StageQueue.LOSSLESS)
+        self.stats = {name: StageStats(name) for name in self.STAGES}
+        self.detector = ChangeDetector()
+        self.jpeg_encoder = select_jpeg_encoder(log=self._log)
+        self.delta_encoder = TileDeltaEncoder(encoder=self.jpeg_encoder)
+        self.delta_broken = 0
+        self.quality = AdaptiveQualityController(self._log)
+        # Спільне полотно — у більшому з розмірів двох профілів; кожен вихід далі зменшує сам
+        self.compositor = GridCompositor(
+            looser_limit(record_profile.max_width, stream_profile.max_width),
+            looser_limit(record_profile.max_height, stream_profile.max_height),
+        )
+        self.pool = FramePool()
+        self.overlay = self._build_overlay()
+        self.clock = FrameClock(self.capture_fps)
+        self.timeline = FrameTimeline(record_profile.fps)
+        self._timeline_writer = None
+        self._last_live_at = float("-inf")
+        self._last_record_at = float("-inf")
+        self._record_buffer = None
+        self.captured_count = 0
+        self.keepalive_count = 0
+        self.sent_count = 0
+        self.bytes_sent = 0
+        self.stale_dropped = 0
+        self._last_sent_seq = -1
+        self._encode_threads = []
+        self._writer_thread = None
+        self._sender_thread = None
+        self._register_metrics()
+
+    def _register_metrics(self):
+        """Значення, що вже є в конвеєрі, читаються в момент запиту метрик"""
+        queues = (self.encode_queue, self.send_queue, self.write_queue)
+        METRICS.callback("queue_depth", "Current depth of a pipeline queue",
+                         lambda: {(queue.name,): queue.depth for queue in queues}, labels=("queue",))
+        METRICS.callback("quality_level", "Adaptive live quality level (0 = best)", lambda: self.quality.level)
+        METRICS.callback("frame_pool_free", "Free buffers in the frame pool",
+                         lambda: self.pool.snapshot().get("free"))
+
+    def _log(self, message):
+        self.recorder._log(message)
+
+    def snapshot(self):
+        """Глибина черг і затримки стадій — щоб бачити, де витрачається час"""
+        return {
+            "captured": self.captured_count,
+            "sent": self.sent_count,
+            "bytes_sent": self.bytes_sent,
+            "stale_dropped": self.stale_dropped,
+            "unchanged_skipped": self.detector.skipped,
+            "skip_ratio": round(self.detector.skip_ratio, 3),
+            "keepalives": self.keepalive_count,
+            "delta": {
+                "keyframes": self.delta_encoder.keyframes,
+                "deltas": self.delta_encoder.deltas,
+                "tiles": self.delta_encoder.tiles_sent,
+                "chain_broken": self.delta_broken,
+            },
+            "quality": self.quality.snapshot(),
+            "pool": self.pool.snapshot(),
+            "jpeg_encoder": self.jpeg_encoder.name,
+            "profiles": {"record": self.record_profile._asdict(), "stream": self.stream_profile._asdict()},
+            "clock": self.clock.snapshot(),
+            "timeline": self.timeline.snapshot(),
+            "queues": {q.name: q.snapshot() for q in (self.encode_queue, self.send_queue, self.write_queue)},
+            "stages": {name: stats.snapshot() for name, stats in self.stats.items()},
+        }
+
+    def format_stats(self):
+        snap = self.snapshot()
+        stages = " ".join(f"{name}={data['avg_ms']:.1f}ms" for name, data in snap["stages"].items())
+        queues = " ".join(
+            f"{name}={data['depth']}/{data['maxsize']}(-{data['dropped']})"
+            for name, data in snap["queues"].items()
+        )
+        return f"⏱️ {stages} | 📥 {queues}"
+
+    def run(self):
+        """Запускає робочі потоки і крутить захоплення в поточному потоці до зупинки запису"""
+        self._start_workers()
+        try:
+            self._capture_loop()
+        finally:
+            self._shutdown()
+
+    def _start_workers(self):
+        for index in range(self.encode_workers):
+            thread = threading.Thread(target=self._encode_loop, name=f"encode-{index}", daemon=True)
+            thread.start()
+            self._encode_threads.append(thread)
+        self._writer_thread = threading.Thread(target=self._write_loop, name="writer", daemon=True)
+        self._writer_thread.start()
+        self._sender_thread = threading.Thread(target=self._send_loop, name="sender", daemon=True)
+        self._sender_thread.start()
+        self._log(f"🧵 Конвеєр: {self.encode_workers} кодувальник(ів), файл і відправка в окремих потоках")
+
+    def _shutdown(self):
+        self.encode_queue.close()
+        self.write_queue.close()
+        for thread in self._encode_threads:
+            thread.join(timeout=5)
+        self.send_queue.close()
+        # Файловий шлях без втрат — чекаємо поки всі кадри будуть записані
+        if self._writer_thread:
+            self._writer_thread.join()
+        if self._sender_thread:
+            self._sender_thread.join(timeout=5)
+        self._log(f"📊 Підсумок конвеєра: {json.dumps(self.snapshot(), ensure_ascii=False)}")
+
+    def _capture_loop(self):
+        recorder = self.recorder
+        with mss.mss() as sct:
+            monitors = [sct.monitors[i + 1] for i in self.monitor_indices]
+            self._log(f"Захоплюємо екрани: {self.monitor_indices}")
+
+            self.clock.start()
+            while recorder.is_recording:
+                loop_start = time.time()
+                captured_at = time.monotonic()
+                frame = None
+                try:
+                    composite = self._capture_composite(sct, monitors)
+
+                    frame = CapturedFrame(self.captured_count, loop_start, composite, self.pool, captured_at)
+                    self.captured_count += 1
+                    FRAMES_TOTAL.inc(1, "captured")
+                    # Кадр спільний для обох шляхів і далі не змінюється;
+                    # кожен вихід проріджує кадри до свого FPS
+                    if self._due(self._last_record_at, self.record_profile.fps, captured_at):
+                        self._last_record_at = captured_at
+                        if not self.write_queue.put(frame.retain()):
+                            frame.release()
+
+                    # Живий стрім може йти з меншим FPS, ніж захоплення (профіль і адаптивна якість)
+                    if self._due(self._last_live_at, self._live_settings().fps, captured_at):
+                        self._last_live_at = captured_at
+                        started = time.perf_counter()
+                        changed = self.detector.should_send(composite, loop_start)
+                        self.stats["detect"].record(time.perf_counter() - started)
+                        if changed and not self.encode_queue.put(frame.retain()):
+                            frame.release()
+                except Exception as capture_error:
+                    self._log(f"Помилка запису: {capture_error}")
+                finally:
+                    if frame is not None:
+                        frame.release()
+
+                # Дедлайни від старту запису, а не «інтервал мінус час кадру» — без дрейфу
+                self.clock.wait()
+
+    def _due(self, last_at, fps, now):
+        """Чи настав час наступного кадру виходу з частотою fps (з допуском у пів кадру захоплення)"""
+        return now - last_at >= 1.0 / fps - 0.5 / self.capture_fps
+
+    def _live_settings(self):
+        """Поточний рівень адаптивної якості, обмежений профілем стріму"""
+        settings = self.quality.current
+        profile = self.stream_profile
+        return settings._replace(
+            fps=min(settings.fps, profile.fps),
+            max_width=tighter_limit(settings.max_width, profile.max_width),
+            max_height=tighter_limit(settings.max_height, profile.max_height),
+        )
+
+    def _capture_composite(self, sct, monitors):
+        started = time.perf_counter()
+        screenshots = [sct.grab(mon) for mon in monitors]
+        grabbed = time.perf_counter()
+        self.stats["capture"].record(grabbed - started)
+        # Перегляд сирого BGRA буфера mss без копіювання; єдина копія — конвертація
+        # кольору прямо в буфер кадру з пулу
+        frames = [np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+                  for shot in screenshots]
+
+        compositor = self.compositor
+        layouts = compositor.layouts_computed
+        compositor.layout([(frame.shape[1], frame.shape[0]) for frame in frames])
+        if compositor.layouts_computed != layouts:
+            self.pool.clear()
+            width, height = compositor.source_size
+            new_width, new_height = compositor.output_size
+            self._log(f"🧩 Розкладка {len(frames)} екран(ів): {width}x{height} → {new_width}x{new_height}")
+        composite = compositor.compose(frames, out=self.pool.acquire(compositor.canvas.shape))
+
+        self.overlay.apply(composite)
+        self.stats["compose"].record(time.perf_counter() - grabbed)
+        return composite
+
+    def _build_overlay(self):
+        recorder = self.recorder
+        name = recorder.username or 'Streamer'
+        overlay = OverlayRenderer()
+        overlay.add(LabelOverlay(lambda moment: f"{name} | {moment:%H:%M:%S}"))
+        if OVERLAY_SHOW_ROOM and recorder.room:
+            overlay.add(LabelOverlay(recorder.room))
+        if OVERLAY_REC_INDICATOR:
+            overlay.add(LabelOverlay("REC", corner="top-right", dot_color=(40, 40, 230),
+                                     border_color=(40, 40, 230)))
+        return overlay
+
+    def _encode_loop(self):
+        recorder = self.recorder
+        while True:
+            pooled = self.encode_queue.get()
+            if pooled is None:
+                return
+            frame = pooled
+            try:
+                started = time.perf_counter()
+                settings = self._live_settings()
+                live_image = fit_within(frame.image, settings.max_width, settings.max_height)
+                if live_image is not frame.image:
+                    frame = CapturedFrame(frame.seq, frame.timestamp, live_image)
+                if recorder.ws_delta:
+                    self.delta_encoder.quality = settings.quality
+                    encoded = self.delta_encoder.encode(frame)
+                    if encoded is None:
+                        continue
+                    message, base_seq = encoded
+                else:
+                    buffer = self.jpeg_encoder.encode(frame.image, settings.quality)
+                    base_seq = None
+                    if recorder.ws_binary:
+                        message = build_binary_frame(buffer, frame.seq, frame.timestamp)
+                    else:
+                        message = build_json_frame(buffer, recorder.username, recorder.room)
+                self.stats["encode"].record(time.perf_counter() - started)
+                self.send_queue.put((frame.seq, message, base_seq))
+            except Exception as encode_error:
+                self._log(f"⚠️ Помилка кодування кадру: {encode_error}")
+            finally:
+                pooled.release()
+
+    def _write_loop(self):
+        recorder = self.recorder
+        while True:
+            frame = self.write_queue.get()
+            if frame is None:
+                return
+            started = time.perf_counter()
+            try:
+                image = self._record_image(frame.image)
+                recorder.ensure_video_writer(image, self.record_profile.fps)
+                writer = recorder.video_writer
+                if writer:
+                    if writer is not self._timeline_writer:
+                        # Новий файл (сегмент) починає власну шкалу часу
+                        self._timeline_writer = writer
+                        self.timeline.restart(frame.captured_at)
+                    try:
+                        # Кадр займає стільки слотів FPS файлу, скільки часу минуло (0 — слот уже зайнятий)
+                        for _ in range(self.timeline.repeats(frame.captured_at)):
+                            writer.write(image)
+                    except Exception as write_error:
+                        self._log(f"Помилка запису відео: {write_error}")
+            finally:
+                frame.release()
+            self.stats["write"].record(time.perf_counter() - started)
+
+    def _record_image(self, image):
+        """Зменшує кадр до профілю файлу в буфер, що перевикористовується (писач один)"""
+        profile = self.record_profile
+        height, width = image.shape[:2]
+        if not (profile.max_width and profile.max_height) or (
+                width <= profile.max_width and height <= profile.max_height):
+            return image
+        scale = min(profile.max_width / width, profile.max_height / height)
+        shape = (int(height * scale), int(width * scale), 3)
+        if self._record_buffer is None or self._record_buffer.shape != shape:
+            self._record_buffer = np.empty(shape, dtype=np.uint8)
+        return cv2.resize(image, (shape[1], shape[0]), dst=self._record_buffer, interpolation=cv2.INTER_AREA)
+
+    def _ws_send(self, message):
+        recorder = self.recorder
+        if isinstance(message, bytes):
+            recorder.ws.send(message, opcode=websocket.ABNF.OPCODE_BINARY)
+        else:
+            recorder.ws.send(message)
+        self.bytes_sent += len(message)
+        BYTES_SENT.inc(len(message))
+
+    def _send_keepalive(self):
+        """Незмінений екран: дешеве посилання на останній кадр замість повного JPEG"""
+        recorder = self.recorder
+        if self._last_sent_seq < 0 or not (recorder.ws_connected and recorder.ws):
+            return
+        now = time.time()
+        if recorder.ws_binary:
+            message = build_binary_frame(b"", self._last_sent_seq, now,
+                                         frame_type=FRAME_TYPE_KEEPALIVE, codec=CODEC_NONE)
+        else:
+            message = build_json_keepalive(self._last_sent_seq, now, recorder.username, recorder.room)
+        try:
+            started = time.perf_counter()
+            self._ws_send(message)
+            self.quality.record_send(time.perf_counter() - started, len(message), frame=False)
+            self.keepalive_count += 1
+            FRAMES_TOTAL.inc(1, "keepalive")
+        except Exception as send_error:
+            self._log(f"⚠️ Помилка відправки keepalive: {send_error}")
+
+    def _live_drops(self):
+        return self.encode_queue.dropped + self.send_queue.dropped + self.delta_broken
+
+    def _send_loop(self):
+        recorder = self.recorder
+        start_time = time.time()
+        while True:
+            item = self.send_queue.get(timeout=KEEPALIVE_INTERVAL)
+            self.quality.evaluate(self._live_drops())
+            if item is None:
+                if self.send_queue.closed:
+                    return
+                self._send_keepalive()
+                continue
+            seq, message, base_seq = item
+            # Кодувальники паралельні — кадр, що відстав від уже відправленого, не потрібен
+            if seq <= self._last_sent_seq:
+                self.stale_dropped += 1
+                FRAMES_DROPPED.inc(1, "stale")
+                continue
+            # Дельта має сенс лише поверх кадру, який переглядач уже отримав
+            if base_seq is not None and base_seq != self._last_sent_seq:
+                self.delta_broken += 1
+                FRAMES_DROPPED.inc(1, "delta_chain")
+                self.delta_encoder.request_keyframe()
+                continue
+
+            # Проверяем WebSocket соединение через флаг
+            if recorder.ws_connected and recorder.ws:
+                try:
+                    started = time.perf_counter()
+                    self._ws_send(message)
+                    send_time = time.perf_counter() - started
+                    self.stats["send"].record(send_time)
+                    self.quality.record_send(send_time, len(message))
+                    self._last_sent_seq = seq
+                    self.sent_count += 1
+                    FRAMES_TOTAL.inc(1, "sent")
+                    frame_count = self.sent_count
+                    elapsed = time.time() - start_time
+                    fps = frame_count / elapsed if elapsed > 0 else 0
+                    capture_fps = self.captured_count / elapsed if elapsed > 0 else 0
+
+                    if frame_count % 25 == 0:
+                        self._log(f"📤 Відправлено {frame_count} кадрів | FPS: {fps:.1f} | "
+                                  f"пропущено незмінних: {self.detector.skip_ratio:.0%}")
+                        self._log(self.format_stats())
+
+                    recorder.update_stats(
+                        f"📊 FPS: {fps:.1f}/{capture_fps:.1f} | Кадрів: {frame_count} | "
+                        f"Пропущено: {self.detector.skip_ratio:.0%} | Якість: L{self.quality.level} | "
+                        f"Черги: {self.encode_queue.depth}/{self.send_queue.depth}/{self.write_queue.depth}"
+                    )
+                except Exception as send_error:
+                    self._log(f"⚠️ Помилка відправки кадру: {send_error}")
+            else:
+                # Дебаг: почему не отправляем
+                if self.sent_count == 0 or seq % 60 == 0:
+                    self._log(f"⚠️ WebSocket не підключено, кадр не відправлено (frame {self.sent_count})")
+
+
+def file_sha256(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for block in iter(lambda: source.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_headers(offset, data, total="*"):
+    """Заголовки шматка для /api/recordings/chunk: Content-Range і SHA-256 тіла"""
+    headers = {
+        "Content-Type": "application/octet-stream",
+        "X-Chunk-SHA256": hashlib.sha256(data).hexdigest(),
+    }
+    if data:
+        headers["Content-Range"] = f"bytes {offset}-{offset + len(data) - 1}/{total}"
+    return headers
+
+
+def backoff_delay(attempt, base=UPLOAD_BACKOFF_BASE, cap=UPLOAD_BACKOFF_MAX):
+    """Експоненційна затримка з повним jitter: рівномірно з [0, min(cap, base·2^attempt)]"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class LiveUploadSession:
+    """Дописує байти сегмента на сервер шматками, поки сегмент ще пишеться.
+
+    Протокол /api/recordings/chunk: кожен шматок несе offset; сервер дописує його,
+    якщо offset збігається з уже отриманим розміром, і відповідає {received}. На
+    розбіжність сервер повертає 409 з {received}, і сесія продовжує з його позиції.
+    Шматок з final=1 закриває файл на сервері. Якщо щось пішло не так, completed
+    лишається False і SegmentUploader вивантажує локальний файл звичайним шляхом.
+    """
+    def __init__(self, recorder, filename):
+        self.recorder = recorder
+        self.filename = filename
+        self.session_id = f"{int(time.time() * 1000):x}{os.urandom(6).hex()}"
+        self.sent = 0
+        self.chunks = 0
+        self.failures = 0
+        self.completed = False
+        self.failed = None
+        self._pending = bytearray()
+        self._closing = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="live-upload", daemon=True)
+        self._thread.start()
+
+    def feed(self, data):
+        with self._cond:
+            if self.failed:
+                return
+            self._pending += data
+            if len(self._pending) > LIVE_UPLOAD_MAX_BUFFER:
+                self._fail_locked("буфер переповнено")
+
+    def finish(self):
+        """Відправляє хвіст з final=1 і чекає підтвердження сервера"""
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        self._thread.join()
+        return self.completed
+
+    def abort(self, reason):
+        with self._cond:
+            self._fail_locked(reason)
+        self._thread.join()
+
+    def _fail_locked(self, reason):
+        if not self.failed:
+            self.failed = str(reason)
+            self._pending = bytearray()
+            self.recorder._log(f"⚠️ Живе вивантаження {self.filename} зупинено: {reason}")
+        self._closing = True
+        self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closing:
+                    self._cond.wait(LIVE_UPLOAD_INTERVAL)
+                if self.failed:
+                    return
+                closing = self._closing
+                data = bytes(self._pending)
+            if not data and not closing:
+                continue
+            try:
+                ok = self._post(data, closing)
+            except Exception as post_error:
+                ok = False
+                self.recorder._log(f"⚠️ Живе вивантаження {self.filename}: {post_error}")
+            if ok:
+                self.failures = 0
+                if closing:
+                    self.completed = True
+                    return
+                continue
+            self.failures += 1
+            if self.failures >= LIVE_UPLOAD_MAX_FAILURES:
+                with self._cond:
+                    self._fail_locked(f"{self.failures} невдалих спроб поспіль")
+                return
+            if closing:
+                time.sleep(min(LIVE_UPLOAD_INTERVAL, 2 ** self.failures))
+
+    def _post(self, data, final):
+        recorder = self.recorder
+        response = recorder.api.post(
+            CHUNK_ENDPOINT,
+            params={
+                "session": self.session_id,
+                "offset": self.sent,
+                "final": int(final),
+                "username": recorder.username or "unknown",
+                "roomName": recorder.room or "unknown",
+                "filename": self.filename,
+            },
+            data=data,
+            headers=chunk_headers(self.sent, data),
+            timeout=LIVE_UPLOAD_TIMEOUT,
+        )
+        if response.status_code not in (200, 409):
+            recorder._log(f"⚠️ Живе вивантаження {self.filename}: HTTP {response.status_code}")
+            return False
+        received = int(response.json().get("received", -1))
+        if not self.sent <= received <= self.sent + len(data):
+            with self._cond:
+                self._fail_locked(f"сервер має {received} байт, а надіслано {self.sent}")
+            return False
+        complete = response.status_code == 200 and received == self.sent + len(data)
+        with self._cond:
+            del self._pending[:received - self.sent]
+        UPLOAD_BYTES.inc(received - self.sent, "live")
+        self.sent = received
+        self.chunks += 1
+        # Інакше сервер мав інший розмір — наступний шматок піде з його позиції
+        return complete
+
+
+class ResumableUpload:
+    """Вивантаження готового файлу шматками з продовженням після обриву.
+
+    Сесія визначається SHA-256 файлу і його шляхом, тож повторна спроба (навіть після перезапуску)
+    продовжує з того, що сервер уже має: GET /api/recordings/chunk?session= повертає
+    {received}. Кожен шматок перевіряється сервером за X-Chunk-SHA256, а весь файл —
+    за sha256 у фінальному шматку. run() повертає відповідь сервера на фінальний шматок
+    або None, якщо сервер не підтримує /api/recordings/chunk.
+    """
+    def __init__(self, recorder, path, username, room, chunk_size=UPLOAD_CHUNK_SIZE,
+                 max_retries=UPLOAD_MAX_RETRIES, sleep=time.sleep):
+        self.recorder = recorder
+        self.path = path
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.sleep = sleep
+        self.size = os.path.getsize(path)
+        self.sha256 = file_sha256(path)
+        self.api = recorder.api
+        self.params = {
+            "session": "f" + hashlib.sha256(f"{self.sha256}:{username}:{room}:{path}".encode()).hexdigest()[:40],
+            "username": username,
+            "roomName": room,
+            "filename": os.path.basename(path),
+        }
+        self.offset = 0
+        self.chunks = 0
+        self.retries = 0
+        self.restarts = 0
+        self.resumed_from = 0
+
+    def _query(self):
+        """Відповідь сервера про стан сесії або None, якщо endpoint відсутній"""
+        response = self.api.get(CHUNK_ENDPOINT, params={"session": self.params["session"]},
+                                timeout=LIVE_UPLOAD_TIMEOUT)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response
+
+    def run(self):
+        for attempt in range(self.max_retries + 1):
+            try:
+                state = self._query()
+                break
+            except requests.exceptions.RequestException as query_error:
+                if attempt == self.max_retries:
+                    raise
+                delay = backoff_delay(attempt)
+                self.recorder._log(f"⚠️ Сервер недоступний ({query_error}), повтор через {delay:.1f} сек")
+                self.sleep(delay)
+        if state is None:
+            return None
+        if state.json().get("filename") and int(state.json().get("received", -1)) == self.size:
+            return state  # уже завантажено раніше, відповідь втратилась
+        self.offset = self.resumed_from = int(state.json().get("received", 0))
+        if self.offset:
+            self.recorder._log(f"↪️ Продовжуємо вивантаження з {self.offset / 1024 / 1024:.1f} MB")
+
+        failures = 0
+        with open(self.path, "rb") as source:
+            while True:
+                source.seek(self.offset)
+                data = source.read(self.chunk_size)
+                final = self.offset + len(data) >= self.size
+                params = dict(self.params, offset=self.offset, final=int(final))
+                if final:
+                    params["sha256"] = self.sha256
+                response, error = None, None
+                try:
+                    response = self.api.post(CHUNK_ENDPOINT, params=params, data=data,
+                                             headers=chunk_headers(self.offset, data, self.size),
+                                             timeout=UPLOAD_CHUNK_TIMEOUT)
+                except requests.exceptions.RequestException as request_error:
+                    error = request_error
+
+                if response is not None and response.status_code in (200, 409):
+                    received = int(response.json().get("received", -1))
+                    if response.status_code == 200 and final and received == self.size:
+                        self.chunks += 1
+                        return response
+                    if 0 <= received <= self.size and received != self.offset:
+                        self.offset = received  # прогрес або синхронізація з сервером
+                        self.chunks += response.status_code == 200
+                        failures = 0
+                        continue
+                elif response is not None and response.status_code < 500 \
+                        and response.status_code not in (408, 422, 429):
+                    return response  # постійна помилка (400/403/413...) — повтор не допоможе
+                else:
+                    error = error or f"HTTP {response.status_code}"
+                    if final and response is not None and response.status_code == 422 \
+                            and response.json().get("received") == 0:
+                        # Зібраний файл не збігся за SHA-256 — сервер скинув сесію, починаємо заново
+                        self.restarts += 1
+                        if self.restarts > UPLOAD_MAX_RESTARTS:
+                            return response
+
+                failures += 1
+                self.retries += 1
+                if failures > self.max_retries:
+                    if response is not None:
+                        return response
+                    raise error
+                delay = backoff_delay(failures - 1)
+                self.recorder._log(f"⚠️ Шматок з {self.offset / 1024 / 1024:.1f} MB не прийнято ({error or response.status_code}), "
+                                   f"спроба {failures}/{self.max_retries} через {delay:.1f} сек")
+                self.sleep(delay)
+                try:
+                    # Шматок міг дійти, а відповідь загубитися — питаємо в сервера актуальну позицію
+                    state = self._query()
+                    if state is not None:
+                        self.offset = min(self.size, int(state.json().get("received", self.offset)))
+                except requests.exceptions.RequestException:
+                    pass
+
+
+class SegmentUploader:
+    """Пул потоків, що закривають і вивантажують сегменти зі спулу (UploadSpool).
+
+    Закриття VideoWriter (дописування індексу MP4) теж виконується тут, тож ротація
+    не затримує потік запису, а тим паче захоплення; для цього є окремий потік, щоб
+    закриття не чекало за довгими вивантаженнями. Пул працює весь час роботи
+    програми: при старті він дозавантажує сегменти, що лишилися з минулих запусків,
+    а невдалі спроби повторює з наростаючою затримкою, поки файл не потрапить на сервер.
+    """
+    def __init__(self, recorder, spool, workers=UPLOAD_WORKERS):
+        self.recorder = recorder
+        self.spool = spool
+        self.uploaded = 0
+        self.failed = 0
+        self._closing = collections.deque()
+        self._busy_closing = 0
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._threads = [threading.Thread(target=self._close_loop, name="upload-close", daemon=True)] + [
+            threading.Thread(target=self._run, name=f"upload-{index}", daemon=True)
+            for index in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, path, writer=None, part=None):
+        """Передає сегмент у вивантаження; writer (якщо є) буде закрито перед цим"""
+        with self._cond:
+            if writer is not None:
+                self._closing.append((path, writer, part))
+            else:
+                self.spool.mark_pending(path)
+            self._cond.notify()
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def wait_closed(self, timeout=None):
+        """Чекає, поки всі передані writer-и будуть закриті (файли цілі на диску)"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._closing and not self._busy_closing, timeout)
+
+    def close(self, timeout=None):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def wait_drained(self, timeout=None, poll=0.5, paths=None):
+        """Чекає, поки черга (або лише сегменти з paths) спорожніє; False — минув timeout
+        або решта сегментів чекає на повтор"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._cond:
+                closing = bool(self._closing or self._busy_closing)
+            if paths is None:
+                counts = self.spool.counts()
+                next_due = self.spool.next_due
+            else:
+                # Лише свої сегменти: записи минулих запусків і інших кімнат у спільному спулі не чекаємо
+                states = self.spool.states(paths)
+                counts = collections.Counter(state for state, _ in states.values())
+                next_due = lambda: min(due for state, due in states.values() if state == "pending") - time.time()
+            if not closing and not counts.get("uploading") and not counts.get("recording"):
+                if not counts.get("pending"):
+                    return True
+                if next_due() > 0:
+                    return False  # усе, що лишилось, відкладено з затримкою після невдачі
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(poll)
+
+    @property
+    def pending(self):
+        counts = self.spool.counts()
+        return len(self._closing) + self._busy_closing + counts.get("pending", 0) + counts.get("uploading", 0)
+
+    def _close_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closing or self._stopped)
+                if not self._closing:
+                    return
+                self._busy_closing += 1
+                job = self._closing.popleft()
+            try:
+                self._close_writer(*job)
+            finally:
+                with self._cond:
+                    self._busy_closing -= 1
+                    self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                entry = self.spool.claim()
+                while entry is None and not self._stopped:
+                    self._cond.wait(self.spool.next_due())
+                    entry = self.spool.claim()
+            if entry is None:
+                return
+            self._upload(entry)
+
+    def _close_writer(self, path, writer, part):
+        recorder = self.recorder
+        try:
+            writer.release()
+        except Exception as release_error:
+            recorder._log(f"⚠️ Помилка закриття відео: {release_error}")
+        continuation = getattr(writer, "continuation", None)
+        if continuation is not None:
+            # Кадри до падіння ffmpeg лишаються в path, після — у continuation; вивантажуються обидва
+            self.spool.mark_pending(continuation)
+        live = getattr(writer, "sink", None)
+        if live is not None and live.completed and os.path.exists(path):
+            os.remove(path)
+            self.spool.complete(path)
+            self.uploaded += 1
+            recorder._log(f"✅ Сегмент {part} уже на сервері: {live.sent / 1024 / 1024:.2f} MB "
+                          f"живим вивантаженням ({live.chunks} шматків)")
+            return
+        self.spool.mark_pending(path)
+
+    def _upload(self, entry):
+        recorder = self.recorder
+        label = f"Сегмент {entry.part}" if entry.part else "Запис"
+        if not os.path.exists(entry.path):
+            recorder._log(f"⚠️ {label}: файл зник зі спулу, пропускаємо: {entry.path}")
+            self.spool.complete(entry.path)
+            return
+        started = time.perf_counter()
+        size = os.path.getsize(entry.path)
+        try:
+            success = recorder.upload_recording(entry.path, entry.username, entry.room)
+        except Exception as upload_error:
+            recorder._log(f"❌ {label}: помилка вивантаження: {upload_error}")
+            success = False
+        UPLOAD_SECONDS.observe(time.perf_counter() - started, "success" if success else "failure")
+        if success:
+            UPLOAD_BYTES.inc(size, "file")
+            self.spool.complete(entry.path)
+            self.uploaded += 1
+            recorder._log(f"✅ {label} вивантажено (у черзі ще {self.pending})")
+        else:
+            self.failed += 1
+            delay = self.spool.fail(entry, "upload failed")
+            recorder._log(f"⚠️ {label} не вивантажено, повтор через {delay:.0f} сек: {entry.path}")
+
+
 class SimpleRecorder:
-    def __init__(self):
+    def __init__(self, headless=False):
         self.server_url = "wss://kibitkostreamappv.pp.ua:8444"  # WebSocket сервер на порту 8444
         # API URL: спочатку пробуємо пряме з'єднання через порт 3001, потім через nginx
         # Для локального використання можна використовувати http://195.133.39.41:3001
         self.api_url = "http://195.133.39.41:3001"  # Пряме з'єднання до API сервера
+        self.api = ApiClient(self.api_url) if requests else None  # усі HTTP-виклики API йдуть через нього
         self.room = None
         self.username = None
         self.is_recording = False
         self.ws = None
         self.ws_connected = False  # Флаг состояния WebSocket
+        self.ws_binary = False  # Сервер підтвердив бінарний транспорт кадрів
+        self.ws_delta = False  # ...і дельта-кадри з плиток (зараз увімкнені)
+        self.ws_delta_agreed = False  # сервер узгодив дельти; призупиняє їх для JSON-переглядачів
         self.ws_thread = None
         self.recording_thread = None
         self.screen_vars = []
         self.video_writer = None
         self.video_file_path = None
-        self.temp_dir = None
         self.part_number = 1
-        self.last_upload_success = True
+        self.spool = None
+        self.segment_uploader = None
+        self.segment_paths = []  # сегменти цього запуску — за ними headless рахує код виходу
+        self.drive_lock = threading.Lock()  # drive_service (httplib2) не потокобезпечний
+        self.segment_started_at = 0.0
+        self.segment_frames = 0
         self.drive_service = None
         self.google_drive_initialized = False
         self.logger = None  # Логер буде створений після встановлення username і room
+        self.pipeline = None
+        self.metrics_server = None
+        self.profiler = SamplingProfiler(log=self._log)
+        self.root = None
+        self.login_frame = None
+        self.screen_frame = None
+        self.recording_frame = None
+
+        if not headless:
+            self._build_window()
+
+        print(f"🎛️ Якість: JPEG {JPEG_QUALITY}, "
+              f"файл {RECORD_PROFILE.fps} FPS ≤{RECORD_PROFILE.max_width or '∞'}x{RECORD_PROFILE.max_height or '∞'}, "
+              f"стрім {STREAM_PROFILE.fps} FPS ≤{STREAM_PROFILE.max_width or '∞'}x{STREAM_PROFILE.max_height or '∞'}")
+        
+        # Перевіряємо Google Drive
+        if GOOGLE_DRIVE_ENABLED:
+            if google_drive_available:
+                print("☁️ Google Drive API доступний")
+            else:
+                print("⚠️ Google Drive API не встановлено")
+                print("   📦 Встановіть: pip install google-api-python-client google-auth-httplib2 google-auth-oauthlib")
+                print("   ⚠️ Завантаження буде на сервер замість Google Drive")
+        else:
+            print("ℹ️ Google Drive вимкнено (GOOGLE_DRIVE_ENABLED=False)")
+        
+        # Ініціалізація Google Drive буде виконана пізніше, коли буде username і room
+
+        self.start_upload_spool()
+        self.start_metrics()
+        self.start_profiler_triggers()
 
+    def _build_window(self):
+        load_tkinter()
         self.root = tk.Tk()
         self.root.title("🎬 Simple Screen Recorder")
         self.root.geometry("440x560")
@@ -242,28 +2414,9 @@ class SimpleRecorder:
                   foreground=[("disabled", "#9ca3af")])
 
         self.create_login_panel()
-        self.screen_frame = None
-        self.recording_frame = None
-
         self.show_panel("login")
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
 
-        print(f"🎛️ Якість: FPS {FRAME_RATE}, JPEG {JPEG_QUALITY}, "
-              f"макс. {MAX_WIDTH}x{MAX_HEIGHT}")
-        
-        # Перевіряємо Google Drive
-        if GOOGLE_DRIVE_ENABLED:
-            if google_drive_available:
-                print("☁️ Google Drive API доступний")
-            else:
-                print("⚠️ Google Drive API не встановлено")
-                print("   📦 Встановіть: pip install google-api-python-client google-auth-httplib2 google-auth-oauthlib")
-                print("   ⚠️ Завантаження буде на сервер замість Google Drive")
-        else:
-            print("ℹ️ Google Drive вимкнено (GOOGLE_DRIVE_ENABLED=False)")
-        
-        # Ініціалізація Google Drive буде виконана пізніше, коли буде username і room
-
     def create_login_panel(self):
         self.login_frame = ttk.Frame(self.root, style="TFrame")
         card = ttk.Frame(self.login_frame, style="Card.TFrame")
@@ -272,12 +2425,8 @@ class SimpleRecorder:
         ttk.Label(card, text="🎬 Вхід у систему", style="Title.TLabel").pack(pady=(10, 18))
 
         ttk.Label(card, text="Виберіть кімнату", style="Label.TLabel").pack(anchor="w", padx=8, pady=(0, 6))
-        rooms_list = [
-            "Azov_1", "Azov_2", "Berd_1", "Berd_2", "Borci",
-            "vinissa", "vinissa_2", "Gazon", "ZP", "Kiev", "Tokyo", "admin"
-        ]
         self.room_var = tk.StringVar(value="Azov_2")
-        room_dropdown = ttk.Combobox(card, textvariable=self.room_var, values=rooms_list,
+        room_dropdown = ttk.Combobox(card, textvariable=self.room_var, values=ROOMS,
                                      state="readonly", style="TCombobox")
         room_dropdown.pack(fill=tk.X, padx=8, pady=(0, 18))
 
@@ -298,6 +2447,9 @@ class SimpleRecorder:
             return False
         
         try:
+            from google.oauth2.credentials import Credentials
+            from google.auth.transport.requests import Request
+
             # Створюємо credentials з refresh token
             creds = Credentials(
                 token=None,
@@ -312,7 +2464,7 @@ class SimpleRecorder:
             creds.refresh(Request())
             
             # Створюємо Drive service
-            self.drive_service = build("drive", "v3", credentials=creds)
+            self.drive_service = build_drive_service(creds)
             self.google_drive_initialized = True
             print("✅ Google Drive API ініціалізовано")
             return True
@@ -323,6 +2475,17 @@ class SimpleRecorder:
             self.google_drive_initialized = False
             return False
     
+    def _ensure_google_drive(self):
+        """Ініціалізує Drive один раз (під drive_lock); повертає, чи він готовий"""
+        with self.drive_lock:
+            if not self.google_drive_initialized:
+                try:
+                    self._init_google_drive()
+                except Exception as drive_error:
+                    self._log(f"⚠️ Не вдалося ініціалізувати Google Drive: {drive_error}")
+                    self.google_drive_initialized = False
+            return self.google_drive_initialized
+
     def _get_or_create_folder(self, parent_folder_id, folder_name):
         """Отримати або створити папку в Google Drive"""
         if not self.google_drive_initialized or not self.drive_service:
@@ -358,7 +2521,7 @@ class SimpleRecorder:
             print(f"❌ Помилка створення/пошуку папки '{folder_name}': {e}")
             return None
     
-    def _ensure_folder_structure(self):
+    def _ensure_folder_structure(self, username=None, room=None):
         """Створити структуру папок: LiveKitRecordings/комната/username/дата"""
         if not self.google_drive_initialized or not self.drive_service:
             return None
@@ -369,11 +2532,11 @@ class SimpleRecorder:
             
             # Створюємо структуру: LiveKitRecordings/комната/username/дата
             root_folder_id = GOOGLE_DRIVE_ROOT_FOLDER_ID
-            room_folder_id = self._get_or_create_folder(root_folder_id, self.room or 'unknown')
+            room_folder_id = self._get_or_create_folder(root_folder_id, room or self.room or 'unknown')
             if not room_folder_id:
                 return None
             
-            user_folder_id = self._get_or_create_folder(room_folder_id, self.username or 'unknown')
+            user_folder_id = self._get_or_create_folder(room_folder_id, username or self.username or 'unknown')
             if not user_folder_id:
                 return None
             
@@ -388,11 +2551,15 @@ class SimpleRecorder:
             traceback.print_exc()
             return None
     
-    def _upload_to_google_drive(self, file_path):
+    def _upload_to_google_drive(self, file_path, username=None, room=None):
         """Завантажити файл напряму в Google Drive"""
         if not GOOGLE_DRIVE_ENABLED or not google_drive_available:
             return False
         
+        with self.drive_lock:
+            return self._upload_to_google_drive_locked(file_path, username or self.username, room or self.room)
+
+    def _upload_to_google_drive_locked(self, file_path, username, room):
         if not self.google_drive_initialized:
             print("⚠️ Google Drive не ініціалізовано, намагаємося ініціалізувати...")
             if not self._init_google_drive():
@@ -401,10 +2568,10 @@ class SimpleRecorder:
         try:
             file_size_mb = os.path.getsize(file_path) / 1024 / 1024
             print(f"☁️ Завантаження відео {file_size_mb:.2f} MB в Google Drive...")
-            print(f"   📍 Структура: LiveKitRecordings/{self.room or 'unknown'}/{self.username or 'unknown'}/дата/")
+            print(f"   📍 Структура: LiveKitRecordings/{room or 'unknown'}/{username or 'unknown'}/дата/")
             
             # Створюємо структуру папок
-            folder_id = self._ensure_folder_structure()
+            folder_id = self._ensure_folder_structure(username, room)
             if not folder_id:
                 print("❌ Не вдалося створити структуру папок в Google Drive")
                 return False
@@ -415,6 +2582,7 @@ class SimpleRecorder:
                 'parents': [folder_id]
             }
             
+            from googleapiclient.http import MediaFileUpload
             media = MediaFileUpload(
                 file_path,
                 mimetype='video/mp4',
@@ -520,17 +2688,25 @@ class SimpleRecorder:
             self.recording_frame.pack(fill=tk.BOTH, expand=True)
 
     def do_login(self):
-        self.room = self.room_var.get().strip()
-        self.username = self.username_entry.get().strip()
+        room = self.room_var.get().strip()
+        username = self.username_entry.get().strip()
 
-        if not self.room or not self.username:
+        if not room or not username:
             messagebox.showerror("Помилка", "Заповніть всі поля!")
             return
 
-        if len(self.username) < 2:
+        if len(username) < 2:
             messagebox.showerror("Помилка", "Нікнейм занадто короткий!")
             return
-        
+
+        self.login(room, username)
+        self.show_panel("screen")
+
+    def login(self, room, username):
+        """Встановлює користувача й кімнату: логер (з відправкою на сервер) і Google Drive"""
+        self.room = room
+        self.username = username
+
         # Ініціалізуємо логер для цього користувача/кімнати
         # Зберігаємо логи в постійній директорії біля проекту або в домашній директорії
         # Спочатку пробуємо створити в home/.livekit_recorder_logs
@@ -552,28 +2728,22 @@ class SimpleRecorder:
             self.logger.close()
         
         # Створюємо новий логер (з підтримкою відправки на сервер)
-        self.logger = Logger(log_file_path, self.api_url, self.username, self.room)
+        self.logger = Logger(log_file_path, self.api, self.username, self.room)
         self.logger.log(f"🎬 Ініціалізація рекордера для {self.username} / {self.room}")
         self.logger.log(f"📁 Файл логів: {log_file_path}")
         self.logger.log(f"🌐 API URL для синхронізації: {self.api_url}")
         self.logger.log(f"📡 Синхронізація логів: {'Увімкнено' if requests else 'Вимкнено (requests не встановлено)'}")
         
-        # Ініціалізуємо Google Drive після встановлення username і room
+        # Google Drive ініціалізується у фоні (оновлення токена, імпорт клієнта) — вхід не чекає;
+        # вивантаження, що почнеться раніше, дочекається її на drive_lock
         if GOOGLE_DRIVE_ENABLED and google_drive_available and not self.google_drive_initialized:
-            self.logger.log(f"☁️ Ініціалізація Google Drive для {self.username} / {self.room}...")
-            try:
-                self._init_google_drive()
-            except Exception as e:
-                self.logger.log(f"⚠️ Не вдалося ініціалізувати Google Drive: {e}")
-                import traceback
-                traceback.print_exc()
-                self.google_drive_initialized = False
+            self.logger.log(f"☁️ Ініціалізація Google Drive для {self.username} / {self.room} у фоні...")
+            threading.Thread(target=self._ensure_google_drive, name="drive-init", daemon=True).start()
 
         if self.logger:
             self.logger.log(f"👤 Користувач: {self.username} | 📍 Кімната: {self.room}")
         else:
             print(f"👤 Користувач: {self.username} | 📍 Кімната: {self.room}")
-        self.show_panel("screen")
 
     def _log(self, message):
         """Допоміжний метод для логування: пише в logger якщо є, інакше в консоль"""
@@ -582,6 +2752,57 @@ class SimpleRecorder:
         else:
             print(message)
 
+    def start_upload_spool(self):
+        """Відкриває спул сегментів і запускає пул вивантаження (дозавантажує минулі записи)"""
+        try:
+            self.spool = UploadSpool()
+        except (OSError, sqlite3.Error) as spool_error:
+            fallback_dir = os.path.join(tempfile.gettempdir(), "simple_recorder_spool")
+            self._log(f"⚠️ Спул недоступний ({spool_error}), використовуємо {fallback_dir}")
+            self.spool = UploadSpool(fallback_dir)
+        self.segment_uploader = SegmentUploader(self, self.spool)
+        METRICS.callback("upload_queue_segments", "Segments waiting to be closed or uploaded",
+                         lambda: self.segment_uploader.pending)
+        self._log(f"📦 Спул записів: {self.spool.directory} ({UPLOAD_WORKERS} потоки вивантаження)")
+        if self.spool.recovered:
+            self._log(f"♻️ Знайдено {self.spool.recovered} невивантажених сегмент(ів) з минулих запусків — дозавантажуємо")
+
+    def start_metrics(self):
+        """HTTP-слухач Prometheus (SIMPLE_RECORDER_METRICS_PORT) і періодичний знімок метрик у лог"""
+        METRICS.callback("recording", "1 while a recording is running", lambda: int(self.is_recording))
+        METRICS.callback("ws_connected", "1 while the live WebSocket is connected", lambda: int(self.ws_connected))
+        if METRICS_PORT:
+            try:
+                self.metrics_server = MetricsServer()
+                self._log(f"📈 Метрики: {self.metrics_server.address}/metrics")
+            except OSError as bind_error:
+                self._log(f"⚠️ Не вдалося відкрити порт метрик {METRICS_PORT}: {bind_error}")
+        if METRICS_LOG_INTERVAL > 0:
+            threading.Thread(target=self._metrics_log_loop, name="metrics-log", daemon=True).start()
+
+    def start_profiler_triggers(self):
+        """SIGUSR1 вмикає/вимикає профілювання; на порту метрик — GET /debug/profile"""
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.profiler.toggle())
+        if self.metrics_server:
+            self.metrics_server.add_route("/debug/profile", self._profile_route)
+
+    def _profile_route(self, query):
+        """?seconds=N — почати вікно, ?stop=1 — завершити й отримати шлях, без параметрів — стан"""
+        if query.get("stop"):
+            result = {"running": False, "path": self.profiler.stop()}
+        elif query.get("seconds"):
+            started = self.profiler.start(float(query["seconds"][0]))
+            result = {"running": True, "started": started}
+        else:
+            result = {"running": self.profiler.running, "path": self.profiler.last_path}
+        return 200, json.dumps(result, ensure_ascii=False), "application/json"
+
+    def _metrics_log_loop(self):
+        while True:
+            time.sleep(METRICS_LOG_INTERVAL)
+            self._log(f"📈 Метрики: {json.dumps(METRICS.snapshot(), ensure_ascii=False)}")
+
     def start_recording(self):
         if not self.username or not self.room:
             messagebox.showerror("Помилка", "Спочатку увійдіть!")
@@ -596,17 +2817,16 @@ class SimpleRecorder:
             messagebox.showerror("Помилка", "Не знайдено екранів.")
             return
 
+        self.show_panel("recording")
+        self.begin_recording(selected)
+
+    def begin_recording(self, monitor_indices):
+        """Підключає WebSocket і запускає потік запису екранів monitor_indices (з 0)"""
         self.is_recording = True
         self.part_number = 1
         self.video_writer = None
         self.video_file_path = None
 
-        if self.temp_dir and os.path.isdir(self.temp_dir) and self.last_upload_success:
-            shutil.rmtree(self.temp_dir, ignore_errors=True)
-        self.temp_dir = tempfile.mkdtemp(prefix="simple_recorder_")
-
-        self.show_panel("recording")
-
         self.ws_thread = threading.Thread(target=self.websocket_loop, daemon=True)
         self.ws_thread.start()
 
@@ -615,7 +2835,7 @@ class SimpleRecorder:
 
         self.recording_thread = threading.Thread(
             target=self.recording_loop,
-            args=(selected,),
+            args=(monitor_indices,),
             daemon=True
         )
         self.recording_thread.start()
@@ -626,31 +2846,67 @@ class SimpleRecorder:
         def on_open(ws):
             self._log(f"✅ Підключено до {ws_url}")
             self.ws_connected = True  # Устанавливаем флаг подключения
+            self.ws_binary = False  # До підтвердження сервером шлемо JSON
+            self.ws_delta = self.ws_delta_agreed = False
             self.update_status("🟢 Підключено")
             try:
                 # WebSocket сервер ожидает "join", не "register"!
-                register_payload = json.dumps({
+                join = {
                     "type": "join",
                     "username": self.username,
                     "room": self.room
-                })
+                }
+                if BINARY_FRAMES_ENABLED:
+                    # Пропонуємо бінарний транспорт; старий сервер просто проігнорує поле
+                    join["transports"] = ["binary", "json"]
+                    join["frameProtocol"] = FRAME_PROTOCOL_VERSION
+                    if DELTA_STREAMING_ENABLED:
+                        join["features"] = ["delta"]
+                register_payload = json.dumps(join)
                 ws.send(register_payload)
                 self._log(f"🆔 Зареєстровано стрімера: {self.username} -> {self.room}")
                 
                 # Регистрация в HTTP API
-                if requests:
+                if self.api:
                     try:
-                        api_register_url = f"{self.api_url}/api/stream/register"
-                        requests.post(api_register_url, json={
+                        self.api.post("/api/stream/register", json={
                             "room": self.room,
                             "username": self.username
-                        }, verify=True, timeout=5)
+                        }, timeout=5)
                         self._log(f"✅ HTTP API registration successful")
                     except Exception as api_err:
                         self._log(f"⚠️ HTTP API registration failed: {api_err}")
             except Exception as send_err:
                 self._log(f"Помилка відправки join: {send_err}")
 
+        def on_message(ws, message):
+            if isinstance(message, bytes):
+                return
+            try:
+                data = json.loads(message)
+            except ValueError:
+                return
+            if data.get("type") == "joined":
+                transport = data.get("transport", "json")
+                binary = (
+                    BINARY_FRAMES_ENABLED
+                    and transport == "binary"
+                    and data.get("frameProtocol") == FRAME_PROTOCOL_VERSION
+                )
+                self.ws_binary = binary
+                self.ws_delta_agreed = binary and DELTA_STREAMING_ENABLED and bool(data.get("delta"))
+                self.ws_delta = self.ws_delta_agreed
+                self._log(f"📦 Транспорт кадрів: {'binary' if binary else 'json'}"
+                          f"{' + delta' if self.ws_delta else ''}")
+            elif data.get("type") == "delta":
+                # Поки дивиться JSON-переглядач (збирати плитки він не вміє), сервер просить повні кадри
+                enabled = self.ws_delta_agreed and bool(data.get("enabled"))
+                if enabled and not self.ws_delta and self.pipeline:
+                    # Еталон кодувальника застарів, поки йшли повні кадри — ланцюжок з ключового
+                    self.pipeline.delta_encoder.request_keyframe()
+                self.ws_delta = enabled
+                self._log(f"📦 Дельта-кадри {'увімкнено' if enabled else 'призупинено: є JSON-переглядач'}")
+
         def on_error(ws, error):
             self._log(f"❌ WebSocket помилка: {error}")
             self.update_status(f"❌ Помилка: {error}")
@@ -658,16 +2914,17 @@ class SimpleRecorder:
         def on_close(ws, close_status_code, close_msg):
             self._log(f"🔌 З'єднання закрито: {close_msg}")
             self.ws_connected = False  # Сбрасываем флаг подключения
+            self.ws_binary = False
+            self.ws_delta = self.ws_delta_agreed = False
             self.update_status("🔴 Відключено")
             
             # Отмена регистрации в HTTP API
-            if requests:
+            if self.api:
                 try:
-                    api_unregister_url = f"{self.api_url}/api/stream/unregister"
-                    requests.post(api_unregister_url, json={
+                    self.api.post("/api/stream/unregister", json={
                         "room": self.room,
                         "username": self.username
-                    }, verify=True, timeout=5)
+                    }, timeout=5)
                     self._log(f"👋 HTTP API unregistration successful")
                 except Exception as api_err:
                     self._log(f"⚠️ HTTP API unregistration failed: {api_err}")
@@ -676,6 +2933,7 @@ class SimpleRecorder:
             self.ws = websocket.WebSocketApp(
                 ws_url,
                 on_open=on_open,
+                on_message=on_message,
                 on_error=on_error,
                 on_close=on_close
             )
@@ -693,83 +2951,109 @@ class SimpleRecorder:
             traceback.print_exc()
             self.update_status(f"❌ Помилка: {e}")
 
-    def ensure_video_writer(self, frame):
+    def ensure_video_writer(self, frame, fps=FRAME_RATE):
         if self.video_writer is not None:
-            return
-        if self.temp_dir is None:
-            self.temp_dir = tempfile.mkdtemp(prefix="simple_recorder_")
+            self.segment_frames += 1
+            if self._segment_due(fps):
+                self.rotate_segment()
+            else:
+                return
         height, width = frame.shape[:2]
-        fourcc = cv2.VideoWriter_fourcc(*"mp4v")
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         safe_room = (self.room or "room").replace(" ", "_")
         safe_user = (self.username or "user").replace(" ", "_")
-        filename = f"{safe_room}_{safe_user}_{timestamp}.mp4"
-        file_path = os.path.join(self.temp_dir, filename)
-        writer = cv2.VideoWriter(file_path, fourcc, FRAME_RATE, (width, height))
+        filename = f"{safe_room}_{safe_user}_{timestamp}_part{self.part_number}.mp4"
+        file_path = self.spool.path_for(filename)
+        self.register_segment(file_path, self.username, self.room, self.part_number)
+        username, room, part = self.username, self.room, self.part_number
+
+        def on_fallback(continuation):
+            # Після падіння ffmpeg решта сегмента йде в окремий файл — він теж має бути у спулі
+            self.register_segment(continuation, username, room, part)
+
+        writer = None
+        if LIVE_UPLOAD_ENABLED and self.api is not None:
+            session = LiveUploadSession(self, filename)
+            writer = open_fragmented_writer(file_path, fps, (width, height), session, log=self._log,
+                                            on_fallback=on_fallback)
+            if writer is None:
+                session.abort("ffmpeg недоступний")
+        if writer is None:
+            writer = open_video_writer(file_path, fps, (width, height), log=self._log, on_fallback=on_fallback)
         if not writer.isOpened():  # pragma: no cover
             self._log("❌ Не вдалося створити відеофайл")
+            self.spool.complete(file_path)
             return
         self.video_writer = writer
         self.video_file_path = file_path
+        self.segment_started_at = time.time()
+        self.segment_frames = 0
         self._log(f"📼 Записуємо у файл: {file_path}")
 
-    def finalize_video_writer(self):
-        if self.video_writer:
+    def register_segment(self, path, username, room, part):
+        self.spool.add(path, username, room, part)
+        self.segment_paths.append(path)
+
+    def _segment_due(self, fps):
+        """Чи пора ротувати сегмент: за часом або (раз на секунду кадрів) за розміром файлу"""
+        if self.segment_uploader is None:
+            return False
+        if SEGMENT_SECONDS and time.time() - self.segment_started_at >= SEGMENT_SECONDS:
+            return True
+        if SEGMENT_MAX_MB and self.segment_frames % max(1, int(fps)) == 0:
             try:
-                self.video_writer.release()
-            except Exception as release_error:
-                self._log(f"⚠️ Помилка закриття відео: {release_error}")
-            finally:
-                self.video_writer = None
-        path = None
-        if self.video_file_path and os.path.exists(self.video_file_path):
-            path = self.video_file_path
+                return os.path.getsize(self.video_file_path) >= SEGMENT_MAX_MB * 1024 * 1024
+            except OSError:
+                return False
+        return False
+
+    def rotate_segment(self):
+        """Передає поточний сегмент у фонове вивантаження; наступний кадр відкриє новий файл"""
+        writer, path = self.video_writer, self.video_file_path
+        self.video_writer = None
         self.video_file_path = None
-        return path
+        if writer is None:
+            return
+        duration = time.time() - self.segment_started_at
+        self._log(f"✂️ Сегмент {self.part_number} закрито ({duration:.0f} сек, {self.segment_frames} кадрів)")
+        self.segment_uploader.submit(path, writer, self.part_number)
+        self.part_number += 1
 
-    def upload_video(self, file_path):
+    def upload_video(self, file_path, username=None, room=None):
         if not file_path or not os.path.exists(file_path):
             self._log("⚠️ Файл не існує для завантаження")
             return False
-        if requests is None:
+        if self.api is None:
             self._log("ℹ️ requests не встановлено — пропускаємо завантаження.")
             return False
 
         file_size_mb = os.path.getsize(file_path) / 1024 / 1024
         file_size_bytes = os.path.getsize(file_path)
         self._log(f"⏫ Завантаження відео {file_size_mb:.2f} MB ({file_size_bytes} bytes) на сервер...")
-        self._log(f"   📍 URL: {self.api_url}/api/recordings/upload")
-        self._log(f"   👤 Username: {self.username or 'unknown'}")
-        self._log(f"   📍 Room: {self.room or 'unknown'}")
+        self._log(f"   📍 URL: {self.api.url(CHUNK_ENDPOINT)}")
+        username = username or self.username or "unknown"
+        room = room or self.room or "unknown"
+        self._log(f"   👤 Username: {username}")
+        self._log(f"   📍 Room: {room}")
         self.update_status(f"⏫ Завантаження {file_size_mb:.1f} MB...")
 
         upload_start_time = time.time()
         try:
-            timestamp = int(time.time() * 1000)
-            data = {
-                "username": self.username or "unknown",
-                "roomName": self.room or "unknown",
-                "timestamp": str(timestamp),
-            }
-            print(f"📤 Початок POST запиту...")
-            with open(file_path, "rb") as video_file:
-                files = {"video": (os.path.basename(file_path), video_file, "video/mp4")}
-                # Увеличено таймаут до 600 секунд (10 минут) для больших файлов и загрузки в Google Drive
-                response = requests.post(
-                    f"{self.api_url}/api/recordings/upload",
-                    data=data,
-                    files=files,
-                    timeout=600,  # 10 минут
-                    verify=False,
-                    stream=False  # Отключаем streaming для более надежной загрузки
-                )
-                
+            upload = ResumableUpload(self, file_path, username, room)
+            response = upload.run()
+            if response is None:
+                self._log("ℹ️ Сервер не підтримує вивантаження шматками, надсилаємо файл цілим")
+                response = self._post_video(file_path, username, room)
+            else:
+                self._log(f"   🧩 Шматків: {upload.chunks}, повторів: {upload.retries}"
+                          + (f", продовжено з {upload.resumed_from} bytes" if upload.resumed_from else ""))
+
             upload_duration = time.time() - upload_start_time
             self._log(f"📥 Отримано відповідь за {upload_duration:.2f} сек")
             self._log(f"   📊 Status: {response.status_code}")
             
         except requests.exceptions.Timeout as timeout_err:
-            self._log(f"❌ Таймаут завантаження (більше 600 сек): {timeout_err}")
+            self._log(f"❌ Таймаут завантаження: {timeout_err}")
             self.update_status("❌ Таймаут завантаження")
             return False
         except requests.exceptions.ConnectionError as conn_err:
@@ -819,163 +3103,98 @@ class SimpleRecorder:
         self.update_status(f"❌ Помилка ({response.status_code})")
         return False
 
-    def recording_loop(self, monitor_indices):
-        self._log("🎬 Початок запису...")
-        upload_success = False
-
-        try:
-            with mss.mss() as sct:
-                monitors = [sct.monitors[i + 1] for i in monitor_indices]
-                self._log(f"Захоплюємо екрани: {monitor_indices}")
+    def _post_video(self, file_path, username, room):
+        """Старий протокол: увесь файл одним multipart-запитом на /api/recordings/upload"""
+        timestamp = int(time.time() * 1000)
+        data = {
+            "username": username,
+            "roomName": room,
+            "timestamp": str(timestamp),
+        }
+        print(f"📤 Початок POST запиту...")
+        with open(file_path, "rb") as video_file:
+            files = {"video": (os.path.basename(file_path), video_file, "video/mp4")}
+            # Увеличено таймаут до 600 секунд (10 минут) для больших файлов и загрузки в Google Drive
+            return self.api.post(
+                "/api/recordings/upload",
+                data=data,
+                files=files,
+                timeout=600,  # 10 минут
+                stream=False  # Отключаем streaming для более надежной загрузки
+            )
 
-                frame_count = 0
-                start_time = time.time()
+    def upload_recording(self, final_path, username=None, room=None):
+        """Вивантажує файл запису: спершу в Google Drive (якщо увімкнено), інакше на сервер.
+
+        username/room — власник сегмента зі спулу (за замовчуванням поточний користувач).
+        """
+        username = username or self.username
+        room = room or self.room
+        # Спочатку завантажуємо в Google Drive (якщо увімкнено)
+        self._log(f"🔍 Перевірка Google Drive:")
+        self._log(f"   GOOGLE_DRIVE_ENABLED: {GOOGLE_DRIVE_ENABLED}")
+        self._log(f"   google_drive_available: {google_drive_available}")
+        self._log(f"   self.google_drive_initialized: {self.google_drive_initialized}")
+
+        if GOOGLE_DRIVE_ENABLED and google_drive_available:
+            # Якщо не ініціалізовано, спробуємо зараз
+            if not self.google_drive_initialized:
+                self._log("⚠️ Google Drive ще не ініціалізовано, чекаємо / ініціалізуємо...")
+                self._ensure_google_drive()
+
+            if self.google_drive_initialized:
+                self._log("☁️ Завантаження в Google Drive...")
+                drive_upload_success = self._upload_to_google_drive(final_path, username, room)
+                if drive_upload_success:
+                    self._log("✅ Відео завантажено в Google Drive")
+                    # Після успішного завантаження в Drive можемо видалити локальний файл
+                    try:
+                        os.remove(final_path)
+                        self._log("🗑️ Локальний файл видалено після завантаження в Google Drive")
+                    except Exception as remove_error:
+                        self._log(f"⚠️ Не вдалося видалити локальний файл: {remove_error}")
+                    return True
+                else:
+                    self._log("⚠️ Не вдалося завантажити в Google Drive, завантажуємо на сервер...")
+            else:
+                self._log("⚠️ Google Drive не ініціалізовано, завантажуємо на сервер...")
+        else:
+            if not GOOGLE_DRIVE_ENABLED:
+                self._log("ℹ️ Google Drive вимкнено, завантажуємо на сервер...")
+            elif not google_drive_available:
+                self._log("⚠️ Google Drive API не доступний, завантажуємо на сервер...")
 
-                while self.is_recording:
-                    loop_start = time.time()
+        # Якщо Google Drive не працює або вимкнено, завантажуємо на сервер
+        return self.upload_video(final_path, username, room)
 
-                    try:
-                        screenshots = [sct.grab(mon) for mon in monitors]
-                        frames = [np.array(img) for img in screenshots]
-                        frames = [cv2.cvtColor(f, cv2.COLOR_BGRA2BGR) for f in frames]
-
-                        if len(frames) > 1:
-                            composite = compose_grid(frames)
-                        else:
-                            composite = frames[0]
-
-                        height, width = composite.shape[:2]
-                        if MAX_WIDTH and MAX_HEIGHT and (width > MAX_WIDTH or height > MAX_HEIGHT):
-                            scale = min(MAX_WIDTH / width, MAX_HEIGHT / height)
-                            new_width = int(width * scale)
-                            new_height = int(height * scale)
-                            composite = cv2.resize(
-                                composite,
-                                (new_width, new_height),
-                                interpolation=cv2.INTER_AREA
-                            )
-                            if frame_count == 0:
-                                self._log(f"🔽 Зменшено розмір: {width}x{height} → {new_width}x{new_height}")
-
-                        clock = datetime.now().strftime("%H:%M:%S")
-                        label = f"{self.username or 'Streamer'} | {clock}"
-                        (text_w, text_h), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.75, 2)
-                        padding_x = 18
-                        padding_y = 12
-                        rect_width = text_w + padding_x * 2
-                        rect_height = text_h + padding_y * 2
-                        cv2.rectangle(composite, (12, 12), (12 + rect_width, 12 + rect_height), (0, 0, 0), -1)
-                        cv2.rectangle(composite, (12, 12), (12 + rect_width, 12 + rect_height), (96, 165, 250), 2)
-                        text_x = 12 + padding_x
-                        text_y = 12 + padding_y + text_h - baseline
-                        cv2.putText(composite, label, (text_x, text_y), cv2.FONT_HERSHEY_SIMPLEX, 0.75,
-                                    (255, 255, 255), 2)
-
-                        self.ensure_video_writer(composite)
-                        if self.video_writer:
-                            try:
-                                self.video_writer.write(composite)
-                            except Exception as write_error:
-                                self._log(f"Помилка запису відео: {write_error}")
-
-                        success, buffer = cv2.imencode(
-                            ".jpg", composite, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY]
-                        )
-                        if not success:
-                            continue
-                        frame_base64 = base64.b64encode(buffer).decode("utf-8")
-
-                        # Проверяем WebSocket соединение через флаг
-                        if self.ws_connected and self.ws:
-                            try:
-                                message = json.dumps({
-                                    "type": "frame",
-                                    "user": self.username,
-                                    "room": self.room,
-                                    "data": frame_base64
-                                })
-                                self.ws.send(message)
-                                frame_count += 1
-                                elapsed = time.time() - start_time
-                                fps = frame_count / elapsed if elapsed > 0 else 0
-
-                                if frame_count % 25 == 0:
-                                    self._log(f"📤 Відправлено {frame_count} кадрів | FPS: {fps:.1f}")
-
-                                self.update_stats(f"📊 FPS: {fps:.1f} | Кадрів: {frame_count}")
-                            except Exception as send_error:
-                                self._log(f"⚠️ Помилка відправки кадру: {send_error}")
-                                continue
-                        else:
-                            # Дебаг: почему не отправляем
-                            if frame_count == 0 or frame_count % 60 == 0:
-                                self._log(f"⚠️ WebSocket не підключено, кадр не відправлено (frame {frame_count})")
-
-                    except Exception as capture_error:
-                        self._log(f"Помилка запису: {capture_error}")
-
-                    elapsed = time.time() - loop_start
-                    sleep_time = max(0, (1.0 / FRAME_RATE) - elapsed)
-                    time.sleep(sleep_time)
+    def recording_loop(self, monitor_indices):
+        self._log("🎬 Початок запису...")
+        if PROFILE_SECONDS > 0:
+            self.profiler.start(PROFILE_SECONDS)
+        try:
+            self.pipeline = FramePipeline(self, monitor_indices)
+            self.pipeline.run()
         finally:
-            final_path = self.finalize_video_writer()
-            if final_path:
-                # Спочатку завантажуємо в Google Drive (якщо увімкнено)
-                self._log(f"🔍 Перевірка Google Drive:")
-                self._log(f"   GOOGLE_DRIVE_ENABLED: {GOOGLE_DRIVE_ENABLED}")
-                self._log(f"   google_drive_available: {google_drive_available}")
-                self._log(f"   self.google_drive_initialized: {self.google_drive_initialized}")
-                
-                if GOOGLE_DRIVE_ENABLED and google_drive_available:
-                    # Якщо не ініціалізовано, спробуємо зараз
-                    if not self.google_drive_initialized:
-                        self._log("⚠️ Google Drive не ініціалізовано, намагаємося ініціалізувати...")
-                        self._init_google_drive()
-                    
-                    if self.google_drive_initialized:
-                        self._log("☁️ Завантаження в Google Drive...")
-                        drive_upload_success = self._upload_to_google_drive(final_path)
-                        if drive_upload_success:
-                            self._log("✅ Відео завантажено в Google Drive")
-                            # Після успішного завантаження в Drive можемо видалити локальний файл
-                            try:
-                                os.remove(final_path)
-                                self._log("🗑️ Локальний файл видалено після завантаження в Google Drive")
-                            except Exception as remove_error:
-                                self._log(f"⚠️ Не вдалося видалити локальний файл: {remove_error}")
-                            self.last_upload_success = True
-                            if self.temp_dir and os.path.isdir(self.temp_dir):
-                                shutil.rmtree(self.temp_dir, ignore_errors=True)
-                                self.temp_dir = None
-                            self._log("🛑 Запис зупинено")
-                            return
-                        else:
-                            self._log("⚠️ Не вдалося завантажити в Google Drive, завантажуємо на сервер...")
-                    else:
-                        self._log("⚠️ Google Drive не ініціалізовано, завантажуємо на сервер...")
-                else:
-                    if not GOOGLE_DRIVE_ENABLED:
-                        self._log("ℹ️ Google Drive вимкнено, завантажуємо на сервер...")
-                    elif not google_drive_available:
-                        self._log("⚠️ Google Drive API не доступний, завантажуємо на сервер...")
-                
-                # Якщо Google Drive не працює або вимкнено, завантажуємо на сервер
-                upload_success = self.upload_video(final_path)
-                self.last_upload_success = upload_success
-                if upload_success and self.temp_dir and os.path.isdir(self.temp_dir):
-                    shutil.rmtree(self.temp_dir, ignore_errors=True)
-                    self.temp_dir = None
+            self.rotate_segment()  # останній сегмент закривається й вивантажується тим самим шляхом
+            pending = self.segment_uploader.pending
+            if pending:
+                self._log(f"⏳ У черзі вивантаження {pending} сегмент(ів) — продовжуємо у фоні")
+            if self.api:
+                self._log(f"🌐 API: {json.dumps(self.api.snapshot(), ensure_ascii=False)}")
 
         self._log("🛑 Запис зупинено")
 
     def stop_recording(self):
+        self.end_recording()
+        self.show_panel("screen")
+
+    def end_recording(self):
         self.is_recording = False
         if self.ws:
             try:
                 self.ws.close()
             except Exception:
                 pass
-        self.show_panel("screen")
 
     def update_status(self, text):
         try:
@@ -990,18 +3209,120 @@ class SimpleRecorder:
             pass
 
     def on_closing(self):
-        self.is_recording = False
-        if self.ws:
-            try:
-                self.ws.close()
-            except Exception:
-                pass
+        self.shutdown()
         self.root.destroy()
 
+    def shutdown(self):
+        self.end_recording()
+        # Дописуємо останній сегмент на диск; невивантажене лишається в спулі до наступного запуску
+        if self.recording_thread and self.recording_thread.is_alive():
+            self.recording_thread.join(timeout=10)
+        if self.segment_uploader:
+            self.segment_uploader.wait_closed(timeout=30)
+        if self.metrics_server:
+            self.metrics_server.close()
+
     def run(self):
+        # Поки користувач входить, у фоні підвантажуємо те, що знадобиться для запису
+        threading.Thread(target=preload, args=(np, cv2, websocket), name="preload", daemon=True).start()
         self.root.mainloop()
 
 
+EXIT_OK = 0              # запис вивантажено, черга порожня
+EXIT_UPLOAD_PENDING = 1  # запис лишився в спулі (сервер недоступний / помилка) — дозавантажиться пізніше
+EXIT_USAGE = 2           # неправильні аргументи (як у argparse)
+EXIT_NO_CAPTURE = 3      # немає екранів для запису
+
+
+def parse_monitors(value):
+    """"1,2" (нумерація як у вікні, з 1) → [0, 1]"""
+    try:
+        numbers = sorted({int(part) for part in value.split(",") if part.strip()})
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"очікується список номерів екранів через кому: {value!r}")
+    if not numbers or numbers[0] < 1:
+        raise argparse.ArgumentTypeError("номери екранів починаються з 1")
+    return [number - 1 for number in numbers]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Simple Screen Recorder")
+    parser.add_argument("--headless", action="store_true", help="без вікна (tkinter не завантажується)")
+    parser.add_argument("--room", help=f"кімната ({', '.join(ROOMS)})")
+    parser.add_argument("--user", help="нікнейм стрімера")
+    parser.add_argument("--monitors", type=parse_monitors, default=[0], help="екрани через кому, з 1 (за замовчуванням 1)")
+    parser.add_argument("--duration", type=float, default=0, help="тривалість запису, сек (0 — до Ctrl+C / SIGTERM)")
+    parser.add_argument("--upload-timeout", type=float, default=600, help="скільки чекати на вивантаження після зупинки, сек")
+    return parser
+
+
+def run_headless(args):
+    """Запис без вікна; код виходу — результат вивантаження (EXIT_*)"""
+    recorder = SimpleRecorder(headless=True)
+    recorder.login(args.room, args.user)
+    try:
+        with mss.mss() as sct:
+            available = len(sct.monitors) - 1
+    except Exception as capture_error:
+        recorder._log(f"❌ Захоплення екрана недоступне: {capture_error}")
+        return EXIT_NO_CAPTURE
+    missing = [index + 1 for index in args.monitors if index >= available]
+    if missing:
+        recorder._log(f"❌ Немає екранів {missing}, доступно: {available}")
+        return EXIT_NO_CAPTURE
+
+    stop = threading.Event()
+    for name in ("SIGINT", "SIGTERM"):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), lambda signum, frame: stop.set())
+
+    recorder.begin_recording(args.monitors)
+    recorder._log(f"🎬 Headless-запис екранів {[index + 1 for index in args.monitors]}"
+                  + (f" на {args.duration:.0f} сек" if args.duration else " до Ctrl+C / SIGTERM"))
+    deadline = time.monotonic() + args.duration if args.duration else None
+    # Короткі очікування: на Windows безтермінове Event.wait() не перериває Ctrl+C
+    while not stop.wait(0.5):
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+    recorder.shutdown()
+
+    return finish_headless(recorder, args.upload_timeout)
+
+
+def finish_headless(recorder, upload_timeout):
+    """Чекає вивантаження сегментів цього запуску; решта спулу (минулі запуски, інші кімнати) лише в лозі"""
+    uploader = recorder.segment_uploader
+    uploader.wait_drained(upload_timeout, paths=recorder.segment_paths)
+    pending = len(recorder.spool.states(recorder.segment_paths))
+    backlog = sum(recorder.spool.counts().values()) - pending
+    if not pending:
+        recorder._log(f"✅ Усі сегменти запису вивантажено ({len(recorder.segment_paths)})")
+        code = EXIT_OK
+    else:
+        recorder._log(f"⚠️ Не вивантажено сегментів запису: {pending} — лишаються в спулі {recorder.spool.directory}")
+        code = EXIT_UPLOAD_PENDING
+    if backlog > 0:
+        recorder._log(f"📦 У спулі ще {backlog} сегмент(ів) з інших запусків — дозавантажаться пізніше")
+    if recorder.logger:
+        recorder.logger.close()
+    return code
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not args.headless:
+        SimpleRecorder().run()
+        return EXIT_OK
+    if not args.room or not args.user:
+        parser.error("--headless потребує --room і --user")
+    if len(args.user.strip()) < 2:
+        parser.error("нікнейм занадто короткий")
+    args.user = args.user.strip()
+    args.room = args.room.strip()
+    return run_headless(args)
+
+
 if __name__ == "__main__":
-    SimpleRecorder().run()
+    sys.exit(main())
 
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модулі застосунку лежать поруч із tests/, пакетом вони не оформлені
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""ApiClient: перевірка TLS увімкнена за замовчуванням, вимикається лише явно"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def default_verify(**env):
+    """verify нового ApiClient у свіжому інтерпретаторі з заданими змінними оточення"""
+    environment = {key: value for key, value in os.environ.items()
+                   if key not in ("SIMPLE_RECORDER_VERIFY_TLS", "SIMPLE_RECORDER_CA_BUNDLE")}
+    environment.update(env)
+    result = subprocess.run(
+        [sys.executable, "-c", "from api_client import ApiClient; print(repr(ApiClient('https://x').verify))"],
+        cwd=APP_DIR, env=environment, capture_output=True, text=True, check=True,
+    )
+    return result.stdout.strip()
+
+
+@pytest.mark.parametrize("env, expected", [
+    ({}, "True"),
+    ({"SIMPLE_RECORDER_VERIFY_TLS": "0"}, "False"),
+    ({"SIMPLE_RECORDER_CA_BUNDLE": "/etc/recorder/ca.pem"}, "'/etc/recorder/ca.pem'"),
+    ({"SIMPLE_RECORDER_CA_BUNDLE": "/etc/recorder/ca.pem", "SIMPLE_RECORDER_VERIFY_TLS": "0"},
+     "'/etc/recorder/ca.pem'"),
+])
+def test_tls_verification_setting(env, expected):
+    assert default_verify(**env) == expected
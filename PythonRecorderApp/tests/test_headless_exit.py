@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Код виходу headless-запуску залежить лише від сегментів цього запуску, а не від усього спулу"""
+
+import types
+
+import pytest
+
+simple_recorder = pytest.importorskip("simple_recorder")
+from upload_spool import UploadSpool
+
+
+@pytest.fixture
+def recorder(tmp_path):
+    spool = UploadSpool(str(tmp_path / "spool"))
+    recorder = types.SimpleNamespace(spool=spool, segment_paths=[], logger=None, log=[], rejected=set())
+    recorder._log = recorder.log.append
+    recorder.upload_recording = lambda path, username, room: path not in recorder.rejected
+    yield recorder
+    recorder.segment_uploader.close(1)
+    spool.close()
+
+
+def add_segment(recorder, name, own=True):
+    """Готовий до вивантаження сегмент; own=False — залишок минулого запуску або іншої кімнати"""
+    path = recorder.spool.path_for(name)
+    with open(path, "wb") as segment:
+        segment.write(b"\0" * 1024)
+    recorder.spool.add(path, "user", "room", 1)
+    recorder.spool.mark_pending(path)
+    if own:
+        recorder.segment_paths.append(path)
+    return path
+
+
+def finish(recorder):
+    recorder.segment_uploader = simple_recorder.SegmentUploader(recorder, recorder.spool, workers=1)
+    return simple_recorder.finish_headless(recorder, upload_timeout=10)
+
+
+def test_stale_backlog_does_not_fail_run(recorder):
+    stale = add_segment(recorder, "other_room_part1.mp4", own=False)
+    add_segment(recorder, "room_user_part1.mp4")
+    recorder.rejected.add(stale)
+
+    assert finish(recorder) == simple_recorder.EXIT_OK
+    assert list(recorder.spool.states([stale])) == [stale]  # чужий сегмент лишився в спулі на повтор
+    assert any("з інших запусків" in line for line in recorder.log)
+
+
+def test_own_failed_segment_fails_run(recorder):
+    add_segment(recorder, "other_room_part1.mp4", own=False)
+    recorder.rejected.add(add_segment(recorder, "room_user_part1.mp4"))
+
+    assert finish(recorder) == simple_recorder.EXIT_UPLOAD_PENDING
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""JPEG-кодувальники: кожен встановлений бекенд дає JPEG того ж розміру і поважає опції"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+simple_recorder = pytest.importorskip("simple_recorder")
+
+FAST_DCT_BACKENDS = {"turbojpeg", "simplejpeg"}  # cv2 і Pillow опцію ігнорують
+# Коефіцієнти дискретизації яскравості (H << 4 | V) у SOF при кольоровості 1×1
+LUMA_SAMPLING = {"444": 0x11, "422": 0x21, "420": 0x22}
+
+
+@pytest.fixture(params=sorted(simple_recorder.JPEG_ENCODERS))
+def encoder_cls(request):
+    encoder_cls = simple_recorder.JPEG_ENCODERS[request.param]
+    if not encoder_cls.available():
+        pytest.skip(f"{request.param} не встановлено")
+    return encoder_cls
+
+
+@pytest.fixture(scope="module")
+def frame():
+    """Фіксований BGR-кадр непарного розміру з дрібними деталями, на яких видно різницю DCT"""
+    rng = np.random.default_rng(9)
+    frame = rng.integers(0, 256, (123, 201, 3), dtype=np.uint8)
+    frame[:40] = (200, 80, 20)
+    return frame
+
+
+def sampling_factors(jpeg):
+    """[(id компонента, H << 4 | V)] з маркера SOF"""
+    data = bytes(jpeg)
+    position = 2
+    while position < len(data):
+        marker, length = data[position + 1], int.from_bytes(data[position + 2:position + 4], "big")
+        if marker in (0xC0, 0xC1, 0xC2):
+            components = data[position + 9]
+            return [(data[position + 10 + 3 * index], data[position + 11 + 3 * index])
+                    for index in range(components)]
+        position += 2 + length
+    raise AssertionError("у JPEG немає SOF")
+
+
+def decode(jpeg):
+    return cv2.imdecode(np.frombuffer(bytes(jpeg), dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def test_roundtrip_keeps_shape(encoder_cls, frame):
+    decoded = decode(encoder_cls().encode(frame, 80))
+    assert decoded is not None
+    assert decoded.shape == frame.shape
+    # Однотонна смуга вгорі переживає стиснення майже без змін (і в порядку BGR, а не RGB)
+    assert np.abs(decoded[5:35, 5:195].astype(int) - (200, 80, 20)).mean() < 8
+
+
+@pytest.mark.parametrize("subsampling", sorted(LUMA_SAMPLING))
+def test_subsampling_is_honoured(encoder_cls, frame, subsampling):
+    if encoder_cls is simple_recorder.Cv2JpegEncoder and not hasattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR"):
+        pytest.skip("стара збірка OpenCV кодує лише 4:2:0")
+    factors = sampling_factors(encoder_cls(subsampling=subsampling).encode(frame, 80))
+    assert [sampling for _, sampling in factors] == [LUMA_SAMPLING[subsampling], 0x11, 0x11]
+
+
+def spy_fast_dct(encoder_cls, monkeypatch):
+    """Підміняє виклик бібліотеки обгорткою, що запам'ятовує прапорець fast DCT.
+
+    libjpeg-turbo з SIMD може давати однакові байти для обох DCT, тож перевіряється
+    саме те, що опція доходить до бібліотеки.
+    """
+    seen = []
+    if encoder_cls is simple_recorder.SimpleJpegEncoder:
+        original = simple_recorder.simplejpeg.encode_jpeg
+
+        def encode_jpeg(*args, **kwargs):
+            seen.append(kwargs["fastdct"])
+            return original(*args, **kwargs)
+
+        monkeypatch.setattr(simple_recorder.simplejpeg, "encode_jpeg", encode_jpeg)
+    elif encoder_cls is simple_recorder.TurboJpegEncoder:
+        library = encoder_cls._library
+        original = library.encode
+
+        def encode(*args, **kwargs):
+            seen.append(bool(kwargs["flags"] & simple_recorder.turbojpeg.TJFLAG_FASTDCT))
+            return original(*args, **kwargs)
+
+        monkeypatch.setattr(library, "encode", encode)
+    return seen
+
+
+def test_fast_dct_is_honoured(encoder_cls, frame, monkeypatch):
+    seen = spy_fast_dct(encoder_cls, monkeypatch)
+    accurate = bytes(encoder_cls(fast_dct=False).encode(frame, 90))
+    fast = bytes(encoder_cls(fast_dct=True).encode(frame, 90))
+    assert decode(fast).shape == frame.shape
+    if encoder_cls.name in FAST_DCT_BACKENDS:
+        assert seen == [False, True]
+    else:
+        assert fast == accurate  # опція ігнорується, а не ламає кодування
+
+
+def test_unknown_subsampling_is_rejected(encoder_cls):
+    with pytest.raises(ValueError):
+        encoder_cls(subsampling="411")
+
+
+def test_result_survives_next_encode(encoder_cls, frame):
+    """Дельта тримає JPEG кожної плитки, поки кодує наступні, — результат не можна перевикористовувати"""
+    encoder = encoder_cls()
+    first = encoder.encode(frame, 80)
+    snapshot = bytes(first)
+    encoder.encode(frame[:64, :64], 50)
+    assert bytes(first) == snapshot
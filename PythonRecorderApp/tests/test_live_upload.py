@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Живе вивантаження: фрагментований MP4 дописується на chunk_server під час запису"""
+
+import time
+import types
+
+import pytest
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+simple_recorder = pytest.importorskip("simple_recorder")
+import chunk_server
+import video_writer
+from api_client import ApiClient
+
+FPS = 10
+SIZE = (160, 120)
+
+
+@pytest.fixture
+def server(tmp_path):
+    server, store = chunk_server.serve(str(tmp_path / "server"), quiet=True)
+    yield server, store
+    server.shutdown()
+    server.server_close()
+
+
+def make_frame(index):
+    frame = np.full((SIZE[1], SIZE[0], 3), 30, np.uint8)
+    frame[40:80, (index * 4) % (SIZE[0] - 30):][:, :30] = (40, 180, 220)
+    return frame
+
+
+def test_segment_lands_on_server_right_after_stop(tmp_path, server, monkeypatch):
+    if not video_writer.find_ffmpeg():
+        pytest.skip("ffmpeg недоступний")
+    server, store = server
+    monkeypatch.setattr(simple_recorder, "LIVE_UPLOAD_INTERVAL", 0.2)
+    recorder = types.SimpleNamespace(
+        api=ApiClient(f"http://127.0.0.1:{server.server_address[1]}", retries=0),
+        username="user", room="room", log=[],
+    )
+    recorder._log = recorder.log.append
+    path = str(tmp_path / "room_user_part1.mp4")
+    session = simple_recorder.LiveUploadSession(recorder, "room_user_part1.mp4")
+    writer = video_writer.FragmentedMp4Writer(path, FPS, SIZE, session, fragment_seconds=0.5, log=recorder._log)
+    assert writer.isOpened()
+
+    frames = 4 * FPS
+    for index in range(frames):
+        writer.write(make_frame(index))
+        time.sleep(1 / FPS)
+    # Фрагменти вже пішли на сервер, поки сегмент ще пишеться
+    deadline = time.monotonic() + 5
+    while session.sent == 0 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert session.sent > 0
+    assert not store.events
+
+    stopped = time.time()
+    writer.release()
+    assert session.completed, recorder.log
+    [(landed, final_path)] = store.events
+    assert landed - stopped < 5
+
+    assert chunk_server.file_sha256(final_path) == simple_recorder.file_sha256(path)
+    assert session.sent == writer.bytes_out
+    capture = cv2.VideoCapture(final_path)
+    decoded = 0
+    while capture.read()[0]:
+        decoded += 1
+    capture.release()
+    assert decoded == frames
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""LogFileWriter: порядок рядків при паралельних flush і ротація"""
+
+import gzip
+import threading
+import time
+
+import pytest
+
+simple_recorder = pytest.importorskip("simple_recorder")
+
+
+def read_lines(path):
+    with open(path, encoding="utf-8") as source:
+        return source.read().splitlines()
+
+
+class LateLock:
+    """Замок, перед яким потік slow-flusher засинає — як flush, витіснений планувальником"""
+
+    def __init__(self, lock):
+        self.lock = lock
+
+    def __enter__(self):
+        if threading.current_thread().name == "slow-flusher":
+            time.sleep(0.05)
+        return self.lock.__enter__()
+
+    def __exit__(self, *exc):
+        return self.lock.__exit__(*exc)
+
+
+def test_concurrent_flushes_keep_line_order(tmp_path):
+    path = str(tmp_path / "recorder.log")
+    writer = simple_recorder.LogFileWriter(path, max_bytes=0)
+    writer._io_lock = LateLock(writer._io_lock)
+    for number in range(10):
+        writer.write(str(number))
+    slow = threading.Thread(target=writer.flush, name="slow-flusher")
+    slow.start()
+    time.sleep(0.01)
+    for number in range(10, 20):
+        writer.write(str(number))
+    writer.flush()  # випереджає повільний flush
+    slow.join()
+    writer.close()
+
+    assert read_lines(path) == [str(number) for number in range(20)]
+
+
+def test_rotation_keeps_backups(tmp_path):
+    path = str(tmp_path / "recorder.log")
+    writer = simple_recorder.LogFileWriter(path, max_bytes=500, backups=2, compress=True)
+    for batch in range(5):
+        for number in range(100):
+            writer.write(f"{batch}:{number:04d}")
+        writer.flush()
+    writer.close()
+
+    assert writer.rotations == 5
+    assert not (tmp_path / "recorder.log.3.gz").exists()
+    with gzip.open(tmp_path / "recorder.log.1.gz", "rt", encoding="utf-8") as rotated:
+        assert rotated.read().splitlines() == [f"4:{number:04d}" for number in range(100)]
+    assert read_lines(path) == []
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""LogShipper: рядки не губляться на виході, навіть якщо відправка зависла на мережі"""
+
+import json
+import threading
+import types
+
+import pytest
+
+simple_recorder = pytest.importorskip("simple_recorder")
+
+
+class HangingApi:
+    """post() чекає, поки тест не відпустить його, і відповідає status"""
+    def __init__(self, status=500):
+        self.status = status
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.bodies = []
+
+    def post(self, path, data=None, headers=None, timeout=None):
+        self.bodies.append(data)
+        self.entered.set()
+        self.release.wait(5)
+        return types.SimpleNamespace(status_code=self.status)
+
+
+def read_overflow(path):
+    with open(path, encoding="utf-8") as overflow:
+        return [json.loads(raw) for raw in overflow]
+
+
+def test_close_spills_queue_when_send_hangs(tmp_path, monkeypatch):
+    monkeypatch.setattr(simple_recorder, "LOG_BATCH_LINES", 1)
+    overflow_path = str(tmp_path / "recorder.log.pending")
+    api = HangingApi()
+    shipper = simple_recorder.LogShipper(api, "user", "room", overflow_path)
+    shipper.submit("a")
+    assert api.entered.wait(2)
+    shipper.submit("b")
+    shipper.submit("c")
+
+    shipper.close(timeout=0.2)
+    assert read_overflow(overflow_path) == ["b", "c"]  # вже на диску, хоча потік ще чекає на мережу
+
+    api.release.set()
+    shipper._thread.join(2)
+    assert sorted(read_overflow(overflow_path)) == ["a", "b", "c"]
+
+
+def test_overflow_keeps_lines_appended_during_send(tmp_path):
+    overflow_path = str(tmp_path / "recorder.log.pending")
+    with open(overflow_path, "w", encoding="utf-8") as overflow:
+        overflow.write('"old"\n')
+    api = HangingApi(status=200)
+    shipper = simple_recorder.LogShipper(api, "user", "room")
+    shipper.close()  # фоновий потік не заважає: файл дочищуємо вручну
+    shipper.overflow_path = overflow_path
+
+    result = []
+    sender = threading.Thread(target=lambda: result.append(shipper._ship_overflow()))
+    sender.start()
+    assert api.entered.wait(2)
+    shipper._spill(["new"])
+    api.release.set()
+    sender.join(2)
+
+    assert result == [False]
+    assert read_overflow(overflow_path) == ["new"]
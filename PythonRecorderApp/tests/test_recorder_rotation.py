@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""Ротация частей в recorder.py: ни один кадр не теряется на стыке, остановка во время ротации"""
+
+import importlib
+import importlib.util
+import os
+import queue
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+pytest.importorskip("mss")
+pytest.importorskip("PIL")
+
+
+def import_recorder():
+    """recorder без окна: Python без Tk (headless CI) получает пустые модули tkinter"""
+    if importlib.util.find_spec("tkinter") is None and "recorder" not in sys.modules:
+        for name in ("tkinter", "tkinter.ttk", "tkinter.messagebox"):
+            sys.modules.setdefault(name, types.ModuleType(name))
+    return importlib.import_module("recorder")
+
+
+recorder = import_recorder()
+
+
+class FakeWriter:
+    def __init__(self, path):
+        self.path = path
+        self.frames = 0
+        self.released = False
+        with open(path, "wb"):
+            pass
+
+    def isOpened(self):
+        return True
+
+    def write(self, frame):
+        assert not self.released, "кадр записан в уже закрытый файл"
+        self.frames += 1
+
+    def release(self):
+        self.released = True
+
+
+class FakeScreen:
+    """mss.mss(): один монитор 64×48, каждый grab — новый BGRA-кадр"""
+
+    monitors = [{"left": 0, "top": 0, "width": 64, "height": 48}] * 2
+
+    def __init__(self):
+        self.grabs = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def grab(self, monitor):
+        self.grabs += 1
+        return np.full((monitor["height"], monitor["width"], 4), self.grabs % 256, np.uint8)
+
+
+def make_recorder(tmp_path):
+    """LiveKitRecorder без окна Tk: только состояние, нужное записи и ротации"""
+    rec = object.__new__(recorder.LiveKitRecorder)
+    rec.is_recording = True
+    rec.video_writer = None
+    rec.current_video_file = None
+    rec.part_number = 1
+    rec.frame_size = None
+    rec.frames_written = 0
+    rec.segment_frames = 0
+    rec.writer_lock = threading.Lock()
+    rec.timeline = None
+    rec.timeline_writer = None
+    rec.upload_queue = queue.Queue()
+    rec.stop_event = threading.Event()
+    rec.selected_screens = [1]
+    rec.writers = []
+
+    def open_video_writer():
+        writer = FakeWriter(str(tmp_path / f"part{len(rec.writers) + 1}.mp4"))
+        rec.writers.append(writer)
+        return writer, writer.path
+
+    rec.open_video_writer = open_video_writer
+    return rec
+
+
+def drain(rec):
+    parts = []
+    while not rec.upload_queue.empty():
+        parts.append(rec.upload_queue.get_nowait())
+    return parts
+
+
+def test_rotation_keeps_every_frame(tmp_path, monkeypatch):
+    screen = FakeScreen()
+    monkeypatch.setattr(recorder.mss, "mss", lambda: screen)
+    rec = make_recorder(tmp_path)
+
+    thread = threading.Thread(target=rec.recording_loop, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while rec.frames_written == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    for _ in range(5):
+        time.sleep(0.05)
+        rec.rotate_segment()
+    rec.is_recording = False
+    thread.join(5)
+    assert not thread.is_alive()
+
+    parts = drain(rec)
+    assert [part for _, _, part, _ in parts] == [1, 2, 3, 4, 5, 6]
+    assert [writer for writer, _, _, _ in parts] == rec.writers
+    # Счётчик каждой части совпадает с тем, что реально ушло в её файл
+    assert [frames for _, _, _, frames in parts] == [writer.frames for writer in rec.writers]
+    assert sum(frames for _, _, _, frames in parts) == rec.frames_written
+    assert rec.frames_written >= screen.grabs > 0
+
+
+def test_stop_during_rotation_discards_new_file(tmp_path):
+    rec = make_recorder(tmp_path)
+    rec.frame_size = (64, 48)
+    first, first_path = rec.open_video_writer()
+    rec.video_writer, rec.current_video_file = first, first_path
+    rec.segment_frames = 7
+    opener = rec.open_video_writer
+
+    def open_while_stopping():
+        writer, path = opener()
+        # Пока открывается новый файл, запись останавливается и забирает последнюю часть
+        rec.is_recording = False
+        rec.finish_segment()
+        return writer, path
+
+    rec.open_video_writer = open_while_stopping
+    rec.rotate_segment()
+
+    assert drain(rec) == [(first, first_path, 1, 7)]
+    assert rec.video_writer is None
+    second = rec.writers[1]
+    assert second.released
+    assert not os.path.exists(second.path)
+
+
+def test_stop_wakes_auto_save(monkeypatch):
+    rec = object.__new__(recorder.LiveKitRecorder)
+    rotations = []
+    monkeypatch.setattr(rec, "rotate_segment", lambda: rotations.append(1), raising=False)
+    stop_event = threading.Event()
+    thread = threading.Thread(target=rec.auto_save_loop, args=(stop_event,), daemon=True)
+    thread.start()
+    stop_event.set()
+    thread.join(1)
+    assert not thread.is_alive()
+    assert rotations == []
+
+
+class FakeRoot:
+    def __init__(self):
+        self.closed = threading.Event()
+
+    def after(self, delay, callback):
+        callback()
+
+    def quit(self):
+        self.closed.set()
+
+
+def test_quit_does_not_block_on_stuck_upload(tmp_path):
+    rec = make_recorder(tmp_path)
+    rec.is_recording = False
+    rec.tray_icon = None
+    rec.root = FakeRoot()
+    rec.upload_queue.put((None, None, 1, 0))  # загрузчик так и не закончит эту часть
+
+    started = time.monotonic()
+    rec.quit_app()
+    assert time.monotonic() - started < 0.5  # поток Tk свободен сразу
+    assert not rec.root.closed.is_set()
+
+    rec.quit_after_uploads(timeout=0.3)
+    assert rec.root.closed.is_set()
+
+
+def test_quit_closes_once_uploads_finish(tmp_path):
+    rec = make_recorder(tmp_path)
+    rec.is_recording = False
+    rec.tray_icon = None
+    rec.root = FakeRoot()
+    rec.upload_queue.put((None, None, 1, 0))
+    rec.quit_app()
+    rec.upload_queue.get()
+    rec.upload_queue.task_done()
+    assert rec.root.closed.wait(2)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""ResumableUpload проти chunk_server: кожен вид збою закінчується цілим файлом на сервері"""
+
+import hashlib
+import os
+import types
+
+import pytest
+
+requests = pytest.importorskip("requests")
+simple_recorder = pytest.importorskip("simple_recorder")
+import chunk_server
+from api_client import ApiClient
+
+CHUNK_SIZE = 64 * 1024
+
+
+@pytest.fixture
+def payload(tmp_path):
+    path = tmp_path / "room_user_part1.mp4"
+    data = os.urandom(16 * CHUNK_SIZE + 123)
+    path.write_bytes(data)
+    return str(path), hashlib.sha256(data).hexdigest()
+
+
+def start_server(tmp_path, mode):
+    server, store = chunk_server.serve(str(tmp_path / "server"), quiet=True, fail_every=3, failure_modes=(mode,))
+    recorder = types.SimpleNamespace(
+        api=ApiClient(f"http://127.0.0.1:{server.server_address[1]}", retries=0),
+        log=[],
+    )
+    recorder._log = recorder.log.append
+    return server, store, recorder
+
+
+def upload(recorder, path, max_retries, sleeps):
+    return simple_recorder.ResumableUpload(recorder, path, "user", "room", chunk_size=CHUNK_SIZE,
+                                           max_retries=max_retries, sleep=sleeps.append)
+
+
+@pytest.mark.parametrize("mode", chunk_server.FAILURE_MODES)
+def test_upload_survives_failure(tmp_path, payload, mode):
+    path, sha256 = payload
+    server, store, recorder = start_server(tmp_path, mode)
+    sleeps = []
+    try:
+        # Перша спроба без повторів обривається на першому ж збої, як при втраті мережі чи закритті програми
+        first = upload(recorder, path, 0, sleeps)
+        try:
+            response = first.run()
+        except requests.exceptions.ConnectionError:
+            response = None
+        assert response is None or response.status_code != 200
+        assert first.retries == 1
+
+        second = upload(recorder, path, 5, sleeps)
+        response = second.run()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert response.status_code == 200
+    assert response.json()["received"] == os.path.getsize(path)
+    assert store.injected[mode] >= 1
+    assert sum(store.injected.values()) == store.injected[mode]
+    [(_, final_path)] = store.events
+    assert chunk_server.file_sha256(final_path) == sha256
+    if mode == "corrupt_file":
+        # Зіпсований на диску файл ловить лише sha256 фінального шматка — сервер скидає сесію
+        assert first.restarts == 1
+        assert second.resumed_from == 0
+    else:
+        # Друга спроба продовжує з того, що сервер уже має, і сама переживає наступні збої
+        assert second.resumed_from > 0
+        assert second.retries >= 1
+        assert second.chunks < 16
+        assert len(sleeps) >= second.retries  # повтори йдуть із затримкою, а не одразу
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""FfmpegVideoWriter: падіння ffmpeg посеред сегмента не знищує вже закодовані кадри"""
+
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+import video_writer
+
+FPS = 10
+SIZE = (160, 120)
+
+
+def make_frame(index):
+    frame = np.full((SIZE[1], SIZE[0], 3), 30, np.uint8)
+    frame[40:80, (index * 4) % (SIZE[0] - 30):][:, :30] = (40, 180, 220)
+    return frame
+
+
+def count_frames(path):
+    capture = cv2.VideoCapture(path)
+    frames = 0
+    while capture.read()[0]:
+        frames += 1
+    capture.release()
+    return frames
+
+
+@pytest.fixture(autouse=True)
+def fresh_crash_counter(monkeypatch):
+    # Падіння в тесті не повинно перемикати наступні тести процесу на cv2
+    monkeypatch.setattr(video_writer, "_ffmpeg_crashes", 0)
+
+
+def test_ffmpeg_crash_keeps_encoded_frames(tmp_path):
+    if not video_writer.find_ffmpeg():
+        pytest.skip("ffmpeg недоступний")
+    path = str(tmp_path / "room_user_part1.mp4")
+    registered = []
+    logs = []
+    writer = video_writer.FfmpegVideoWriter(path, FPS, SIZE, fragment_seconds=0.5, log=logs.append,
+                                            on_fallback=registered.append)
+    assert writer.isOpened()
+    for index in range(40):
+        writer.write(make_frame(index))
+    # Даємо ffmpeg закодувати й записати фрагменти, потім «падіння» процесу
+    deadline = time.monotonic() + 10
+    while count_frames(path) < 20 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    writer._process.kill()
+    writer._process.wait()
+
+    for index in range(40, 55):
+        writer.write(make_frame(index))
+    writer.release()
+
+    continuation = str(tmp_path / "room_user_part1.cv2.mp4")
+    assert writer.failed
+    assert writer.continuation == continuation
+    assert registered == [continuation]
+    # Завершені фрагменти до падіння лишилися у файлі ffmpeg (фрагмент — 5 кадрів)
+    assert count_frames(path) >= 20
+    assert count_frames(continuation) == 15
+
+
+def test_continuation_path():
+    assert video_writer.continuation_path("/spool/a_part3.mp4") == "/spool/a_part3.cv2.mp4"
+    assert video_writer.continuation_path("/spool/raw") == "/spool/raw.cv2.mp4"
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Постійна черга вивантаження сегментів запису.
+
+Сегменти пишуться одразу в каталог спулу (а не в тимчасовий), а маленький індекс
+SQLite поруч пам'ятає кожен файл, його власника (користувач/кімната) і стан
+вивантаження. Після падіння чи перезавантаження машини незавершені записи
+повертаються в чергу і дозавантажуються при наступному запуску.
+
+Стани: recording — файл ще пишеться; pending — чекає на вивантаження (можливо,
+після невдалої спроби, тоді з next_attempt); uploading — вивантажується зараз.
+Вивантажений сегмент видаляється з індексу разом із файлом.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+
+SPOOL_DIR = os.getenv("SIMPLE_RECORDER_SPOOL_DIR") or os.path.join(os.path.expanduser("~"), ".livekit_recorder_spool")
+SPOOL_RETRY_BASE = 30.0    # сек до повтору після першої невдачі, далі вдвічі більше
+SPOOL_RETRY_MAX = 15 * 60  # сек — довше не чекаємо, сервер може повернутися будь-коли
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL UNIQUE,
+    username TEXT,
+    room TEXT,
+    part INTEGER,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+class SpoolEntry:
+    __slots__ = ("id", "path", "username", "room", "part", "attempts")
+
+    def __init__(self, id, path, username, room, part, attempts):
+        self.id = id
+        self.path = path
+        self.username = username
+        self.room = room
+        self.part = part
+        self.attempts = attempts
+
+
+class UploadSpool:
+    """Каталог сегментів з індексом SQLite; методи потокобезпечні"""
+
+    def __init__(self, directory=SPOOL_DIR):
+        self.directory = os.path.abspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(self.directory, "spool.db"), check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(SCHEMA)
+        self.recovered = self._recover()
+
+    def _recover(self):
+        """Записи, перервані падінням (recording/uploading), знову стають pending; повертає розмір черги"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE segments SET state = 'pending', next_attempt = 0, updated_at = ? "
+                "WHERE state IN ('recording', 'uploading')", (time.time(),)
+            )
+            return self._db.execute("SELECT COUNT(*) FROM segments WHERE state = 'pending'").fetchone()[0]
+
+    def path_for(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def add(self, path, username, room, part):
+        """Реєструє сегмент до створення файлу, тож жоден файл спулу не лишається без запису"""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO segments (path, username, room, part, state, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 'recording', ?, ?)",
+                (path, username, room, part, now, now),
+            )
+
+    def mark_pending(self, path):
+        with self._lock:
+            self._db.execute(
+                "UPDATE segments SET state = 'pending', next_attempt = 0, updated_at = ? WHERE path = ?",
+                (time.time(), path),
+            )
+
+    def claim(self):
+        """Бере наступний сегмент, готовий до вивантаження (найстаріший першим), або None"""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, path, username, room, part, attempts FROM segments "
+                "WHERE state = 'pending' AND next_attempt <= ? ORDER BY created_at, id LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE segments SET state = 'uploading', updated_at = ? WHERE id = ?", (now, row[0]))
+        return SpoolEntry(*row)
+
+    def complete(self, path):
+        with self._lock:
+            self._db.execute("DELETE FROM segments WHERE path = ?", (path,))
+
+    def fail(self, entry, error):
+        """Повертає сегмент у чергу з експоненційною затримкою; повертає її в секундах"""
+        delay = min(SPOOL_RETRY_MAX, SPOOL_RETRY_BASE * 2 ** entry.attempts)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE segments SET state = 'pending', attempts = attempts + 1, next_attempt = ?, "
+                "last_error = ?, updated_at = ? WHERE id = ?",
+                (now + delay, str(error)[:500], now, entry.id),
+            )
+        return delay
+
+    def next_due(self):
+        """Через скільки секунд з'явиться сегмент для вивантаження (None — черга порожня)"""
+        with self._lock:
+            row = self._db.execute("SELECT MIN(next_attempt) FROM segments WHERE state = 'pending'").fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def counts(self):
+        with self._lock:
+            rows = self._db.execute("SELECT state, COUNT(*) FROM segments GROUP BY state").fetchall()
+        return dict(rows)
+
+    def states(self, paths):
+        """Невивантажені сегменти з paths: {path: (state, next_attempt)}; вивантажених у спулі вже немає"""
+        paths = set(paths)
+        with self._lock:
+            rows = self._db.execute("SELECT path, state, next_attempt FROM segments").fetchall()
+        return {path: (state, next_attempt) for path, state, next_attempt in rows if path in paths}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
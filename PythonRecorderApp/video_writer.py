@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Кодувальники архівного відео й таймінг кадрів для обох записувачів.
+
+FfmpegVideoWriter пише сирі BGR-кадри в процес ffmpeg (H.264/H.265) через pipe і має
+той самий інтерфейс, що cv2.VideoWriter (isOpened / write / release). Якщо ffmpeg
+немає, запис іде через cv2.VideoWriter (mp4v). Файл ffmpeg — фрагментований MP4, тож
+навіть після падіння процесу в ньому лишаються всі завершені фрагменти; решта
+сегмента дописується через cv2 в окремий файл поруч (<ім'я>.cv2.mp4, continuation).
+FragmentedMp4Writer пише фрагментований MP4 і віддає байти щойно ffmpeg їх видав —
+для живого вивантаження сегмента на сервер під час запису.
+
+FrameClock задає темп захоплення за монотонними дедлайнами без накопичення дрейфу,
+а FrameTimeline розкладає кадри по слотах FPS файлу (дублює чи викидає), тож
+тривалість відео завжди дорівнює реальному часу запису.
+"""
+
+import os
+import time
+import shutil
+import subprocess
+import threading
+import collections
+
+from lazy_imports import LazyModule
+
+cv2 = LazyModule("cv2")  # імпорт при першому записі, а не при старті програми
+
+# auto — ffmpeg, якщо знайдено (PATH, SIMPLE_RECORDER_FFMPEG або imageio-ffmpeg), інакше cv2
+VIDEO_ENCODER = os.getenv("SIMPLE_RECORDER_VIDEO_ENCODER", "auto").lower()  # auto|ffmpeg|cv2
+FFMPEG_BINARY = os.getenv("SIMPLE_RECORDER_FFMPEG", "")
+FFMPEG_CODEC = os.getenv("SIMPLE_RECORDER_FFMPEG_CODEC", "libx264")  # libx264|libx265
+FFMPEG_PRESET = os.getenv("SIMPLE_RECORDER_FFMPEG_PRESET", "veryfast")
+FFMPEG_TUNE = os.getenv("SIMPLE_RECORDER_FFMPEG_TUNE", "stillimage")  # екранний контент; "" — без tune
+FFMPEG_CRF = int(os.getenv("SIMPLE_RECORDER_FFMPEG_CRF", "28"))
+FFMPEG_QUEUE_FRAMES = 4  # скільки сирих кадрів ffmpeg може тримати у вхідній черзі
+FFMPEG_STOP_TIMEOUT = 120  # сек на дописування файлу після закриття stdin
+FRAGMENT_SECONDS = float(os.getenv("SIMPLE_RECORDER_FRAGMENT_SECONDS", "2"))  # тривалість фрагмента fMP4
+FRAGMENT_READ_SIZE = 64 * 1024
+
+# Довша перерва між кадрами (сон системи, зависання) не заповнюється дублікатами —
+# шкала файлу просто зсувається
+TIMELINE_MAX_GAP = float(os.getenv("SIMPLE_RECORDER_TIMELINE_MAX_GAP", "10"))  # сек
+
+# tune, які розуміє кожен кодек (stillimage є лише в x264)
+FFMPEG_TUNES = {
+    "libx264": ("film", "animation", "grain", "stillimage", "psnr", "ssim", "fastdecode", "zerolatency"),
+    "libx265": ("animation", "grain", "psnr", "ssim", "fastdecode", "zerolatency"),
+}
+
+_ffmpeg_path = None
+_ffmpeg_crashes = 0
+
+
+def find_ffmpeg():
+    """Шлях до ffmpeg або None"""
+    global _ffmpeg_path
+    if _ffmpeg_path is None:
+        path = FFMPEG_BINARY or shutil.which("ffmpeg")
+        if not path:
+            try:
+                import imageio_ffmpeg  # optional dependency: статичний ffmpeg у колесі
+                path = imageio_ffmpeg.get_ffmpeg_exe()
+            except Exception:
+                path = None
+        _ffmpeg_path = path or ""
+    return _ffmpeg_path or None
+
+
+def open_cv2_writer(path, fps, size):
+    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+    return cv2.VideoWriter(path, fourcc, fps, size)
+
+
+def continuation_path(path):
+    """Файл, у який cv2 дописує сегмент після падіння ffmpeg: part1.mp4 → part1.cv2.mp4"""
+    root, extension = os.path.splitext(path)
+    return f"{root}.cv2{extension or '.mp4'}"
+
+
+def open_video_writer(path, fps, size, encoder=VIDEO_ENCODER, log=print, on_fallback=None):
+    """Відкриває писач відео з інтерфейсом cv2.VideoWriter: ffmpeg або cv2 (mp4v).
+
+    on_fallback(path) викликається перед створенням файлу-продовження після падіння ffmpeg.
+    """
+    if encoder != "cv2":
+        if _ffmpeg_crashes:
+            encoder = "cv2"  # ffmpeg уже падав у цьому процесі — не ризикуємо наступними сегментами
+        elif find_ffmpeg():
+            writer = FfmpegVideoWriter(path, fps, size, log=log, on_fallback=on_fallback)
+            if writer.isOpened():
+                return writer
+        elif encoder == "ffmpeg":
+            log("⚠️ ffmpeg не знайдено, відео пишеться через cv2 (mp4v)")
+    return open_cv2_writer(path, fps, size)
+
+
+def open_fragmented_writer(path, fps, size, sink, log=print, on_fallback=None):
+    """FragmentedMp4Writer або None, якщо ffmpeg недоступний чи вже падав"""
+    if VIDEO_ENCODER == "cv2" or _ffmpeg_crashes or not find_ffmpeg():
+        return None
+    writer = FragmentedMp4Writer(path, fps, size, sink, log=log, on_fallback=on_fallback)
+    return writer if writer.isOpened() else None
+
+
+class FfmpegVideoWriter:
+    """Писач відео через процес ffmpeg з відкатом на cv2.VideoWriter при збої.
+
+    Після збою self.path лишається з уже закодованими кадрами, а continuation —
+    шлях файлу cv2 з рештою сегмента; вивантажувати треба обидва.
+    """
+
+    def __init__(self, path, fps, size, codec=FFMPEG_CODEC, preset=FFMPEG_PRESET, tune=FFMPEG_TUNE,
+                 crf=FFMPEG_CRF, fragment_seconds=FRAGMENT_SECONDS, log=print, on_fallback=None):
+        self.path = path
+        self.fps = fps
+        self.size = size
+        self.codec = codec
+        self.frames = 0
+        self.failed = False
+        self.continuation = None
+        # Ключовий кадр (і кінець фрагмента) не рідше ніж раз на fragment_seconds
+        self.gop = max(1, int(round(fps * fragment_seconds)))
+        self._log = log
+        self._on_fallback = on_fallback
+        self._fallback = None
+        self._stderr = collections.deque(maxlen=20)
+        self._process = None
+
+        width, height = size
+        command = [
+            find_ffmpeg(), "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", str(fps),
+            "-thread_queue_size", str(FFMPEG_QUEUE_FRAMES), "-i", "-",
+            "-an", "-c:v", codec, "-preset", preset, "-crf", str(crf),
+        ]
+        if tune and tune in FFMPEG_TUNES.get(codec, ()):
+            command += ["-tune", tune]
+        if width % 2 or height % 2:  # yuv420p потребує парних розмірів
+            command += ["-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2"]
+        if codec == "libx265":
+            command += ["-tag:v", "hvc1", "-x265-params", "log-level=error"]
+        command += ["-pix_fmt", "yuv420p"] + self._output_args()
+
+        try:
+            self._process = subprocess.Popen(
+                command, stdin=subprocess.PIPE, stdout=self._stdout, stderr=subprocess.PIPE,
+                bufsize=0,  # без буфера Python: кадр іде прямо в pipe, очікування обмежене ffmpeg
+                creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+            )
+        except OSError as start_error:
+            self._log(f"⚠️ Не вдалося запустити ffmpeg: {start_error}")
+            return
+        threading.Thread(target=self._drain_stderr, daemon=True).start()
+        self._log(f"🎞️ ffmpeg {codec} ({preset}, crf {crf}): {os.path.basename(path)}")
+
+    _stdout = subprocess.DEVNULL
+
+    def _fragment_args(self):
+        # Без moov у кінці файлу: фрагменти пишуться по мірі кодування, і падіння ffmpeg
+        # забирає лише незавершений фрагмент, а не весь сегмент (як з +faststart)
+        return [
+            "-g", str(self.gop), "-keyint_min", str(self.gop),
+            "-movflags", "+frag_keyframe+empty_moov+default_base_moof",
+            "-flush_packets", "1",  # фрагмент одразу на диск/в pipe, а не в буфер avio
+        ]
+
+    def _output_args(self):
+        return self._fragment_args() + [self.path]
+
+    def _drain_stderr(self):
+        for line in self._process.stderr:
+            self._stderr.append(line.decode("utf-8", "replace").rstrip())
+
+    def isOpened(self):
+        if self._fallback is not None:
+            return self._fallback.isOpened()
+        return self._process is not None and self._process.poll() is None
+
+    def write(self, frame):
+        if self._fallback is not None:
+            self._fallback.write(frame)
+            return
+        if frame.shape[1] != self.size[0] or frame.shape[0] != self.size[1]:
+            return  # як cv2.VideoWriter: кадр іншого розміру ігнорується
+        try:
+            self._process.stdin.write(memoryview(frame if frame.flags.c_contiguous else frame.copy()).cast("B"))
+            self.frames += 1
+        except (BrokenPipeError, OSError, ValueError) as pipe_error:
+            self._switch_to_cv2(pipe_error)
+            self._fallback.write(frame)
+
+    def _switch_to_cv2(self, reason):
+        """ffmpeg упав: його файл лишається як є, решта сегмента йде через cv2 в continuation"""
+        global _ffmpeg_crashes
+        _ffmpeg_crashes += 1
+        self.failed = True
+        code = self._stop(timeout=5)
+        details = " | ".join(self._stderr) or reason
+        self._log(f"⚠️ ffmpeg завершився (код {code}) після {self.frames} кадрів: {details}")
+        self.continuation = continuation_path(self.path)
+        if self._on_fallback is not None:
+            self._on_fallback(self.continuation)  # реєстрація у спулі до створення файлу
+        self._log(f"   ↪️ Продовжуємо через cv2 (mp4v) у {os.path.basename(self.continuation)}")
+        self._fallback = open_cv2_writer(self.continuation, self.fps, self.size)
+
+    def _stop(self, timeout=FFMPEG_STOP_TIMEOUT):
+        process = self._process
+        if process is None:
+            return None
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+        try:
+            return process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            return process.wait()
+
+    def release(self):
+        if self._fallback is not None:
+            self._fallback.release()
+            return
+        code = self._stop()
+        if code:
+            self._log(f"⚠️ ffmpeg завершився з кодом {code}: {' | '.join(self._stderr)}")
+        return code
+
+
+class FragmentedMp4Writer(FfmpegVideoWriter):
+    """ffmpeg пише фрагментований MP4 у stdout, а потік читання дублює байти у файл і в sink.
+
+    Фрагмент (moof+mdat) закривається на кожному ключовому кадрі, тож уже відданий
+    префікс файлу не змінюється і його можна дописувати на сервер шматками. sink —
+    об'єкт з feed(bytes), finish() і abort(reason): finish() викликається після
+    останнього байта, abort() — якщо ffmpeg упав і файл дописується через cv2.
+    """
+
+    _stdout = subprocess.PIPE
+
+    def __init__(self, path, fps, size, sink, **options):
+        self.sink = sink
+        self.bytes_out = 0
+        self._reader = None
+        self._file = open(path, "wb")
+        super().__init__(path, fps, size, **options)
+        if self._process is None:
+            self._file.close()
+            return
+        self._reader = threading.Thread(target=self._read_output, daemon=True)
+        self._reader.start()
+
+    def _output_args(self):
+        return self._fragment_args() + ["-f", "mp4", "pipe:1"]
+
+    def _read_output(self):
+        stream = self._process.stdout
+        while True:
+            data = stream.read(FRAGMENT_READ_SIZE)
+            if not data:
+                break
+            self._file.write(data)
+            self.bytes_out += len(data)
+            self.sink.feed(data)
+        self._file.close()
+
+    def _join_reader(self):
+        if self._reader is not None:
+            self._reader.join()
+            self._reader = None
+
+    def _switch_to_cv2(self, reason):
+        self._stop(timeout=5)
+        self._join_reader()
+        self.sink.abort(f"ffmpeg: {reason}")
+        super()._switch_to_cv2(reason)
+
+    def release(self):
+        if self._fallback is not None:
+            self._fallback.release()
+            return
+        code = super().release()
+        self._join_reader()
+        if code:
+            self.sink.abort(f"ffmpeg завершився з кодом {code}")
+        else:
+            self.sink.finish()
+
+
+class FrameClock:
+    """Темп захоплення за монотонними дедлайнами: кадр n — у момент start + n/fps.
+
+    Запізнення не накопичується: після повільного кадру наступний очікується менше,
+    а пропущені дедлайни (запізнення більше за інтервал) не наздоганяються пачкою.
+    """
+
+    def __init__(self, fps):
+        self.interval = 1.0 / fps
+        self.ticks = 0
+        self.late = 0
+        self.skipped = 0
+        self.max_late = 0.0
+        self._late_total = 0.0
+        self._next = None
+
+    def start(self):
+        self._next = time.monotonic()
+        return self._next
+
+    def wait(self):
+        """Чекає наступного дедлайну й повертає його (time.monotonic())"""
+        if self._next is None:
+            self.start()
+        self._next += self.interval
+        now = time.monotonic()
+        delay = self._next - now
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            lateness = -delay
+            self.late += 1
+            self._late_total += lateness
+            self.max_late = max(self.max_late, lateness)
+            if lateness >= self.interval:
+                missed = int(lateness / self.interval)
+                self.skipped += missed
+                self._next += missed * self.interval
+        self.ticks += 1
+        return self._next
+
+    def snapshot(self):
+        return {
+            "ticks": self.ticks,
+            "late": self.late,
+            "skipped_ticks": self.skipped,
+            "avg_late_ms": round(self._late_total / self.late * 1000, 2) if self.late else 0.0,
+            "max_late_ms": round(self.max_late * 1000, 2),
+        }
+
+
+class FrameTimeline:
+    """Розкладає кадри по слотах FPS файлу за монотонним часом захоплення.
+
+    repeats(t) повертає, скільки разів записати кадр: 0 — слот уже зайнятий (кадр
+    викидається), 1 — звичайний кадр, >1 — захоплення відстало і пропущені слоти
+    заповнюються цим кадром, щоб тривалість відео відповідала реальному часу.
+    """
+
+    def __init__(self, fps, max_gap=TIMELINE_MAX_GAP):
+        self.fps = fps
+        self.max_gap = max_gap
+        self.frames = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self.gaps = 0
+        self.start = None
+        self.next_slot = 0
+
+    def restart(self, timestamp):
+        """Новий файл (сегмент): перший кадр стає слотом 0"""
+        self.start = timestamp
+        self.next_slot = 0
+
+    @property
+    def duration(self):
+        return self.next_slot / self.fps
+
+    def repeats(self, timestamp):
+        if self.start is None:
+            self.restart(timestamp)
+        slot = int(round((timestamp - self.start) * self.fps))
+        if slot < self.next_slot:
+            self.dropped += 1
+            return 0
+        count = slot - self.next_slot + 1
+        if count - 1 > self.max_gap * self.fps:
+            # Надто довга перерва: не пишемо хвилини дублікатів, а зсуваємо шкалу
+            self.gaps += 1
+            self.start = timestamp - self.next_slot / self.fps
+            count = 1
+        self.duplicates += count - 1
+        self.next_slot += count
+        self.frames += 1
+        return count
+
+    def snapshot(self):
+        return {
+            "frames": self.frames,
+            "duplicates": self.duplicates,
+            "dropped": self.dropped,
+            "gaps": self.gaps,
+        }
@@ -25,15 +25,39 @@ const server = useHttps
 
 const wss = new WebSocket.Server({ server });
 
+// Бінарний кадр: magic "KB", версія, тип, кодек, прапорці, seq (uint32), час захоплення (uint64, мс)
+const FRAME_PROTOCOL_VERSION = 1;
+const FRAME_HEADER_SIZE = 18;
+const FRAME_MAGIC = 'KB';
+const FRAME_TYPE_FRAME = 1;
+const FRAME_TYPE_KEEPALIVE = 2;
+const FRAME_TYPE_DELTA = 3;
+// Дельти після ключового кадру, які отримає новий переглядач (ключові кадри обмежують ланцюжок)
+const DELTA_HISTORY_LIMIT = 300;
+// Опитування /api/latest-frame вважається JSON-переглядачем ще стільки після запиту
+const LATEST_FRAME_LEASE_MS = 15_000;
+// Скільки /api/latest-frame чекає свіжого повного кадру, якщо збережений застарів під дельтами
+const LATEST_FRAME_WAIT_MS = 2_000;
+const CODEC_JPEG = 1;
+
 /**
  * room structure:
  * {
  *   publishers: Map<string, {
  *     socket: WebSocket,
  *     displayName: string,
- *     frame: string | null,
+ *     frame: string | null,          // base64 JPEG (JSON-кадри або ліниво з frameBinary)
+ *     frameBinary: Buffer | null,    // останній бінарний (ключовий) кадр як є (заголовок + JPEG)
+ *     deltas: Buffer[],              // дельта-кадри поверх frameBinary, по порядку
+ *     binary: boolean,               // публікатор узгодив бінарний транспорт
+ *     delta: boolean,                // ...і дельта-кадри з плиток
+ *     deltaActive: boolean,          // дельти зараз увімкнені (вимикаються для JSON-переглядачів)
+ *     fullFramesUntil: number,       // до цього часу діє оренда /api/latest-frame
+ *     leaseTimer: Timeout | null,
+ *     frameWaiters: Function[],      // запити /api/latest-frame, що чекають повного кадру
  *     connectedAt: number,
- *     lastFrameAt: number | null
+ *     lastFrameAt: number | null,
+ *     lastSeenAt: number             // останній кадр або keepalive (екран не змінювався)
  *   }>,
  *   viewersByStreamer: Map<string, Set<WebSocket>>,
  *   lobby: Set<WebSocket>
@@ -67,6 +91,82 @@ function sendJson(ws, payload) {
   }
 }
 
+function parseFrameHeader(buffer) {
+  if (buffer.length < FRAME_HEADER_SIZE || buffer.toString('latin1', 0, 2) !== FRAME_MAGIC) {
+    return null;
+  }
+  return {
+    version: buffer.readUInt8(2),
+    type: buffer.readUInt8(3),
+    codec: buffer.readUInt8(4),
+    flags: buffer.readUInt8(5),
+    seq: buffer.readUInt32BE(6),
+    timestamp: Number(buffer.readBigUInt64BE(10)),
+  };
+}
+
+function latestFrameBase64(publisher) {
+  if (!publisher.frame && publisher.frameBinary) {
+    publisher.frame = publisher.frameBinary.subarray(FRAME_HEADER_SIZE).toString('base64');
+  }
+  return publisher.frame;
+}
+
+function sendBinary(viewer, buffer) {
+  viewer.send(buffer, { binary: true }, (err) => {
+    if (err) console.error('Failed to send binary frame', err);
+  });
+}
+
+function sendFrame(viewer, publisher, { withDeltas = false } = {}) {
+  if (viewer.readyState !== WebSocket.OPEN) return;
+  if (viewer.binaryFrames && publisher.frameBinary) {
+    sendBinary(viewer, publisher.frameBinary);
+    if (withDeltas) {
+      // Новий переглядач відновлює поточний екран: ключовий кадр + дельти після нього
+      publisher.deltas.forEach((delta) => sendBinary(viewer, delta));
+    }
+    return;
+  }
+  const data = latestFrameBase64(publisher);
+  if (!data) return;
+  sendJson(viewer, {
+    type: 'frame',
+    data,
+    username: publisher.displayName,
+    timestamp: publisher.lastFrameAt,
+  });
+}
+
+// JSON-переглядач (і /api/latest-frame) плитки не збирає і бачить лише ключові кадри,
+// яких під дельтами буває раз на ~10 с. Поки такий споживач є, публікатор отримує
+// {"type": "delta", "enabled": false} і шле повні кадри; коли останній піде — дельти знову.
+function needsFullFrames(roomData, username, publisher) {
+  if (publisher.fullFramesUntil > Date.now()) return true;
+  const viewersSet = roomData.viewersByStreamer.get(username);
+  if (!viewersSet) return false;
+  for (const viewer of viewersSet) {
+    if (!viewer.binaryFrames) return true;
+  }
+  return false;
+}
+
+function updatePublisherDelta(roomData, username) {
+  const publisher = roomData.publishers.get(username);
+  if (!publisher?.delta) return;
+  const enabled = !needsFullFrames(roomData, username, publisher);
+  if (publisher.deltaActive === enabled) return;
+  publisher.deltaActive = enabled;
+  sendJson(publisher.socket, { type: 'delta', enabled });
+  console.log(`Delta frames ${enabled ? 'resumed' : 'paused for JSON viewers'}: username=${username}`);
+}
+
+function resolveFrameWaiters(publisher) {
+  const waiters = publisher.frameWaiters;
+  publisher.frameWaiters = [];
+  waiters.forEach((resolve) => resolve());
+}
+
 function buildRoomSummary(roomName) {
   const room = rooms.get(roomName);
   if (!room) {
@@ -77,6 +177,7 @@ function buildRoomSummary(roomName) {
     displayName: info.displayName,
     connectedAt: info.connectedAt,
     lastFrameAt: info.lastFrameAt,
+    lastSeenAt: info.lastSeenAt,
     viewers: room.viewersByStreamer.get(username)?.size || 0,
   }));
   return { room: roomName, streamers };
@@ -135,14 +236,75 @@ wss.on('connection', (ws, req) => {
       socket: ws,
       displayName: normalizedName,
       frame: null,
+      frameBinary: null,
+      deltas: [],
+      binary: false,
+      delta: false,
+      deltaActive: false,
+      fullFramesUntil: 0,
+      leaseTimer: null,
+      frameWaiters: [],
       connectedAt: Date.now(),
       lastFrameAt: null,
+      lastSeenAt: Date.now(),
     };
     roomData.publishers.set(normalizedName, publisher);
     broadcastSummary(room);
     console.log(`Publisher registered: room=${room}, username=${normalizedName}`);
 
-    ws.on('message', (rawMessage) => {
+    ws.on('message', (rawMessage, isBinary) => {
+      if (isBinary) {
+        const header = parseFrameHeader(rawMessage);
+        if (!header || header.version !== FRAME_PROTOCOL_VERSION) {
+          console.error(`Invalid binary frame from publisher in room ${room}`);
+          return;
+        }
+        publisher.lastSeenAt = Date.now();
+        if (header.type === FRAME_TYPE_KEEPALIVE) {
+          // Екран не змінився, останній кадр у переглядачів актуальний
+          return;
+        }
+        if (header.type === FRAME_TYPE_DELTA) {
+          if (!publisher.frameBinary) {
+            // Немає ключового кадру, до якого прив'язати дельту — лише пересилаємо
+          } else if (publisher.deltas.length < DELTA_HISTORY_LIMIT) {
+            publisher.deltas.push(rawMessage);
+          } else {
+            // Переглядачі, що прийдуть пізніше, дочекаються наступного ключового кадру
+            publisher.frameBinary = null;
+            publisher.frame = null;
+            publisher.deltas = [];
+          }
+          publisher.lastFrameAt = publisher.lastSeenAt;
+          // Плитки збирає переглядач; JSON-переглядачі з'являються лише з повними кадрами
+          // (updatePublisherDelta), а дельти, що ще в дорозі, їм не потрібні
+          const viewersSet = roomData.viewersByStreamer.get(normalizedName);
+          if (viewersSet) {
+            viewersSet.forEach((viewer) => {
+              if (viewer.binaryFrames && viewer.readyState === WebSocket.OPEN) {
+                sendBinary(viewer, rawMessage);
+              }
+            });
+          }
+          return;
+        }
+        if (header.type !== FRAME_TYPE_FRAME || header.codec !== CODEC_JPEG) {
+          return;
+        }
+        // Без розбору JSON і base64: зберігаємо буфер як є, base64 лише на вимогу
+        publisher.frameBinary = rawMessage;
+        publisher.deltas = [];
+        publisher.frame = null;
+        publisher.lastFrameAt = publisher.lastSeenAt;
+        resolveFrameWaiters(publisher);
+
+        const viewersSet = roomData.viewersByStreamer.get(normalizedName);
+        if (viewersSet) {
+          viewersSet.forEach((viewer) => sendFrame(viewer, publisher));
+        }
+        return;
+      }
+
       let message;
       try {
         message = JSON.parse(rawMessage.toString());
@@ -151,6 +313,23 @@ wss.on('connection', (ws, req) => {
         return;
       }
 
+      if (message.type === 'join') {
+        const transports = Array.isArray(message.transports) ? message.transports : [];
+        const features = Array.isArray(message.features) ? message.features : [];
+        publisher.binary = transports.includes('binary') && message.frameProtocol === FRAME_PROTOCOL_VERSION;
+        publisher.delta = publisher.binary && features.includes('delta');
+        publisher.deltaActive = publisher.delta;
+        sendJson(ws, {
+          type: 'joined',
+          transport: publisher.binary ? 'binary' : 'json',
+          frameProtocol: FRAME_PROTOCOL_VERSION,
+          delta: publisher.delta,
+        });
+        updatePublisherDelta(roomData, normalizedName); // JSON-переглядачі могли прийти раніше
+        console.log(`Publisher joined: room=${room}, username=${normalizedName}, transport=${publisher.binary ? 'binary' : 'json'}${publisher.delta ? '+delta' : ''}`);
+        return;
+      }
+
       if (message.type === 'register') {
         publisher.displayName = sanitizeName(message.username, publisher.displayName);
         console.log(`Publisher info updated: room=${room}, username=${normalizedName}, display=${publisher.displayName}`);
@@ -158,24 +337,30 @@ wss.on('connection', (ws, req) => {
         return;
       }
 
+      if (message.type === 'keepalive') {
+        publisher.lastSeenAt = Date.now();
+        return;
+      }
+
       if (message.type === 'frame' && message.data) {
         publisher.frame = message.data;
+        publisher.frameBinary = null;
+        publisher.deltas = [];
         publisher.lastFrameAt = Date.now();
+        publisher.lastSeenAt = publisher.lastFrameAt;
+        resolveFrameWaiters(publisher);
 
         const viewersSet = roomData.viewersByStreamer.get(normalizedName);
         if (viewersSet) {
-          viewersSet.forEach((viewer) => sendJson(viewer, {
-            type: 'frame',
-            data: message.data,
-            username: publisher.displayName,
-            timestamp: publisher.lastFrameAt,
-          }));
+          viewersSet.forEach((viewer) => sendFrame(viewer, publisher));
         }
       }
     });
 
     ws.on('close', () => {
       console.log(`Publisher disconnected: room=${room}, username=${normalizedName}`);
+      clearTimeout(publisher.leaseTimer);
+      resolveFrameWaiters(publisher);
       roomData.publishers.delete(normalizedName);
       const viewersSet = roomData.viewersByStreamer.get(normalizedName);
       if (viewersSet) {
@@ -187,21 +372,19 @@ wss.on('connection', (ws, req) => {
     });
   } else {
     if (viewerTarget) {
+      // Переглядач з ?binary=1 отримує бінарні кадри без перекодування в base64
+      ws.binaryFrames = url.searchParams.get('binary') === '1';
       const viewersSet = roomData.viewersByStreamer.get(viewerTarget) || new Set();
       viewersSet.add(ws);
       roomData.viewersByStreamer.set(viewerTarget, viewersSet);
       console.log(`Viewer joined room=${room}, target=${viewerTarget}. Total viewers for target=${viewersSet.size}`);
+      updatePublisherDelta(roomData, viewerTarget);
 
       sendJson(ws, { type: 'summary', room, streamers: buildRoomSummary(room).streamers });
 
       const publisher = roomData.publishers.get(viewerTarget);
-      if (publisher?.frame) {
-        sendJson(ws, {
-          type: 'frame',
-          data: publisher.frame,
-          username: publisher.displayName,
-          timestamp: publisher.lastFrameAt,
-        });
+      if (publisher?.frame || publisher?.frameBinary) {
+        sendFrame(ws, publisher, { withDeltas: true });
       }
 
       ws.on('close', () => {
@@ -210,6 +393,7 @@ wss.on('connection', (ws, req) => {
           roomData.viewersByStreamer.delete(viewerTarget);
         }
         console.log(`Viewer left room=${room}, target=${viewerTarget}. Remaining viewers=${viewersSet.size}`);
+        updatePublisherDelta(roomData, viewerTarget);
         cleanupRoom(room);
       });
     } else {
@@ -235,7 +419,7 @@ app.get('/api/rooms', (_req, res) => {
   res.json(payload);
 });
 
-app.get('/api/latest-frame/:room/:user', (req, res) => {
+app.get('/api/latest-frame/:room/:user', async (req, res) => {
   const { room, user } = req.params;
   const roomData = rooms.get(room);
   if (!roomData) {
@@ -243,12 +427,29 @@ app.get('/api/latest-frame/:room/:user', (req, res) => {
     return;
   }
   const publisher = roomData.publishers.get(user);
-  if (!publisher || !publisher.frame) {
+  if (publisher?.delta) {
+    // Опитувач — той самий JSON-переглядач: на час оренди публікатор шле повні кадри
+    publisher.fullFramesUntil = Date.now() + LATEST_FRAME_LEASE_MS;
+    clearTimeout(publisher.leaseTimer);
+    publisher.leaseTimer = setTimeout(() => updatePublisherDelta(roomData, user), LATEST_FRAME_LEASE_MS + 100);
+    updatePublisherDelta(roomData, user);
+    if (publisher.deltas.length || !publisher.frameBinary) {
+      // Збережений ключовий кадр старший за екран — чекаємо на перший повний кадр
+      await new Promise((resolve) => {
+        const timer = setTimeout(resolve, LATEST_FRAME_WAIT_MS);
+        publisher.frameWaiters.push(() => {
+          clearTimeout(timer);
+          resolve();
+        });
+      });
+    }
+  }
+  if (!publisher || !latestFrameBase64(publisher)) {
     res.status(404).send('No frame available for this stream');
     return;
   }
   res.json({
-    frame: publisher.frame,
+    frame: latestFrameBase64(publisher),
     timestamp: publisher.lastFrameAt,
     username: publisher.displayName,
   });
@@ -4,9 +4,10 @@ import cors from 'cors';
 import multer from 'multer';
 import { RoomServiceClient } from 'livekit-server-sdk';
 import { fileURLToPath } from 'url';
-import { dirname, join } from 'path';
+import { basename, dirname, join } from 'path';
 import fs from 'fs/promises';
-import { existsSync, mkdirSync } from 'fs';
+import { createReadStream, existsSync, mkdirSync } from 'fs';
+import { createHash } from 'crypto';
 
 // Загружаем переменные окружения из .env файла (если есть)
 const __filename = fileURLToPath(import.meta.url);
@@ -376,6 +377,65 @@ app.get('/api/rooms/:roomName', async (req, res) => {
   }
 });
 
+// Общий финал /api/recordings/upload и /api/recordings/chunk: файл переносится в
+// RECORDINGS_DIR/<комната>/<пользователь>/<YYYY-MM-DD>/<filename>, а если Google Drive
+// включен — загружается туда в фоне. Ответ клиенту не ждет Drive: долгая загрузка
+// в Drive иначе упирается в timeout nginx. Возвращает тело ответа для клиента.
+async function storeRecording(sourcePath, { filename, size, username, roomName }) {
+  const isGoogleDriveEnabled = process.env.GOOGLE_DRIVE_ENABLED === 'true';
+  const room = roomName || 'unknown';
+  const user = username || 'unknown';
+  const dateFolder = new Date().toISOString().split('T')[0]; // YYYY-MM-DD
+
+  const dateDir = join(RECORDINGS_DIR, room, user, dateFolder);
+  if (!existsSync(dateDir)) {
+    mkdirSync(dateDir, { recursive: true });
+    console.log(`📁 Создана папка: ${room}/${user}/${dateFolder}`);
+  }
+  const finalFilePath = join(dateDir, filename);
+
+  // Перенос из временной папки в финальное местоположение (быстро, без копирования)
+  await fs.rename(sourcePath, finalFilePath);
+  console.log(`✅ Файл сохранен локально: ${finalFilePath} (${(size / 1024 / 1024).toFixed(2)} MB)`);
+
+  if (isGoogleDriveEnabled) {
+    uploadRecordingToDrive(finalFilePath, room, user, dateFolder, filename); // не ждем
+  }
+
+  return {
+    success: true,
+    filename,
+    size,
+    username: user,
+    roomName: room,
+    storage: isGoogleDriveEnabled ? 'google_drive_uploading' : 'local',
+    message: isGoogleDriveEnabled ? 'Файл сохранен локально, загрузка в Google Drive начата...' : 'Файл сохранен локально'
+  };
+}
+
+// Фоновая загрузка сохраненной записи в Google Drive; при успехе локальная копия удаляется,
+// при ошибке файл остается в локальном хранилище
+async function uploadRecordingToDrive(finalFilePath, room, user, dateFolder, filename) {
+  try {
+    console.log('☁️  Начинаем асинхронную загрузку в Google Drive...');
+    const uploadStartTime = Date.now();
+
+    const uploadResult = await uploadFileToDrive(finalFilePath, room, user, dateFolder, filename);
+
+    const uploadDuration = ((Date.now() - uploadStartTime) / 1000).toFixed(2);
+    console.log(`✅ Загрузка в Google Drive завершена за ${uploadDuration} сек`);
+    console.log(`   📋 ID: ${uploadResult.fileId}`);
+    console.log(`   🔗 Ссылка: ${uploadResult.webViewLink || 'N/A'}`);
+
+    await fs.unlink(finalFilePath);
+    console.log('🗑️  Локальный файл удален после загрузки в Drive');
+  } catch (driveError) {
+    console.error('❌ Ошибка асинхронной загрузки в Google Drive:', driveError);
+    console.error('   Stack:', driveError.stack);
+    console.log('⚠️  Файл остается в локальном хранилище');
+  }
+}
+
 // Загрузить запись
 app.post('/api/recordings/upload', upload.single('video'), async (req, res) => {
   let tempFilePath = null;
@@ -384,106 +444,24 @@ app.post('/api/recordings/upload', upload.single('video'), async (req, res) => {
     console.log('📥 Получен запрос на загрузку записи');
     console.log('📋 Body:', req.body);
     console.log('📁 File:', req.file ? `${req.file.filename} (${req.file.size} bytes)` : 'NO FILE');
-    const isGoogleDriveEnabled = process.env.GOOGLE_DRIVE_ENABLED === 'true';
-    console.log(`☁️  Google Drive включен: ${isGoogleDriveEnabled}`);
     
     if (!req.file) {
       return res.status(400).json({ error: 'No file uploaded' });
     }
 
-    const { username, roomName, timestamp } = req.body;
-    const filename = req.file.filename;
+    const { username, roomName } = req.body;
     tempFilePath = req.file.path; // Файл во временной папке /tmp
-    const fileSize = req.file.size;
 
     console.log(`💾 Файл получен во временной папке: ${tempFilePath}`);
     console.log(`   👤 Username: ${username || 'НЕ УКАЗАН'}`);
     console.log(`   📍 Комната: ${roomName || 'НЕ УКАЗАНА'}`);
-    console.log(`   📊 Размер: ${(fileSize / 1024 / 1024).toFixed(2)} MB`);
-
-    // Получаем текущую дату в формате YYYY-MM-DD
-    const now = new Date();
-    const dateFolder = now.toISOString().split('T')[0];
-
-    let uploadResult = null;
-    let finalFilePath = null;
 
-    // Если Google Drive включен, загружаем туда АСИНХРОННО (в фоне)
-    // Сначала сохраняем файл локально, затем загружаем в Drive в фоне
-    // Это предотвращает timeout от nginx при долгой загрузке в Google Drive
-    
-    // Подготовка путей для локального сохранения
-    const roomDir = join(RECORDINGS_DIR, roomName || 'unknown');
-    const userDir = join(roomDir, username || 'unknown');
-    const dateDir = join(userDir, dateFolder);
-    finalFilePath = join(dateDir, filename);
-    
-    // Создаем папки если их нет
-    if (!existsSync(roomDir)) {
-      mkdirSync(roomDir, { recursive: true });
-      console.log(`📁 Создана папка комнаты: ${roomName}`);
-    }
-    if (!existsSync(userDir)) {
-      mkdirSync(userDir, { recursive: true });
-      console.log(`📁 Создана папка пользователя: ${username}`);
-    }
-    if (!existsSync(dateDir)) {
-      mkdirSync(dateDir, { recursive: true });
-      console.log(`📁 Создана папка даты: ${dateFolder}`);
-    }
-    
-    // Переносим файл из /tmp в финальное местоположение (быстро)
-    console.log(`🚚 Переносим файл из ${tempFilePath} в ${finalFilePath}...`);
-    await fs.rename(tempFilePath, finalFilePath);
-    console.log(`✅ Файл успешно сохранен локально: ${finalFilePath}`);
-    
-    // Отправляем ответ клиенту СРАЗУ (не ждем Google Drive)
-    res.json({
-      success: true,
-      filename,
-      size: fileSize,
-      username: username || 'unknown',
-      roomName: roomName || 'unknown',
-      storage: isGoogleDriveEnabled ? 'google_drive_uploading' : 'local',
-      message: isGoogleDriveEnabled ? 'Файл сохранен локально, загрузка в Google Drive начата...' : 'Файл сохранен локально'
-    });
-    
-    // Если Google Drive включен, загружаем в фоне (не блокируем ответ)
-    if (isGoogleDriveEnabled) {
-      // Запускаем загрузку в Google Drive асинхронно (не ждем)
-      (async () => {
-        try {
-          console.log('☁️  Начинаем асинхронную загрузку в Google Drive...');
-          const uploadStartTime = Date.now();
-          
-          uploadResult = await uploadFileToDrive(
-            finalFilePath, // Используем уже сохраненный файл
-            roomName || 'unknown',
-            username || 'unknown',
-            dateFolder,
-            filename
-          );
-          
-          const uploadDuration = ((Date.now() - uploadStartTime) / 1000).toFixed(2);
-          console.log(`✅ Загрузка в Google Drive завершена за ${uploadDuration} сек`);
-          console.log(`   📋 ID: ${uploadResult.fileId}`);
-          console.log(`   🔗 Ссылка: ${uploadResult.webViewLink || 'N/A'}`);
-          
-          // Удаляем локальный файл после успешной загрузки в Drive
-          await fs.unlink(finalFilePath);
-          console.log('🗑️  Локальный файл удален после загрузки в Drive');
-        } catch (driveError) {
-          console.error('❌ Ошибка асинхронной загрузки в Google Drive:', driveError);
-          console.error('   Stack:', driveError.stack);
-          console.log('⚠️  Файл остается в локальном хранилище');
-          // Файл остается локально при ошибке
-        }
-      })();
-      return; // Выходим, ответ уже отправлен
-    }
-    
-    // Если Google Drive отключен, файл уже сохранен локально выше
-    // Здесь ничего не делаем, ответ уже отправлен
+    res.json(await storeRecording(tempFilePath, {
+      filename: req.file.filename,
+      size: req.file.size,
+      username,
+      roomName,
+    }));
   } catch (error) {
     console.error('❌ Ошибка загрузки записи:', error);
     
@@ -501,6 +479,145 @@ app.post('/api/recordings/upload', upload.single('video'), async (req, res) => {
   }
 });
 
+// Загрузка записи кусками: живая (фрагментированный MP4 во время записи) и возобновляемая
+// (готовый файл после обрыва связи продолжается с места остановки)
+// GET  /api/recordings/chunk?session=  → { received } — сколько байт уже есть на сервере
+// POST /api/recordings/chunk?session=&offset=&final=0|1&sha256=&username=&roomName=&filename=
+// Тело — сырые байты; позиция берется из Content-Range (или offset для пустого куска).
+// Кусок дописывается, только если его начало равно уже полученному размеру; иначе 409
+// с { received }, и клиент продолжает с этой позиции. Повтор уже полученного куска безопасен.
+// X-Chunk-SHA256 проверяет кусок, sha256 в final — весь файл (при несовпадении файл
+// сбрасывается, 422). final=1 сохраняет файл через storeRecording, как /api/recordings/upload.
+const CHUNK_DIR = join(TEMP_UPLOAD_DIR, 'chunks');
+if (!existsSync(CHUNK_DIR)) {
+  mkdirSync(CHUNK_DIR, { recursive: true });
+}
+const finishedChunkSessions = new Map(); // session -> ответ final (для повторного final)
+const FINISHED_CHUNK_SESSIONS_LIMIT = 1000;
+const CHUNK_SESSION_PATTERN = /^[A-Za-z0-9_-]{8,64}$/;
+const chunkSessionQueues = new Map(); // session -> хвост цепочки обработчиков этой сессии
+
+// Куски одной сессии обрабатываются строго по очереди: между чтением размера .part и
+// дозаписью есть await, и без очереди два перекрывающихся POST (повтор после таймаута
+// рядом с оригиналом) оба увидели бы один received и дописали бы данные дважды
+function withChunkSession(session, task) {
+  const run = (chunkSessionQueues.get(session) || Promise.resolve()).then(task);
+  const tail = run.catch(() => {});
+  chunkSessionQueues.set(session, tail);
+  tail.then(() => {
+    if (chunkSessionQueues.get(session) === tail) {
+      chunkSessionQueues.delete(session);
+    }
+  });
+  return run;
+}
+
+async function chunkSessionSize(partPath) {
+  try {
+    return (await fs.stat(partPath)).size;
+  } catch (statError) {
+    if (statError.code !== 'ENOENT') throw statError;
+    return 0;
+  }
+}
+
+function fileSha256(filePath) {
+  return new Promise((resolve, reject) => {
+    const hash = createHash('sha256');
+    createReadStream(filePath)
+      .on('data', (data) => hash.update(data))
+      .on('end', () => resolve(hash.digest('hex')))
+      .on('error', reject);
+  });
+}
+
+app.get('/api/recordings/chunk', async (req, res) => {
+  const { session } = req.query;
+  if (!CHUNK_SESSION_PATTERN.test(session || '')) {
+    return res.status(400).json({ error: 'Invalid session' });
+  }
+  if (finishedChunkSessions.has(session)) {
+    return res.json(finishedChunkSessions.get(session));
+  }
+  try {
+    res.json({ received: await chunkSessionSize(join(CHUNK_DIR, `${session}.part`)) });
+  } catch (error) {
+    res.status(500).json({ error: 'Failed to read chunk session', details: error.message });
+  }
+});
+
+// Обработка одного куска; вызывается только внутри withChunkSession(session)
+async function appendChunk(req, res, { session, username, roomName, body, offset, final, filename, partPath }) {
+  if (finishedChunkSessions.has(session)) {
+    return res.json(finishedChunkSessions.get(session));
+  }
+
+  let received = await chunkSessionSize(partPath);
+
+  const chunkHash = req.get('X-Chunk-SHA256');
+  if (chunkHash && createHash('sha256').update(body).digest('hex') !== chunkHash.toLowerCase()) {
+    console.warn(`⚠️ Кусок ${session} с ${offset} поврежден в пути`);
+    return res.status(422).json({ error: 'Chunk hash mismatch', received });
+  }
+
+  if (offset > received || offset + body.length < received) {
+    // Пропуск данных или клиент отстал — пусть продолжит с того, что уже есть
+    return res.status(409).json({ error: 'Offset mismatch', received });
+  }
+  const tail = body.subarray(received - offset); // повтор уже полученного начала отбрасываем
+  if (tail.length || !received) {
+    await fs.appendFile(partPath, tail);
+    received += tail.length;
+  }
+
+  if (!final) {
+    return res.json({ success: true, received });
+  }
+
+  const expectedHash = req.query.sha256;
+  if (expectedHash && (await fileSha256(partPath)) !== String(expectedHash).toLowerCase()) {
+    await fs.unlink(partPath);
+    console.warn(`⚠️ Файл ${filename} не совпал по SHA-256, сессия ${session} сброшена`);
+    return res.status(422).json({ error: 'File hash mismatch', received: 0 });
+  }
+
+  const result = {
+    received,
+    ...(await storeRecording(partPath, { filename, size: received, username, roomName })),
+  };
+  if (finishedChunkSessions.size >= FINISHED_CHUNK_SESSIONS_LIMIT) {
+    finishedChunkSessions.delete(finishedChunkSessions.keys().next().value);
+  }
+  finishedChunkSessions.set(session, result);
+  res.json(result);
+}
+
+app.post('/api/recordings/chunk', express.raw({ type: () => true, limit: '128mb' }), async (req, res) => {
+  const { session, username, roomName } = req.query;
+  const body = Buffer.isBuffer(req.body) ? req.body : Buffer.alloc(0);
+  const range = /^bytes (\d+)-(\d+)\/(\d+|\*)$/.exec(req.get('Content-Range') || '');
+  const offset = range ? Number(range[1]) : Number(req.query.offset);
+  const final = req.query.final === '1';
+  const filename = basename(String(req.query.filename || ''));
+
+  if (!CHUNK_SESSION_PATTERN.test(session || '') || !Number.isInteger(offset) || offset < 0 || !filename) {
+    return res.status(400).json({ error: 'Invalid chunk parameters' });
+  }
+  if (range && Number(range[2]) - offset + 1 !== body.length) {
+    return res.status(400).json({ error: 'Content-Range does not match body length' });
+  }
+  const partPath = join(CHUNK_DIR, `${session}.part`);
+
+  try {
+    await withChunkSession(session, () => appendChunk(req, res, {
+      session, username, roomName, body, offset, final, filename, partPath,
+    }));
+  } catch (error) {
+    console.error('❌ Ошибка приема куска записи:', error);
+    res.status(500).json({ error: 'Failed to save chunk', details: error.message });
+  }
+});
+
 // Получить список записей (поддерживает обе структуры: старую и новую)
 app.get('/api/recordings', async (req, res) => {
   try {